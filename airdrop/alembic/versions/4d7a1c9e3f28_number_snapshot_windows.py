@@ -0,0 +1,29 @@
+"""number snapshot windows
+
+Revision ID: 4d7a1c9e3f28
+Revises: 9a4d6e2c8b51
+Create Date: 2026-10-18 10:42:17.208145
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '4d7a1c9e3f28'
+down_revision = '9a4d6e2c8b51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Shared and aggregated snapshot links were written without a position, number them in insertion order.
+    # Windows with numbered links hold delta or history snapshots, whose numbering is left as it is.
+    op.execute("UPDATE balance_snapshot_window AS link JOIN ("
+               "SELECT row_id, ROW_NUMBER() OVER (PARTITION BY airdrop_window_id ORDER BY row_id) AS seq "
+               "FROM balance_snapshot_window WHERE airdrop_window_id NOT IN ("
+               "SELECT airdrop_window_id FROM balance_snapshot_window WHERE snapshot_seq IS NOT NULL)"
+               ") AS numbered ON numbered.row_id = link.row_id "
+               "SET link.snapshot_seq = numbered.seq;")
+
+
+def downgrade():
+    pass
@@ -1,11 +1,9 @@
 import ast
-from datetime import datetime
+from datetime import datetime, timezone
 from http import HTTPStatus
 from pydoc import locate
 from typing import Type
 
-import web3
-from eth_account.messages import encode_defunct
 from jsonschema import validate, ValidationError
 from sqlalchemy.exc import NoResultFound
 from web3 import Web3, types
@@ -21,20 +19,26 @@ from airdrop.config import (
 )
 from airdrop.constants import (
     CLAIM_SCHEMA,
+    CLAIM_SIGNATURE_BATCH_SIZE,
     PROCESSOR_PATH,
     STAKING_CONTRACT_PATH,
     AirdropClaimStatus,
     AirdropEvents,
-    Blockchain
+    Blockchain,
+    ClaimMode
 )
 from airdrop.domain.factory.airdrop_factory import AirdropFactory
 from airdrop.infrastructure.repositories.airdrop_repository import AirdropRepository
 from airdrop.infrastructure.repositories.airdrop_window_repository import AirdropWindowRepository
+from airdrop.infrastructure.repositories.claim_signature_repo import ClaimSignatureRepository
+from airdrop.infrastructure.repositories.merkle_proof_repo import MerkleProofRepository
 from airdrop.processor.default_airdrop import DefaultAirdrop, BaseAirdrop
-from airdrop.utils import Utils
+from airdrop.utils import Utils, datetime_in_utcnow
 from common.alerts import MattermostProcessor
-from common.boto_utils import BotoUtils
+from common.boto_utils import secret_provider
 from common.logger import get_logger
+from common.merkle import unpack_proof
+from common.signing import get_local_signer
 from common.utils import (
     generate_claim_signature,
     generate_claim_signature_with_total_eligibile_amount,
@@ -46,6 +50,9 @@ from common.utils import (
 alert_processor = MattermostProcessor(config=MATTERMOST_CONFIG)
 logger = get_logger(__name__)
 
+# Claims served from a signature signed ahead, and claims that had to be signed on request
+claim_signature_lookups = {"hits": 0, "misses": 0}
+
 
 class AirdropServices:
 
@@ -373,22 +380,65 @@ class AirdropServices:
             airdrop_class = self.load_airdrop_class(airdrop)
             airdrop_object = airdrop_class(airdrop_id, airdrop_window_id)
 
+            if airdrop_object.claim_mode == ClaimMode.MERKLE_PROOF:
+                # The same window checks as the signed claims, proofs stay valid on chain once served
+                utc_now = datetime_in_utcnow()
+                claim_start_period = airdrop_window.claim_start_period.replace(tzinfo=timezone.utc)
+                claim_end_period = airdrop_window.claim_end_period.replace(tzinfo=timezone.utc)
+                if not claim_start_period <= utc_now <= claim_end_period:
+                    raise Exception("Airdrop window is not open for claims")
+                AirdropRepository().is_claimed_airdrop_window(
+                    airdrop_object.to_checksum_address_if_ethereum(user_address), airdrop_window_id)
+                # Proofs are built ahead by the Merkle distribution job, no signer key is needed
+                merkle_proof = MerkleProofRepository().get_proof(airdrop_id, airdrop_window_id, user_address)
+                if merkle_proof is None:
+                    raise Exception("No rewards to claim for this address in the airdrop window")
+                response = {
+                    "airdrop_id": str(airdrop.id),
+                    "airdrop_window_id": str(airdrop_window.id),
+                    "user_address": user_address,
+                    "signature": "Not Applicable.",
+                    "claimable_amount": str(int(merkle_proof.amount)),
+                    "token_address": airdrop.token_address,
+                    "contract_address": airdrop.contract_address,
+                    "staking_contract_address": airdrop.staking_contract_address,
+                    "total_eligibility_amount": str(int(merkle_proof.amount)),
+                    "merkle_root": merkle_proof.merkle_root,
+                    "merkle_proof": unpack_proof(merkle_proof.proof),
+                    "chain_context": airdrop_object.chain_context
+                }
+                return HTTPStatus.OK, response
+
             claimable_amount, total_eligible_amount = airdrop_object.get_claimable_amount(user_address=user_address)
 
             if airdrop_object.is_claim_signature_required:
+                claim_signature_repository = ClaimSignatureRepository()
                 claim_signature_private_key = self.get_private_key_for_generating_claim_signature(
                     secret_name=airdrop_object.claim_signature_private_key_secret)
-                signature_parameters = {
-                    "claimable_amount": claimable_amount,
-                    "total_eligible_amount": total_eligible_amount,
-                    "user_address": user_address,
-                    "contract_address": airdrop.contract_address,
-                    "token_address": airdrop.token_address
-                }
-                signature_format, formatted_message = airdrop_object.format_and_get_claim_signature_details(
-                    signature_parameters=signature_parameters
-                )
-                signature = self.generate_signature(claim_signature_private_key, signature_format, formatted_message)
+                signer_address = get_local_signer(claim_signature_private_key).address
+                # Signed ahead by the claim signature job unless the amounts or the key changed since
+                signature = claim_signature_repository.get_signature(
+                    airdrop_window_id, user_address, claimable_amount, total_eligible_amount,
+                    airdrop.contract_address, airdrop.token_address, signer_address)
+                if signature is None:
+                    signature_parameters = {
+                        "claimable_amount": claimable_amount,
+                        "total_eligible_amount": total_eligible_amount,
+                        "user_address": user_address,
+                        "contract_address": airdrop.contract_address,
+                        "token_address": airdrop.token_address
+                    }
+                    signature_format, formatted_message = airdrop_object.format_and_get_claim_signature_details(
+                        signature_parameters=signature_parameters
+                    )
+                    signature = self.generate_signature(claim_signature_private_key, signature_format,
+                                                        formatted_message)
+                    self.__save_claim_signature(claim_signature_repository, airdrop_id, airdrop_window_id,
+                                                user_address, claimable_amount, total_eligible_amount,
+                                                airdrop.contract_address, airdrop.token_address, signature,
+                                                signer_address)
+                else:
+                    claim_signature_lookups["hits"] += 1
             else:
                 signature = "Not Applicable."
 
@@ -459,11 +509,8 @@ class AirdropServices:
     def get_signature_for_airdrop_window_id(self, amount, airdrop_id, airdrop_window_id, user_wallet_address,
                                             contract_address, token_address):
         try:
-
-            boto_client = BotoUtils(
-                region_name=SIGNER_PRIVATE_KEY_STORAGE_REGION)
-            private_key = boto_client.get_parameter_value_from_secrets_manager(
-                secret_name=SIGNER_PRIVATE_KEY)
+            private_key = secret_provider.get_secret(
+                secret_name=SIGNER_PRIVATE_KEY, region_name=SIGNER_PRIVATE_KEY_STORAGE_REGION)
 
             return generate_claim_signature(
                 amount, airdrop_id, airdrop_window_id, user_wallet_address, contract_address, token_address,
@@ -476,10 +523,8 @@ class AirdropServices:
                                                                         airdrop_window_id, user_wallet_address,
                                                                         contract_address, token_address):
         try:
-            boto_client = BotoUtils(
-                region_name=NUNET_SIGNER_PRIVATE_KEY_STORAGE_REGION)
-            private_key = boto_client.get_parameter_value_from_secrets_manager(
-                secret_name=NUNET_SIGNER_PRIVATE_KEY)
+            private_key = secret_provider.get_secret(
+                secret_name=NUNET_SIGNER_PRIVATE_KEY, region_name=NUNET_SIGNER_PRIVATE_KEY_STORAGE_REGION)
 
             return generate_claim_signature_with_total_eligibile_amount(
                 total_eligible_amount, amount, airdrop_id, airdrop_window_id, user_wallet_address, contract_address,
@@ -488,6 +533,84 @@ class AirdropServices:
         except BaseException as e:
             raise e
 
+    @staticmethod
+    def __save_claim_signature(claim_signature_repository, airdrop_id, airdrop_window_id, address,
+                               claimable_amount, total_eligible_amount, contract_address, token_address, signature,
+                               signer_address):
+        # Replaces a signature of previous amounts, the claim itself does not depend on it
+        claim_signature_lookups["misses"] += 1
+        lookups = claim_signature_lookups["hits"] + claim_signature_lookups["misses"]
+        logger.info(f"Claim of {address = }, {airdrop_window_id = } was not signed ahead, "
+                    f"{claim_signature_lookups['misses']} of {lookups} claims missed "
+                    f"({claim_signature_lookups['misses'] / lookups:.1%})")
+        try:
+            claim_signature_repository.save_signatures([{
+                "airdrop_id": airdrop_id,
+                "airdrop_window_id": airdrop_window_id,
+                "address": address,
+                "claimable_amount": claimable_amount,
+                "total_eligible_amount": total_eligible_amount,
+                "contract_address": contract_address,
+                "token_address": token_address,
+                "signature": signature,
+                "signer_address": signer_address
+            }])
+        except BaseException as e:
+            logger.exception(f"Claim signature of {address = }, {airdrop_window_id = } not saved: {e}")
+
+    def sign_window_claims(self, airdrop_window) -> dict:
+        """
+        Signs the claims of every rewarded address of the window for the amounts it can
+        claim once the claim period opens. Addresses already signed for these amounts are
+        skipped, so the job can run repeatedly while rewards, registrations and claims change.
+        """
+        result = {"airdrop_id": airdrop_window.airdrop_id, "airdrop_window_id": airdrop_window.id,
+                  "signed": 0, "deleted": 0}
+        airdrop = AirdropRepository().get_airdrop_details(airdrop_window.airdrop_id)
+        airdrop_object = self.load_airdrop_class(airdrop)(airdrop.id, airdrop_window.id)
+        if not airdrop_object.is_claim_signature_required:
+            return result
+
+        claim_signature_repository = ClaimSignatureRepository()
+        result["deleted"] = claim_signature_repository.delete_unrewarded(airdrop_window.id)
+        # Claims signed with a previous key are signed again after a rotation
+        signer = get_local_signer(self.get_private_key_for_generating_claim_signature(
+            secret_name=airdrop_object.claim_signature_private_key_secret))
+        claims = claim_signature_repository.get_unsigned_claims(airdrop_window, airdrop.contract_address,
+                                                                 airdrop.token_address, signer.address)
+        if not claims:
+            return result
+
+        for start in range(0, len(claims), CLAIM_SIGNATURE_BATCH_SIZE):
+            batch = claims[start:start + CLAIM_SIGNATURE_BATCH_SIZE]
+            digests = []
+            for address, claimable_amount, total_eligible_amount in batch:
+                signature_details = airdrop_object.format_and_get_claim_signature_details(signature_parameters={
+                    "claimable_amount": claimable_amount,
+                    "total_eligible_amount": total_eligible_amount,
+                    "user_address": address,
+                    "contract_address": airdrop.contract_address,
+                    "token_address": airdrop.token_address
+                })
+                if signature_details is None:
+                    logger.info(f"Claims of {airdrop_object.__class__.__name__} are not signed ahead")
+                    return result
+                digests.append(Web3.solidity_keccak(*signature_details))
+            signatures = signer.sign_digests(digests)
+            result["signed"] += claim_signature_repository.save_signatures([{
+                "airdrop_id": airdrop.id,
+                "airdrop_window_id": airdrop_window.id,
+                "address": address,
+                "claimable_amount": claimable_amount,
+                "total_eligible_amount": total_eligible_amount,
+                "contract_address": airdrop.contract_address,
+                "token_address": airdrop.token_address,
+                "signature": signature.hex(),
+                "signer_address": signer.address
+            } for (address, claimable_amount, total_eligible_amount), signature in zip(batch, signatures)])
+        logger.info(f"Signed {result['signed']} claims of window {airdrop_window.id}")
+        return result
+
     def get_airdrops_schedule(self, airdrop_id):
         try:
             response = AirdropRepository().get_airdrops_schedule(airdrop_id)
@@ -502,18 +625,12 @@ class AirdropServices:
 
     @staticmethod
     def generate_signature(private_key, data_types: list, values: list):
-        message = Web3.solidity_keccak(data_types, values)
-        message_hash = encode_defunct(message)
-        web3_object = Web3(web3.providers.HTTPProvider(NETWORK["http_provider"]))
-        signed_message = web3_object.eth.account.sign_message(message_hash, private_key=private_key)
-
-        return signed_message.signature.hex()
+        return get_local_signer(private_key).sign_solidity(data_types, values).hex()
 
     @staticmethod
     def get_private_key_for_generating_claim_signature(secret_name):
-        boto_client = BotoUtils(region_name=DEFAULT_REGION)
         try:
-            return boto_client.get_parameter_value_from_secrets_manager(secret_name=secret_name)
+            return secret_provider.get_secret(secret_name=secret_name, region_name=DEFAULT_REGION)
         except Exception as e:
             raise Exception("Unable to fetch private key for generating claim signature.")
 
@@ -31,3 +31,25 @@ class CommonLogicService:
                 airdrop_window_id=airdrop_window_id,
                 registration_id=registration_id
             )
+
+    @staticmethod
+    def get_user_registrations_for_windows(
+            address: str,
+            airdrop_window_ids: list[int]
+    ) -> dict[int, list[UserRegistration]]:
+        registration_repo = UserRegistrationRepository()
+        network = Utils.recognize_blockchain_network(address)
+        if (network == Blockchain.ETHEREUM.value or
+            address.startswith(tuple(CARDANO_ADDRESS_PREFIXES[CardanoEra.BYRON]))):
+            return registration_repo.get_user_registrations_for_windows(
+                airdrop_window_ids=airdrop_window_ids,
+                address=address
+            )
+        elif network == Blockchain.CARDANO.value:
+            payment_part, staking_part = Utils.get_payment_staking_parts(address)
+            return registration_repo.get_user_registrations_for_windows(
+                airdrop_window_ids=airdrop_window_ids,
+                payment_part=payment_part,
+                staking_part=staking_part
+            )
+        return {window_id: [] for window_id in airdrop_window_ids}
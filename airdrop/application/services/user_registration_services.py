@@ -22,7 +22,7 @@ from airdrop.constants import (
     UserClaimStatus
 )
 from airdrop.application.types.windows import WindowRegistrationData, RegistrationDetails
-from airdrop.infrastructure.models import AirdropWindow, PendingTransaction
+from airdrop.infrastructure.models import AirdropWindow, ClaimHistory, PendingTransaction, UserRegistration
 from airdrop.infrastructure.repositories.airdrop_repository import AirdropRepository
 from airdrop.infrastructure.repositories.airdrop_window_repository import AirdropWindowRepository
 from airdrop.infrastructure.repositories.pending_transaction_repo import PendingTransactionRepository
@@ -72,27 +72,19 @@ class UserRegistrationServices:
             raise Exception(f"Unexpected aidrop_claim_status: {airdrop_claim_status}")
 
     @staticmethod
-    def __get_registration_data(address: str, airdrop_window: AirdropWindow) -> WindowRegistrationData:
-        is_registered, user_registration = CommonLogicService.get_user_registration_details(
-            address=address,
-            airdrop_window_id=airdrop_window.id
-        )
-
-        if isinstance(user_registration, list):
+    def __get_registration_data(
+        address: str,
+        airdrop_window: AirdropWindow,
+        user_registrations: List[UserRegistration],
+        last_claim: ClaimHistory | None,
+        last_ada_transfer: ClaimHistory | None
+    ) -> WindowRegistrationData:
+        if len(user_registrations) > 1:
             logger.error(f"Find multiple registrations for {address=}, {airdrop_window.id=}")
             raise BadRequestException("Something wrong with user registration")
 
-        last_claim = ClaimHistoryRepository().get_last_claim_history(
-            airdrop_window_id=airdrop_window.id,
-            address=address,
-            blockchain_method="token_transfer"
-        )
-
-        last_ada_transfer = ClaimHistoryRepository().get_last_claim_history(
-            airdrop_window_id=airdrop_window.id,
-            address=address,
-            blockchain_method="ada_transfer"
-        )
+        is_registered = bool(user_registrations)
+        user_registration = user_registrations[0] if is_registered else None
 
         airdrop_claim_status = None
         if last_claim is not None:
@@ -173,12 +165,27 @@ class UserRegistrationServices:
                 with_signature = True
 
             rewards_awarded = AirdropRepository().fetch_total_rewards_amount(airdrop_id, address)
+
+            # Registrations and latest claims of all windows are read at once
+            window_ids = [window.id for window in airdrop_windows]
+            registrations = CommonLogicService.get_user_registrations_for_windows(
+                address=address,
+                airdrop_window_ids=window_ids
+            )
+            last_claims = ClaimHistoryRepository().get_last_claims_for_windows(
+                airdrop_window_ids=window_ids,
+                address=address,
+                blockchain_methods=("token_transfer", "ada_transfer")
+            )
             windows_registration_data: List[WindowRegistrationData] = []
             for window in airdrop_windows:
                 windows_registration_data.append(
                     UserRegistrationServices.__get_registration_data(
                         address=address,
                         airdrop_window=window,
+                        user_registrations=registrations[window.id],
+                        last_claim=last_claims.get((window.id, "token_transfer")),
+                        last_ada_transfer=last_claims.get((window.id, "ada_transfer"))
                     )
                 )
 
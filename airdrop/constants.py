@@ -8,6 +8,11 @@ PROCESSOR_PATH = "airdrop.processor"
 COMMON_CNTRCT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "resources"))
 AIRDROP_ADDR_PATH = COMMON_CNTRCT_PATH + "/singularitynet-airdrop-contracts/networks/SingularityAirdrop.json"
 STAKING_CONTRACT_PATH = COMMON_CNTRCT_PATH + "/singularitynet-staking-contract"
+# Seconds an airdrop or airdrop window row is reused by warm containers
+AIRDROP_METADATA_CACHE_TTL = 300
+# Claims are signed ahead from this many hours before the claim period of a window opens
+CLAIM_SIGNATURE_HOURS_BEFORE_CLAIM = 24
+CLAIM_SIGNATURE_BATCH_SIZE = 1000
 
 ELIGIBILITY_SCHEMA = {
     "type": "object",
@@ -167,6 +172,49 @@ class Blockchain(Enum):
     ETHEREUM = "Ethereum"
 
 
+class SnapshotStorage(Enum):
+    # DELTA and HISTORY number snapshots per window, so a window should keep one of them
+    # One user_balance_snapshot row per address for every active window
+    PER_WINDOW = "per_window"
+    # One balance_snapshot row per address, linked to windows by balance_snapshot_window
+    SHARED = "shared"
+    # Only balances changed since the window's previous snapshot, in user_balance_snapshot_delta
+    DELTA = "delta"
+    # One user_balance_history row per address per stable balance interval
+    HISTORY = "history"
+
+
+class RewardRunStatus(Enum):
+    # Rewards are written to user_rewards_staging and not visible yet
+    STAGED = "staged"
+    # Rewards of the run are the ones in user_rewards
+    PUBLISHED = "published"
+    # A later run of the window was published
+    SUPERSEDED = "superseded"
+    # The window was rolled back to the run published before this one
+    ROLLED_BACK = "rolled_back"
+    # Processing failed before publishing, staged rows are removed
+    FAILED = "failed"
+
+
+class ClaimMode(Enum):
+    # Claims carry a signature of the signer key over the claimable amount
+    SIGNATURE = "signature"
+    # Claims carry a proof of (address, amount, window) against the Merkle root set in the contract
+    MERKLE_PROOF = "merkle_proof"
+
+
+class MerkleDistributionStatus(Enum):
+    # Proofs are written but not served, the root may not be in the contract yet
+    STAGED = "staged"
+    # Proofs of the distribution are the ones served to claims
+    PUBLISHED = "published"
+    # A later distribution of the airdrop was published
+    SUPERSEDED = "superseded"
+    # Building failed before publishing, its proofs are removed
+    FAILED = "failed"
+
+
 class CardanoEra(Enum):
     BYRON = "Byron"
     SHELLEY = "Shelley"
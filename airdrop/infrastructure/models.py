@@ -1,5 +1,5 @@
 from sqlalchemy import BIGINT, VARCHAR, Column, DECIMAL, TEXT, text, UniqueConstraint, INTEGER, ForeignKey, JSON, Index
-from sqlalchemy.dialects.mysql import TIMESTAMP, BIT
+from sqlalchemy.dialects.mysql import TIMESTAMP, BIT, LONGBLOB, VARBINARY
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -108,6 +108,97 @@ class UserBalanceSnapshot(Base, AuditClass):
     Index("snapshot_guid_idx", snapshot_guid)
 
 
+class BalanceSnapshot(Base, AuditClass):
+    # Window-independent snapshot storage: one row per address per snapshot_guid,
+    # linked to the windows it applies to through balance_snapshot_window
+    __tablename__ = "balance_snapshot"
+    address = Column("address", VARCHAR(250), nullable=False)
+    payment_part = Column("payment_part", VARCHAR(250), nullable=True)
+    staking_part = Column("staking_part", VARCHAR(250), nullable=True)
+    balance = Column("balance", DECIMAL(64, 0), nullable=False)
+    staked = Column("staked", DECIMAL(64, 0), nullable=False)
+    total = Column("total", DECIMAL(64, 0), nullable=False)
+    snapshot_guid = Column("snapshot_guid", VARCHAR(50), nullable=False)
+    Index("balance_snapshot_guid_addr_idx", snapshot_guid, address)
+    Index("balance_snapshot_payment_staking_idx", payment_part, staking_part)
+
+
+class BalanceSnapshotWindow(Base, AuditClass):
+    __tablename__ = "balance_snapshot_window"
+    airdrop_window_id = Column(
+        BIGINT,
+        ForeignKey("airdrop_window.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    snapshot_guid = Column("snapshot_guid", VARCHAR(50), nullable=False, index=True)
+    # Position of the snapshot within the window, null only for links written before it was numbered
+    snapshot_seq = Column("snapshot_seq", INTEGER, nullable=True)
+    # Set once the snapshot is folded into user_balance_snapshot_aggregate
+    aggregated = Column("aggregated", BIT, nullable=False, server_default=text("b'0'"))
+    UniqueConstraint(airdrop_window_id, snapshot_guid)
+
+
+class UserBalanceSnapshotAggregate(Base, AuditClass):
+    # Running per-address aggregates over the snapshots of a window, updated on ingestion
+    __tablename__ = "user_balance_snapshot_aggregate"
+    airdrop_window_id = Column(
+        BIGINT,
+        ForeignKey("airdrop_window.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    address = Column("address", VARCHAR(250), nullable=False)
+    min_total = Column("min_total", DECIMAL(64, 0), nullable=False)
+    min_staked = Column("min_staked", DECIMAL(64, 0), nullable=False)
+    max_total = Column("max_total", DECIMAL(64, 0), nullable=False)
+    occurrences = Column("occurrences", INTEGER, nullable=False)
+    UniqueConstraint(airdrop_window_id, address)
+
+
+class UserBalanceSnapshotDelta(Base, AuditClass):
+    # Delta snapshot storage: only balances that changed, appeared or disappeared
+    # (is_removed) since the previous snapshot of the window are written
+    __tablename__ = "user_balance_snapshot_delta"
+    airdrop_window_id = Column(
+        BIGINT,
+        ForeignKey("airdrop_window.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    address = Column("address", VARCHAR(250), nullable=False)
+    payment_part = Column("payment_part", VARCHAR(250), nullable=True)
+    staking_part = Column("staking_part", VARCHAR(250), nullable=True)
+    balance = Column("balance", DECIMAL(64, 0), nullable=False)
+    staked = Column("staked", DECIMAL(64, 0), nullable=False)
+    total = Column("total", DECIMAL(64, 0), nullable=False)
+    is_removed = Column("is_removed", BIT, nullable=False, default=False)
+    snapshot_guid = Column("snapshot_guid", VARCHAR(50), nullable=False)
+    snapshot_seq = Column("snapshot_seq", INTEGER, nullable=False)
+    Index("delta_window_addr_seq_idx", airdrop_window_id, address, snapshot_seq)
+    Index("delta_payment_staking_idx", payment_part, staking_part)
+
+
+class UserBalanceHistory(Base, AuditClass):
+    # Run-length balance history: one row per address per stable balance interval,
+    # from valid_from_snapshot to valid_to_snapshot (null while still current)
+    __tablename__ = "user_balance_history"
+    airdrop_window_id = Column(
+        BIGINT,
+        ForeignKey("airdrop_window.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    address = Column("address", VARCHAR(250), nullable=False)
+    payment_part = Column("payment_part", VARCHAR(250), nullable=True)
+    staking_part = Column("staking_part", VARCHAR(250), nullable=True)
+    balance = Column("balance", DECIMAL(64, 0), nullable=False)
+    staked = Column("staked", DECIMAL(64, 0), nullable=False)
+    total = Column("total", DECIMAL(64, 0), nullable=False)
+    # Snapshot that opened the interval
+    snapshot_guid = Column("snapshot_guid", VARCHAR(50), nullable=False)
+    valid_from_snapshot = Column("valid_from_snapshot", INTEGER, nullable=False)
+    valid_to_snapshot = Column("valid_to_snapshot", INTEGER, nullable=True)
+    Index("history_window_addr_to_idx", airdrop_window_id, address, valid_to_snapshot)
+    Index("history_payment_staking_idx", payment_part, staking_part)
+
+
 class UserRegistration(Base, AuditClass):
     __tablename__ = "user_registrations"
     airdrop_window_id = Column(
@@ -189,6 +280,163 @@ class UserRewardAudit(Base, AuditClass):
     comment = Column("comment", VARCHAR(512))
 
 
+class UserRewardAuditArtifact(Base, AuditClass):
+    # Compact audit of a reward run: the per-address values of all users as gzipped
+    # columnar JSON, split in parts of bounded size
+    __tablename__ = "user_rewards_audit_artifact"
+    airdrop_id = Column("airdrop_id", BIGINT, nullable=False)
+    airdrop_window_id = Column("airdrop_window_id", BIGINT, nullable=False)
+    snapshot_guid = Column("snapshot_guid", VARCHAR(50), nullable=False)
+    run_guid = Column("run_guid", VARCHAR(50), nullable=False)
+    part = Column("part", INTEGER, nullable=False)
+    row_count = Column("row_count", INTEGER, nullable=False)
+    format = Column("format", VARCHAR(20), nullable=False)
+    payload = Column("payload", LONGBLOB, nullable=False)
+    Index("audit_artifact_window_snapshot_idx", airdrop_window_id, snapshot_guid)
+    UniqueConstraint(run_guid, part)
+
+
+class UserRewardScoreCache(Base, AuditClass):
+    # Scores of the latest reward run of a window, reused by incremental runs for
+    # addresses whose snapshot aggregates did not change
+    __tablename__ = "user_reward_score_cache"
+    airdrop_window_id = Column(
+        BIGINT,
+        ForeignKey("airdrop_window.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    address = Column("address", VARCHAR(250), nullable=False)
+    balance = Column("balance", DECIMAL(64, 0), nullable=False)
+    staked = Column("staked", DECIMAL(64, 0), nullable=False)
+    score = Column("score", DECIMAL(18, 8), nullable=False)
+    normalized_score = Column("normalized_score", DECIMAL(18, 8), nullable=False)
+    UniqueConstraint(airdrop_window_id, address)
+
+
+class UserRewardRun(Base, AuditClass):
+    # One row per reward processing run of a window; the published run is the one in user_rewards
+    __tablename__ = "user_rewards_run"
+    run_guid = Column("run_guid", VARCHAR(50), nullable=False, unique=True)
+    airdrop_id = Column(
+        BIGINT,
+        ForeignKey("airdrop.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    airdrop_window_id = Column(
+        BIGINT,
+        ForeignKey("airdrop_window.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    snapshot_guid = Column("snapshot_guid", VARCHAR(50), nullable=True)
+    status = Column("status", VARCHAR(20), nullable=False)
+    rewarded_users = Column("rewarded_users", INTEGER, nullable=True)
+    published_at = Column("published_at", TIMESTAMP(), nullable=True)
+    Index("rewards_run_window_status_idx", airdrop_window_id, status)
+
+
+class UserRewardStaging(Base, AuditClass):
+    # Rewards of a run before it is published to user_rewards
+    __tablename__ = "user_rewards_staging"
+    run_guid = Column("run_guid", VARCHAR(50), nullable=False)
+    airdrop_id = Column("airdrop_id", BIGINT, nullable=False)
+    airdrop_window_id = Column("airdrop_window_id", BIGINT, nullable=False)
+    address = Column("address", VARCHAR(250), nullable=False)
+    rewards_awarded = Column("rewards_awarded", DECIMAL(64, 0), nullable=False)
+    score = Column("score", DECIMAL(18, 8), nullable=False)
+    normalized_score = Column("normalized_score", DECIMAL(18, 8), nullable=False)
+    UniqueConstraint(run_guid, address)
+
+
+class UserRewardAuditStaging(Base, AuditClass):
+    # Audit of a run before it is published to user_rewards_audit with the rewards of the run
+    __tablename__ = "user_rewards_audit_staging"
+    run_guid = Column("run_guid", VARCHAR(50), nullable=False, index=True)
+    airdrop_id = Column("airdrop_id", BIGINT, nullable=False)
+    airdrop_window_id = Column("airdrop_window_id", BIGINT, nullable=False)
+    snapshot_guid = Column("snapshot_guid", VARCHAR(50), nullable=True)
+    address = Column("address", VARCHAR(250), nullable=False)
+    balance = Column("balance", BIGINT, nullable=False)
+    staked = Column("staked", BIGINT, nullable=False)
+    score = Column("score", DECIMAL(18, 8), nullable=False)
+    normalized_score = Column("normalized_score", DECIMAL(18, 8), nullable=False)
+    rewards_awarded = Column("rewards_awarded", DECIMAL(64, 0), nullable=False)
+    comment = Column("comment", VARCHAR(512))
+
+
+class UserClaimableBalance(Base, AuditClass):
+    # Claimable rewards of an address per airdrop, kept in sync with user_rewards,
+    # user_registrations and claim_history so claims read a single row
+    __tablename__ = "user_claimable_balance"
+    airdrop_id = Column(
+        BIGINT,
+        ForeignKey("airdrop.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    address = Column("address", VARCHAR(250), nullable=False)
+    # Rewards of the registered windows whose claim has started
+    total_rewards = Column("total_rewards", DECIMAL(64, 0), nullable=False)
+    # Tokens of in progress or completed token transfer claims
+    claimed_amount = Column("claimed_amount", DECIMAL(64, 0), nullable=False)
+    # Rewards of the registered windows after the last claimed window
+    unclaimed_rewards = Column("unclaimed_rewards", DECIMAL(64, 0), nullable=False)
+    # Windows of the airdrop whose claim had started when the row was computed
+    claim_started_windows = Column("claim_started_windows", INTEGER, nullable=False)
+    UniqueConstraint(airdrop_id, address)
+
+
+class ClaimSignature(Base, AuditClass):
+    # Claim signatures signed ahead of the claim period, served when the claim
+    # is made for the same amounts and contract
+    __tablename__ = "claim_signature"
+    airdrop_id = Column(
+        BIGINT,
+        ForeignKey("airdrop.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    airdrop_window_id = Column(
+        BIGINT,
+        ForeignKey("airdrop_window.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    address = Column("address", VARCHAR(250), nullable=False)
+    claimable_amount = Column("claimable_amount", DECIMAL(64, 0), nullable=False)
+    total_eligible_amount = Column("total_eligible_amount", DECIMAL(64, 0), nullable=False)
+    contract_address = Column("contract_address", VARCHAR(50), nullable=False)
+    token_address = Column("token_address", VARCHAR(50), nullable=False)
+    signature = Column("signature", VARCHAR(250), nullable=False)
+    # Address of the key that signed, signatures of a rotated key are signed again
+    signer_address = Column("signer_address", VARCHAR(50), nullable=True)
+    UniqueConstraint(airdrop_window_id, address)
+
+
+class MerkleDistribution(Base, AuditClass):
+    # One row per Merkle tree built over the rewards of an airdrop; the published one is served to claims
+    __tablename__ = "merkle_distribution"
+    distribution_guid = Column("distribution_guid", VARCHAR(50), nullable=False, unique=True)
+    airdrop_id = Column(
+        BIGINT,
+        ForeignKey("airdrop.row_id", ondelete="RESTRICT"),
+        nullable=False,
+    )
+    merkle_root = Column("merkle_root", VARCHAR(66), nullable=True)
+    leaf_count = Column("leaf_count", INTEGER, nullable=True)
+    depth = Column("depth", INTEGER, nullable=True)
+    status = Column("status", VARCHAR(20), nullable=False)
+    published_at = Column("published_at", TIMESTAMP(), nullable=True)
+    Index("merkle_distribution_airdrop_status_idx", airdrop_id, status)
+
+
+class MerkleProof(Base, AuditClass):
+    # Proof of a (address, amount, window) leaf, the sibling hashes packed 32 bytes each
+    __tablename__ = "merkle_proof"
+    merkle_distribution_id = Column("merkle_distribution_id", BIGINT, nullable=False)
+    airdrop_window_id = Column("airdrop_window_id", BIGINT, nullable=False)
+    address = Column("address", VARCHAR(50), nullable=False)
+    amount = Column("amount", DECIMAL(64, 0), nullable=False)
+    proof = Column("proof", VARBINARY(1024), nullable=False)
+    UniqueConstraint(merkle_distribution_id, airdrop_window_id, address)
+
+
 class UserNotifications(Base, AuditClass):
     __tablename__ = "user_notifications"
     email = Column("email", VARCHAR(255), nullable=False)
@@ -8,6 +8,20 @@ from airdrop.infrastructure.models import (
     UserRegistration, ClaimHistory, UserReward
 )
 from airdrop.infrastructure.repositories.base_repository import BaseRepository
+from airdrop.infrastructure.repositories.claimable_balance import (
+    CLAIMED_TOKENS_AIRDROP_CLASSES,
+    IN_PROGRESS_OR_COMPLETED_TX_STATUSES,
+    TOKENS_CLAIM_BLOCKCHAIN_METHODS,
+)
+from airdrop.infrastructure.repositories.metadata_cache import (
+    airdrop_key,
+    airdrop_metadata_cache,
+    invalidate_airdrop_window,
+    row_values,
+    window_key,
+    windows_key,
+)
+from airdrop.infrastructure.repositories.user_claimable_balance_repository import UserClaimableBalanceRepository
 from airdrop.utils import datetime_in_utcnow
 from common.logger import get_logger
 
@@ -175,6 +189,7 @@ class AirdropRepository(BaseRepository):
                                        snapshot_required=snapshot_required, claim_start_period=claim_start_period,
                                        claim_end_period=claim_end_period, total_airdrop_tokens=total_airdrop_tokens)
         self.add(airdrop_window)
+        airdrop_metadata_cache.invalidate(windows_key(airdrop_id))
         return self.session.query(AirdropWindow).filter_by(airdrop_id=airdrop_id,
                                                            airdrop_window_name=airdrop_window_name).first()
 
@@ -268,12 +283,12 @@ class AirdropRepository(BaseRepository):
         return total_rewards, user_wallet_address, contract_address, token_address, staking_contract_address, total_eligibility_amount
 
     def fetch_total_rewards_amount(self, airdrop_id, address, airdrop_class: str | None = None):
-        in_progress_or_completed_tx_statuses = (
-            AirdropClaimStatus.SUCCESS.value, AirdropClaimStatus.PENDING.value,
-            AirdropClaimStatus.CLAIM_INITIATED.value, AirdropClaimStatus.CLAIM_SUBMITTED.value,
-            AirdropClaimStatus.CLAIM_FAILED.value
-        )
-        tokens_claim_blockchain_methods = ("token_transfer",)
+        # Read from user_claimable_balance, fetch_total_rewards_amount_live computes the same amount
+        return UserClaimableBalanceRepository().get_claimable_amount(airdrop_id, address, airdrop_class)
+
+    def fetch_total_rewards_amount_live(self, airdrop_id, address, airdrop_class: str | None = None):
+        in_progress_or_completed_tx_statuses = IN_PROGRESS_OR_COMPLETED_TX_STATUSES
+        tokens_claim_blockchain_methods = TOKENS_CLAIM_BLOCKCHAIN_METHODS
         try:
             # return zero if there are no rewards, please note that MYSQL smartly sums up varchar columns and returns
             # it as a bigint if you have a very big number stored as a varchar in the rewards table.
@@ -282,7 +297,7 @@ class AirdropRepository(BaseRepository):
             # Original query is in the else block
             # TODO: make more universal query for fetching total rewards amount
 
-            if airdrop_class in ("LoyaltyAirdrop", "RejuveAirdrop"):
+            if airdrop_class in CLAIMED_TOKENS_AIRDROP_CLASSES:
                 query_rewards = text(
                     "SELECT IFNULL(SUM(ur.rewards_awarded),0) AS 'total_rewards' FROM user_rewards ur, airdrop_window aw "
                     "WHERE ur.airdrop_window_id = aw.row_id AND ur.address = :address AND aw.airdrop_id = :airdrop_id "
@@ -385,10 +400,24 @@ class AirdropRepository(BaseRepository):
         return AirdropFactory.convert_airdrop_schedule_model_to_entity_model(airdrop_row_data)
 
     def get_airdrop_details(self, airdrop_id):
-        return self.session.query(Airdrop).filter(Airdrop.id == airdrop_id).first()
+        return airdrop_metadata_cache.get(airdrop_key(airdrop_id), lambda: row_values(
+            self.session.query(Airdrop).filter(Airdrop.id == airdrop_id).first()))
 
     def get_airdrop_window_details(self, airdrop_window_id):
-        return self.session.query(AirdropWindow).filter(AirdropWindow.id == airdrop_window_id).first()
+        return airdrop_metadata_cache.get(window_key(airdrop_window_id), lambda: row_values(
+            self.session.query(AirdropWindow).filter(AirdropWindow.id == airdrop_window_id).first()))
+
+    def get_airdrops_in_claim_period(self):
+        now = datetime_in_utcnow()
+        try:
+            airdrops = self.session.query(Airdrop).join(AirdropWindow, AirdropWindow.airdrop_id == Airdrop.id) \
+                .filter(AirdropWindow.claim_start_period <= now, AirdropWindow.claim_end_period >= now) \
+                .distinct().all()
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+        return airdrops
 
     def update_minimum_stake_amount(self, airdrop_window_id, minimum_stake_amount):
         try:
@@ -396,7 +425,8 @@ class AirdropRepository(BaseRepository):
                 AirdropWindow.id == airdrop_window_id).first()
             if transaction is not None:
                 transaction.minimum_stake_amount = minimum_stake_amount
-                return self.session.commit()
+                self.session.commit()
+                invalidate_airdrop_window(airdrop_window_id, transaction.airdrop_id)
         except SQLAlchemyError as e:
             self.session.rollback()
             raise e
@@ -1,15 +1,20 @@
 from typing import List
 from airdrop.infrastructure.repositories.base_repository import BaseRepository
 from airdrop.infrastructure.models import AirdropWindow, ClaimHistory
+from airdrop.infrastructure.repositories.metadata_cache import (
+    airdrop_metadata_cache,
+    row_values,
+    window_key,
+    windows_key,
+)
 from sqlalchemy import and_
 
 
 class AirdropWindowRepository(BaseRepository):
 
     def get_airdrop_window_by_id(self, window_id: int):
-        airdrop_window = self.session.query(AirdropWindow).filter(
-            AirdropWindow.id == window_id).first()
-        return airdrop_window
+        return airdrop_metadata_cache.get(window_key(window_id), lambda: row_values(
+            self.session.query(AirdropWindow).filter(AirdropWindow.id == window_id).first()))
 
     def is_airdrop_window_claimed(self, airdrop_window_id, address) -> str | None:
         claim_history = self.session.query(ClaimHistory.id, ClaimHistory.transaction_status) \
@@ -50,7 +55,8 @@ class AirdropWindowRepository(BaseRepository):
         return len(claimable_windows) > 0
 
     def get_airdrop_windows(self, airdrop_id: int) -> List[AirdropWindow]:
-        return self.session.query(AirdropWindow) \
-                   .filter(AirdropWindow.airdrop_id == airdrop_id) \
-                   .order_by(AirdropWindow.airdrop_window_order.asc()) \
-                   .all()
+        return airdrop_metadata_cache.get(windows_key(airdrop_id), lambda: row_values(
+            self.session.query(AirdropWindow)
+                .filter(AirdropWindow.airdrop_id == airdrop_id)
+                .order_by(AirdropWindow.airdrop_window_order.asc())
+                .all()))
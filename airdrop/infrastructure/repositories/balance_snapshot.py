@@ -1,66 +1,153 @@
-from typing import List
-from sqlalchemy import or_
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Callable, List
+from sqlalchemy import Row, and_, exists, func, or_, select, union_all
+from sqlalchemy.orm import aliased
 from sqlalchemy.exc import SQLAlchemyError
 
-from airdrop.infrastructure.models import UserBalanceSnapshot, AirdropWindow
+from airdrop.infrastructure.models import (
+    AirdropWindow,
+    BalanceSnapshot,
+    BalanceSnapshotWindow,
+    UserBalanceHistory,
+    UserBalanceSnapshot,
+    UserBalanceSnapshotDelta,
+)
 from airdrop.infrastructure.repositories.base_repository import BaseRepository
 from common.logger import get_logger
 
 logger = get_logger(__name__)
 
+SNAPSHOT_COLUMN_NAMES = ("address", "payment_part", "staking_part", "balance", "staked", "total", "snapshot_guid")
+
+
+def window_balance_snapshots(criteria: Callable[[SimpleNamespace], list] = lambda columns: []):
+    """
+    Snapshot rows per window from all storage layouts: legacy per-window rows of
+    user_balance_snapshot, shared balance_snapshot rows linked through
+    balance_snapshot_window, and snapshots reconstructed from the delta rows of
+    user_balance_snapshot_delta and the intervals of user_balance_history. `criteria` gets the columns of each branch and returns
+    the filters to apply, so they are pushed inside every side of the union.
+    """
+    output_names = ("airdrop_window_id",) + SNAPSHOT_COLUMN_NAMES
+    legacy_columns = SimpleNamespace(
+        airdrop_window_id=UserBalanceSnapshot.airdrop_window_id,
+        **{name: getattr(UserBalanceSnapshot, name) for name in SNAPSHOT_COLUMN_NAMES}
+    )
+    shared_columns = SimpleNamespace(
+        airdrop_window_id=BalanceSnapshotWindow.airdrop_window_id,
+        **{name: getattr(BalanceSnapshot, name) for name in SNAPSHOT_COLUMN_NAMES}
+    )
+    # A delta row belongs to a snapshot if it is the latest row of its address
+    # at or before that snapshot's position in the window
+    delta_columns = SimpleNamespace(
+        **{name: getattr(UserBalanceSnapshotDelta, name) for name in SNAPSHOT_COLUMN_NAMES},
+    )
+    delta_columns.airdrop_window_id = BalanceSnapshotWindow.airdrop_window_id
+    delta_columns.snapshot_guid = BalanceSnapshotWindow.snapshot_guid
+    newer_delta = aliased(UserBalanceSnapshotDelta)
+    history_columns = SimpleNamespace(
+        **{name: getattr(UserBalanceHistory, name) for name in SNAPSHOT_COLUMN_NAMES},
+    )
+    history_columns.airdrop_window_id = BalanceSnapshotWindow.airdrop_window_id
+    history_columns.snapshot_guid = BalanceSnapshotWindow.snapshot_guid
+
+    legacy = select(*[getattr(legacy_columns, name).label(name) for name in output_names])\
+        .where(*criteria(legacy_columns))
+    shared = select(*[getattr(shared_columns, name).label(name) for name in output_names])\
+        .join(BalanceSnapshotWindow, BalanceSnapshotWindow.snapshot_guid == BalanceSnapshot.snapshot_guid)\
+        .where(*criteria(shared_columns))
+    delta = select(*[getattr(delta_columns, name).label(name) for name in output_names])\
+        .join(BalanceSnapshotWindow, and_(
+            BalanceSnapshotWindow.airdrop_window_id == UserBalanceSnapshotDelta.airdrop_window_id,
+            UserBalanceSnapshotDelta.snapshot_seq <= BalanceSnapshotWindow.snapshot_seq
+        ))\
+        .where(UserBalanceSnapshotDelta.is_removed == False,
+               ~exists().where(
+                   newer_delta.airdrop_window_id == UserBalanceSnapshotDelta.airdrop_window_id,
+                   newer_delta.address == UserBalanceSnapshotDelta.address,
+                   newer_delta.snapshot_seq > UserBalanceSnapshotDelta.snapshot_seq,
+                   newer_delta.snapshot_seq <= BalanceSnapshotWindow.snapshot_seq
+               ),
+               *criteria(delta_columns))
+    history = select(*[getattr(history_columns, name).label(name) for name in output_names])\
+        .join(BalanceSnapshotWindow, and_(
+            BalanceSnapshotWindow.airdrop_window_id == UserBalanceHistory.airdrop_window_id,
+            BalanceSnapshotWindow.snapshot_seq >= UserBalanceHistory.valid_from_snapshot,
+            BalanceSnapshotWindow.snapshot_seq <= func.coalesce(UserBalanceHistory.valid_to_snapshot,
+                                                                BalanceSnapshotWindow.snapshot_seq)
+        ))\
+        .where(*criteria(history_columns))
+    return union_all(legacy, shared, delta, history).subquery("window_balance_snapshot")
+
 
 class UserBalanceSnapshotRepository(BaseRepository):
-    def get_data_by_address(
-        self,
-        address: str,
-        airdrop_id: int
-    ) -> List[UserBalanceSnapshot] | None:
+    def __get_airdrop_balances(self, airdrop_id: int, criteria: Callable[[SimpleNamespace], list]) -> List[Row]:
+        windows = select(AirdropWindow.id).where(AirdropWindow.airdrop_id == airdrop_id)
+        snapshots = window_balance_snapshots(
+            lambda columns: [columns.airdrop_window_id.in_(windows), columns.total > 0] + criteria(columns)
+        )
         try:
-            user_balances = (
-                self.session.query(UserBalanceSnapshot)
-                .join(
-                    AirdropWindow,
-                    UserBalanceSnapshot.airdrop_window_id == AirdropWindow.id
-                )
-                .filter(
-                    AirdropWindow.airdrop_id == airdrop_id,
-                    UserBalanceSnapshot.address == address,
-                    UserBalanceSnapshot.total > 0
-                )
-                .all()
-            )
-            return user_balances
+            return self.session.execute(select(snapshots)).all()
         except SQLAlchemyError as e:
             logger.exception(f"SQLAlchemyError: {e}")
             self.session.rollback()
             raise e
 
+    def get_data_by_address(
+        self,
+        address: str,
+        airdrop_id: int
+    ) -> List[Row] | None:
+        return self.__get_airdrop_balances(airdrop_id, lambda columns: [columns.address == address])
+
     def get_balances_by_staking_payment_parts_for_airdrop(
         self,
         airdrop_id: int,
         payment_part: str,
         staking_part: str,
-    ) -> List[UserBalanceSnapshot] | None:
+    ) -> List[Row] | None:
+        return self.__get_airdrop_balances(
+            airdrop_id,
+            lambda columns: [or_(columns.payment_part == payment_part, columns.staking_part == staking_part)]
+        )
+
+
+class UserBalanceHistoryRepository(BaseRepository):
+    """
+    Reads snapshot aggregates straight from the run-length intervals of
+    user_balance_history, so the cost follows the number of balance changes
+    rather than the number of snapshots.
+    """
+
+    def __get_interval_aggregates(self, airdrop_window_id: int, min_total: int | None = None):
+        latest_snapshot = select(func.coalesce(func.max(BalanceSnapshotWindow.snapshot_seq), 0))\
+            .where(BalanceSnapshotWindow.airdrop_window_id == airdrop_window_id)\
+            .scalar_subquery()
+        snapshots_in_interval = func.coalesce(UserBalanceHistory.valid_to_snapshot, latest_snapshot) \
+            - UserBalanceHistory.valid_from_snapshot + 1
+        query = select(UserBalanceHistory.address,
+                       func.min(UserBalanceHistory.total).label("min_total"),
+                       func.min(UserBalanceHistory.staked).label("min_staked"),
+                       func.sum(snapshots_in_interval).label("occurrences"))\
+            .where(UserBalanceHistory.airdrop_window_id == airdrop_window_id)\
+            .group_by(UserBalanceHistory.address)
+        if min_total is not None:
+            query = query.where(UserBalanceHistory.total >= min_total)
         try:
-            balances = (
-                self.session.query(UserBalanceSnapshot)
-                .join(
-                    AirdropWindow,
-                    UserBalanceSnapshot.airdrop_window_id == AirdropWindow.id
-                )
-                .filter(
-                    AirdropWindow.airdrop_id == airdrop_id,
-                    UserBalanceSnapshot.total > 0,
-                    or_(
-                        UserBalanceSnapshot.payment_part == payment_part,
-                        UserBalanceSnapshot.staking_part == staking_part
-                    )
-                )
-            ).all()
-
-            return balances
+            return self.session.execute(query).all()
         except SQLAlchemyError as e:
             logger.exception(f"SQLAlchemyError: {e}")
             self.session.rollback()
             raise e
 
+    def get_min_balances(self, airdrop_window_id: int, min_total: int | None = None) -> dict[str, tuple[Decimal, Decimal]]:
+        return {row.address: (row.min_total, row.min_staked)
+                for row in self.__get_interval_aggregates(airdrop_window_id, min_total)}
+
+    def get_snapshot_counts(self, airdrop_window_id: int, min_total: int | None = None) -> dict[str, int]:
+        return {row.address: int(row.occurrences)
+                for row in self.__get_interval_aggregates(airdrop_window_id, min_total)}
+
+    def get_aggregates(self, airdrop_window_id: int, min_total: int | None = None) -> List[Row]:
+        return self.__get_interval_aggregates(airdrop_window_id, min_total)
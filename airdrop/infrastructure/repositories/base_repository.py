@@ -2,6 +2,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.engine import URL
 from sqlalchemy.orm import sessionmaker
 from airdrop.config import NETWORK
+from airdrop.infrastructure.repositories.claimable_balance import track_claimable_balance_changes
 
 
 url = URL.create(
@@ -15,6 +16,7 @@ url = URL.create(
 engine = create_engine(url, pool_pre_ping=True, echo=False, isolation_level="READ COMMITTED")
 
 Session = sessionmaker(bind=engine)
+track_claimable_balance_changes(Session)
 default_session = Session()
 
 
@@ -170,3 +170,31 @@ class ClaimHistoryRepository(BaseRepository):
         )
 
         return claim_history
+
+    def get_last_claims_for_windows(
+        self,
+        airdrop_window_ids: list[int],
+        address: str,
+        blockchain_methods: tuple[str, ...]
+    ) -> dict[tuple[int, str], ClaimHistory]:
+        """
+        The latest claim of an address per (window id, blockchain method) for all the
+        given windows in one query.
+        """
+        if not airdrop_window_ids:
+            return {}
+        claims = (
+            self.session.query(ClaimHistory)
+            .filter(
+                ClaimHistory.airdrop_window_id.in_(airdrop_window_ids),
+                ClaimHistory.address == address,
+                ClaimHistory.blockchain_method.in_(blockchain_methods)
+            )
+            .order_by(ClaimHistory.row_created.desc())
+            .all()
+        )
+
+        last_claims = dict()
+        for claim in claims:
+            last_claims.setdefault((claim.airdrop_window_id, claim.blockchain_method), claim)
+        return last_claims
@@ -0,0 +1,130 @@
+from datetime import timedelta
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from airdrop.infrastructure.models import AirdropWindow, ClaimSignature
+from airdrop.infrastructure.repositories.base_repository import BaseRepository
+from airdrop.infrastructure.repositories.claimable_balance import IN_PROGRESS_OR_COMPLETED_TX_STATUSES
+from airdrop.utils import datetime_in_utcnow
+from common.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Rewards of the registered windows of the address ur whose claim starts by the claim start of the window
+WINDOW_REGISTERED_REWARDS = "SELECT IFNULL(SUM(r.rewards_awarded), 0) FROM user_rewards r " \
+                            "JOIN airdrop_window aw ON aw.row_id = r.airdrop_window_id " \
+                            "WHERE r.address = ur.address AND aw.airdrop_id = :airdrop_id " \
+                            "AND aw.claim_start_period <= :claim_start_period AND r.airdrop_window_id IN " \
+                            "(SELECT airdrop_window_id FROM user_registrations WHERE address = ur.address)"
+
+
+class ClaimSignatureRepository(BaseRepository):
+
+    def get_windows_to_sign(self, hours_before_claim: int) -> list[AirdropWindow]:
+        # Windows whose claim is open or starts within the given hours
+        now = datetime_in_utcnow()
+        try:
+            windows = self.session.query(AirdropWindow) \
+                .filter(AirdropWindow.claim_start_period <= now + timedelta(hours=hours_before_claim),
+                        AirdropWindow.claim_end_period >= now) \
+                .all()
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+        return windows
+
+    def get_unsigned_claims(self, airdrop_window: AirdropWindow, contract_address: str, token_address: str,
+                            signer_address: str) -> list:
+        """
+        Amounts each rewarded address of the window can claim once its claim period opens,
+        as AirdropRepository.fetch_total_rewards_amount and fetch_total_eligibility_amount
+        compute them, for the addresses without a signature of these amounts by the signer.
+        """
+        query = text(
+            "SELECT p.address, p.claimable_amount, p.total_eligible_amount FROM ("
+            f"SELECT ur.address, ({WINDOW_REGISTERED_REWARDS}) AS total_eligible_amount, "
+            f"({WINDOW_REGISTERED_REWARDS} AND r.airdrop_window_id > "
+            "(SELECT IFNULL(MAX(ch.airdrop_window_id), -1) FROM claim_history ch WHERE ch.address = ur.address "
+            "AND ch.airdrop_id = :airdrop_id AND ch.transaction_status IN :in_progress_or_completed_tx_statuses)"
+            ") AS claimable_amount "
+            "FROM user_rewards ur WHERE ur.airdrop_window_id = :airdrop_window_id AND ur.rewards_awarded > 0"
+            ") AS p LEFT JOIN claim_signature cs "
+            "ON cs.airdrop_window_id = :airdrop_window_id AND cs.address = p.address "
+            "WHERE p.claimable_amount > 0 AND (cs.row_id IS NULL OR cs.claimable_amount <> p.claimable_amount "
+            "OR cs.total_eligible_amount <> p.total_eligible_amount OR cs.contract_address <> :contract_address "
+            "OR cs.token_address <> :token_address OR cs.signer_address IS NULL "
+            "OR cs.signer_address <> :signer_address)"
+        )
+        try:
+            rows = self.session.execute(query, {
+                "airdrop_id": airdrop_window.airdrop_id,
+                "airdrop_window_id": airdrop_window.id,
+                "claim_start_period": airdrop_window.claim_start_period,
+                "contract_address": contract_address,
+                "token_address": token_address,
+                "signer_address": signer_address,
+                "in_progress_or_completed_tx_statuses": IN_PROGRESS_OR_COMPLETED_TX_STATUSES
+            }).mappings().all()
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+        return [(row["address"], int(row["claimable_amount"]), int(row["total_eligible_amount"])) for row in rows]
+
+    def get_signature(self, airdrop_window_id, address, claimable_amount, total_eligible_amount,
+                      contract_address, token_address, signer_address) -> str | None:
+        # A signature of other amounts, another contract or a rotated key is stale and never served
+        try:
+            claim_signature = self.session.query(ClaimSignature.signature) \
+                .filter(ClaimSignature.airdrop_window_id == airdrop_window_id,
+                        ClaimSignature.address == address,
+                        ClaimSignature.claimable_amount == claimable_amount,
+                        ClaimSignature.total_eligible_amount == total_eligible_amount,
+                        ClaimSignature.contract_address == contract_address,
+                        ClaimSignature.token_address == token_address,
+                        ClaimSignature.signer_address == signer_address) \
+                .first()
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+        return claim_signature.signature if claim_signature is not None else None
+
+    def save_signatures(self, signatures: list[dict]) -> int:
+        # Replaces the signature of an address for the window, so a changed amount invalidates the previous one
+        if not signatures:
+            return 0
+        try:
+            self.session.execute(text(
+                "INSERT INTO claim_signature (airdrop_id, airdrop_window_id, address, claimable_amount, "
+                "total_eligible_amount, contract_address, token_address, signature, signer_address, row_created, "
+                "row_updated) "
+                "VALUES (:airdrop_id, :airdrop_window_id, :address, :claimable_amount, :total_eligible_amount, "
+                ":contract_address, :token_address, :signature, :signer_address, current_timestamp, current_timestamp) "
+                "ON DUPLICATE KEY UPDATE claimable_amount = VALUES(claimable_amount), "
+                "total_eligible_amount = VALUES(total_eligible_amount), contract_address = VALUES(contract_address), "
+                "token_address = VALUES(token_address), signature = VALUES(signature), "
+                "signer_address = VALUES(signer_address), row_updated = current_timestamp"
+            ), signatures)
+            self.session.commit()
+        except SQLAlchemyError as e:
+            logger.exception(f"SQLAlchemyError: {e}")
+            self.session.rollback()
+            raise e
+        return len(signatures)
+
+    def delete_unrewarded(self, airdrop_window_id: int) -> int:
+        # Signatures of addresses whose rewards of the window were removed
+        try:
+            result = self.session.execute(text(
+                "DELETE cs FROM claim_signature cs LEFT JOIN user_rewards ur "
+                "ON ur.airdrop_window_id = cs.airdrop_window_id AND ur.address = cs.address AND ur.rewards_awarded > 0 "
+                "WHERE cs.airdrop_window_id = :airdrop_window_id AND ur.row_id IS NULL"
+            ), {"airdrop_window_id": airdrop_window_id})
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+        return result.rowcount
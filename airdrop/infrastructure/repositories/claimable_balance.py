@@ -0,0 +1,126 @@
+"""
+Maintenance of user_claimable_balance, the claimable rewards of every address per
+airdrop. A row holds the parts AirdropRepository.fetch_total_rewards_amount_live sums
+on every request, so the claimable amount of any airdrop class is read from one row.
+Rows are recomputed with a single INSERT ... SELECT for a set of keys: the addresses
+of a window when its rewards are published, and the addresses whose claims,
+registrations or rewards change through the ORM, in the same transaction. The
+migration adding the table fills the rows of the rewards written before it.
+"""
+from sqlalchemy import event, inspect, text
+
+from airdrop.constants import AirdropClaimStatus
+from airdrop.infrastructure.models import ClaimHistory, UserRegistration, UserReward
+
+IN_PROGRESS_OR_COMPLETED_TX_STATUSES = (
+    AirdropClaimStatus.SUCCESS.value, AirdropClaimStatus.PENDING.value,
+    AirdropClaimStatus.CLAIM_INITIATED.value, AirdropClaimStatus.CLAIM_SUBMITTED.value,
+    AirdropClaimStatus.CLAIM_FAILED.value
+)
+TOKENS_CLAIM_BLOCKCHAIN_METHODS = ("token_transfer",)
+# Airdrops whose claimable amount is all unclaimed windows minus the claimed tokens,
+# instead of the windows after the last claimed one
+CLAIMED_TOKENS_AIRDROP_CLASSES = ("LoyaltyAirdrop", "RejuveAirdrop")
+CLAIM_PARAMS = {
+    "tokens_claim_blockchain_methods": TOKENS_CLAIM_BLOCKCHAIN_METHODS,
+    "in_progress_or_completed_tx_statuses": IN_PROGRESS_OR_COMPLETED_TX_STATUSES
+}
+
+# Parts of the claimable amount of the key k (airdrop_id, address)
+REGISTERED_REWARDS = "SELECT IFNULL(SUM(ur.rewards_awarded), 0) FROM user_rewards ur, airdrop_window aw " \
+                     "WHERE ur.airdrop_window_id = aw.row_id AND ur.address = k.address AND aw.airdrop_id = k.airdrop_id " \
+                     "AND aw.claim_start_period <= current_timestamp AND ur.airdrop_window_id IN " \
+                     "(SELECT airdrop_window_id FROM user_registrations WHERE address = k.address)"
+CLAIMABLE_BALANCE_COLUMNS = f"({REGISTERED_REWARDS}) AS total_rewards, " \
+                            "(SELECT IFNULL(SUM(ch.claimable_amount), 0) FROM claim_history ch " \
+                            "WHERE ch.address = k.address AND ch.airdrop_id = k.airdrop_id " \
+                            "AND ch.blockchain_method IN :tokens_claim_blockchain_methods " \
+                            "AND ch.transaction_status IN :in_progress_or_completed_tx_statuses) AS claimed_amount, " \
+                            f"({REGISTERED_REWARDS} AND ur.airdrop_window_id > " \
+                            "(SELECT IFNULL(MAX(ch.airdrop_window_id), -1) FROM claim_history ch " \
+                            "WHERE ch.address = k.address AND ch.airdrop_id = k.airdrop_id " \
+                            "AND ch.transaction_status IN :in_progress_or_completed_tx_statuses)) AS unclaimed_rewards, " \
+                            "(SELECT COUNT(*) FROM airdrop_window aw WHERE aw.airdrop_id = k.airdrop_id " \
+                            "AND aw.claim_start_period <= current_timestamp) AS claim_started_windows"
+
+
+def window_keys():
+    return "SELECT DISTINCT aw.airdrop_id, ur.address FROM user_rewards ur " \
+           "JOIN airdrop_window aw ON aw.row_id = ur.airdrop_window_id WHERE ur.airdrop_window_id = :window_id"
+
+
+def airdrop_keys():
+    # Stored rows are included, so rows of addresses that lost their rewards are recomputed too
+    return "SELECT aw.airdrop_id, ur.address FROM user_rewards ur " \
+           "JOIN airdrop_window aw ON aw.row_id = ur.airdrop_window_id WHERE aw.airdrop_id = :airdrop_id " \
+           "UNION SELECT airdrop_id, address FROM user_claimable_balance WHERE airdrop_id = :airdrop_id"
+
+
+def address_keys(airdrop_addresses=(), window_addresses=()):
+    """
+    Keys of (airdrop_id, address) and of (airdrop_window_id, address) pairs, the latter
+    resolved to their airdrop. Returns the key query and its parameters.
+    """
+    selects, params = [], {}
+    for index, (airdrop_id, address) in enumerate(airdrop_addresses):
+        selects.append(f"SELECT :airdrop_id_{index} AS airdrop_id, :address_{index} AS address")
+        params.update({f"airdrop_id_{index}": airdrop_id, f"address_{index}": address})
+    for index, (window_id, address) in enumerate(window_addresses):
+        selects.append(f"SELECT airdrop_id, :window_address_{index} AS address FROM airdrop_window "
+                       f"WHERE row_id = :window_id_{index}")
+        params.update({f"window_id_{index}": window_id, f"window_address_{index}": address})
+    return " UNION ".join(selects), params
+
+
+def claimable_balances_query(keys):
+    return f"SELECT k.airdrop_id, k.address, {CLAIMABLE_BALANCE_COLUMNS} FROM ({keys}) AS k"
+
+
+def refresh_claimable_balances(connection, keys, params=None):
+    # connection is a Session or a Connection
+    result = connection.execute(text(
+        "INSERT INTO user_claimable_balance (airdrop_id, address, total_rewards, claimed_amount, unclaimed_rewards, "
+        "claim_started_windows, row_created, row_updated) "
+        f"SELECT k.airdrop_id, k.address, {CLAIMABLE_BALANCE_COLUMNS}, current_timestamp, current_timestamp "
+        f"FROM ({keys}) AS k "
+        "ON DUPLICATE KEY UPDATE total_rewards = VALUES(total_rewards), claimed_amount = VALUES(claimed_amount), "
+        "unclaimed_rewards = VALUES(unclaimed_rewards), claim_started_windows = VALUES(claim_started_windows), "
+        "row_updated = current_timestamp"
+    ), {**(params or {}), **CLAIM_PARAMS})
+    return result.rowcount
+
+
+def claimable_amount(row, airdrop_class=None):
+    if row is None or not row["claim_open"]:
+        return 0
+    if airdrop_class in CLAIMED_TOKENS_AIRDROP_CLASSES:
+        return int(row["total_rewards"]) - int(row["claimed_amount"])
+    return int(row["unclaimed_rewards"])
+
+
+def _changed_addresses(item):
+    # The address an item had before the flush counts as well, e.g. when a registration is reformatted
+    history = inspect(item).attrs.address.history
+    return {address for address in (list(history.deleted or ()) + [item.address]) if address}
+
+
+def _collect_changes(session, flush_context):
+    airdrop_addresses, window_addresses = session.info.setdefault("claimable_balance_keys", (set(), set()))
+    for item in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(item, (ClaimHistory, UserReward)) and item.airdrop_id is not None:
+            airdrop_addresses.update((item.airdrop_id, address) for address in _changed_addresses(item))
+        elif isinstance(item, UserRegistration) and item.airdrop_window_id is not None:
+            window_addresses.update((item.airdrop_window_id, address) for address in _changed_addresses(item))
+
+
+def _refresh_changes(session, flush_context):
+    airdrop_addresses, window_addresses = session.info.pop("claimable_balance_keys", (set(), set()))
+    if airdrop_addresses or window_addresses:
+        refresh_claimable_balances(session.connection(), *address_keys(airdrop_addresses, window_addresses))
+
+
+def track_claimable_balance_changes(session_factory):
+    # Changes are collected while the session still knows the flushed objects and applied
+    # once they are written, before the commit of the session transaction
+    event.listen(session_factory, "after_flush", _collect_changes)
+    event.listen(session_factory, "after_flush_postexec", _refresh_changes)
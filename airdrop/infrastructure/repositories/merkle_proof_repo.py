@@ -0,0 +1,24 @@
+from sqlalchemy.exc import SQLAlchemyError
+
+from airdrop.constants import MerkleDistributionStatus
+from airdrop.infrastructure.models import MerkleDistribution, MerkleProof
+from airdrop.infrastructure.repositories.base_repository import BaseRepository
+
+
+class MerkleProofRepository(BaseRepository):
+
+    def get_proof(self, airdrop_id: int, airdrop_window_id: int, address: str):
+        # Proof of the address for the window in the published distribution of the airdrop
+        try:
+            merkle_proof = self.session.query(MerkleDistribution.merkle_root, MerkleProof.amount, MerkleProof.proof) \
+                .join(MerkleProof, MerkleProof.merkle_distribution_id == MerkleDistribution.id) \
+                .filter(MerkleDistribution.airdrop_id == airdrop_id,
+                        MerkleDistribution.status == MerkleDistributionStatus.PUBLISHED.value,
+                        MerkleProof.airdrop_window_id == airdrop_window_id,
+                        MerkleProof.address == address.lower()) \
+                .first()
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+        return merkle_proof
@@ -0,0 +1,42 @@
+"""
+Airdrop and airdrop window rows shared by the warm invocations of a container. They
+change only through admin writes, which invalidate their keys; other processes see the
+change once the entries expire.
+"""
+from types import SimpleNamespace
+
+from sqlalchemy import inspect
+
+from airdrop.constants import AIRDROP_METADATA_CACHE_TTL
+from common.cache import TTLCache
+
+airdrop_metadata_cache = TTLCache("airdrop_metadata", AIRDROP_METADATA_CACHE_TTL)
+
+
+def airdrop_key(airdrop_id):
+    return "airdrop", int(airdrop_id)
+
+
+def window_key(airdrop_window_id):
+    return "airdrop_window", int(airdrop_window_id)
+
+
+def windows_key(airdrop_id):
+    return "airdrop_windows", int(airdrop_id)
+
+
+def row_values(rows):
+    # Plain copies of the column values, the cache never holds instances of the shared
+    # session that a commit would expire or a caller could flush
+    if rows is None:
+        return None
+    if isinstance(rows, list):
+        return [row_values(row) for row in rows]
+    return SimpleNamespace(**{column.key: getattr(rows, column.key) for column in inspect(rows).mapper.column_attrs})
+
+
+def invalidate_airdrop_window(airdrop_window_id, airdrop_id=None):
+    keys = [window_key(airdrop_window_id)]
+    if airdrop_id is not None:
+        keys.append(windows_key(airdrop_id))
+    airdrop_metadata_cache.invalidate(*keys)
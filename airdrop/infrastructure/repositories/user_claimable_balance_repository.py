@@ -0,0 +1,131 @@
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from airdrop.infrastructure.repositories.base_repository import BaseRepository
+from airdrop.infrastructure.repositories.claimable_balance import (
+    CLAIM_PARAMS,
+    address_keys,
+    airdrop_keys,
+    claimable_amount,
+    claimable_balances_query,
+    refresh_claimable_balances,
+    window_keys,
+)
+from common.logger import get_logger
+
+logger = get_logger(__name__)
+
+RECONCILE_SAMPLE_ROWS = 10
+
+
+class UserClaimableBalanceRepository(BaseRepository):
+
+    def __read_claimable_balance(self, airdrop_id, address):
+        query = text(
+            "SELECT ucb.total_rewards, ucb.claimed_amount, ucb.unclaimed_rewards, ucb.claim_started_windows, "
+            "(SELECT COUNT(*) FROM airdrop_window WHERE airdrop_id = :airdrop_id AND "
+            "claim_start_period <= current_timestamp) AS current_claim_started_windows, "
+            "EXISTS (SELECT 1 FROM airdrop_window WHERE airdrop_id = :airdrop_id AND "
+            "claim_start_period <= current_timestamp AND current_timestamp <= claim_end_period) AS claim_open, "
+            "EXISTS (SELECT 1 FROM user_rewards ur JOIN airdrop_window aw ON aw.row_id = ur.airdrop_window_id "
+            "WHERE aw.airdrop_id = :airdrop_id AND ur.address = :address) AS has_rewards "
+            "FROM (SELECT 1) AS one LEFT JOIN user_claimable_balance ucb "
+            "ON ucb.airdrop_id = :airdrop_id AND ucb.address = :address"
+        )
+        return self.session.execute(query, {"airdrop_id": airdrop_id, "address": address}).mappings().first()
+
+    def get_claimable_amount(self, airdrop_id, address, airdrop_class: str | None = None) -> int:
+        try:
+            row = self.__read_claimable_balance(airdrop_id, address)
+            # Addresses without rewards get no row, any address can be looked up. A missing row of an
+            # address with rewards comes from rewards written without refreshing their window
+            if row["claim_started_windows"] is None and not row["has_rewards"]:
+                self.session.commit()
+                return 0
+            # Missing, or computed before the claim of another window started
+            if row["claim_started_windows"] != row["current_claim_started_windows"]:
+                refresh_claimable_balances(self.session, *address_keys([(airdrop_id, address)]))
+                row = self.__read_claimable_balance(airdrop_id, address)
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+        return claimable_amount(row, airdrop_class)
+
+    def refresh_window(self, airdrop_window_id: int) -> int:
+        # Called once the rewards of a window are written
+        try:
+            rows = refresh_claimable_balances(self.session, window_keys(), {"window_id": airdrop_window_id})
+            self.session.commit()
+        except SQLAlchemyError as e:
+            logger.exception(f"SQLAlchemyError: {e}")
+            self.session.rollback()
+            raise e
+        logger.info(f"Refreshed claimable balances of window {airdrop_window_id}, {rows} rows affected")
+        return rows
+
+    def reconcile(self, airdrop_id: int, repair: bool = False) -> dict:
+        """
+        Recomputes the claimable balances of every address of an airdrop and compares them
+        with the stored rows. Rows computed before the claim of a window started are only
+        stale, they are refreshed when read; missing rows and different amounts are drift.
+        With repair all rows of the airdrop are recomputed.
+        """
+        live = claimable_balances_query(airdrop_keys())
+        params = {"airdrop_id": airdrop_id, **CLAIM_PARAMS}
+        try:
+            checked = self.session.execute(text(f"SELECT COUNT(*) AS checked FROM ({airdrop_keys()}) AS k"),
+                                           params).mappings().first()["checked"]
+            differences = self.session.execute(text(
+                "SELECT live.address, live.total_rewards, live.claimed_amount, live.unclaimed_rewards, "
+                "live.claim_started_windows, ucb.row_id IS NULL AS missing, ucb.total_rewards AS stored_total_rewards, "
+                "ucb.claimed_amount AS stored_claimed_amount, ucb.unclaimed_rewards AS stored_unclaimed_rewards, "
+                "ucb.claim_started_windows AS stored_claim_started_windows "
+                f"FROM ({live}) AS live LEFT JOIN user_claimable_balance ucb "
+                "ON ucb.airdrop_id = live.airdrop_id AND ucb.address = live.address "
+                "WHERE ucb.row_id IS NULL OR ucb.total_rewards <> live.total_rewards OR "
+                "ucb.claimed_amount <> live.claimed_amount OR ucb.unclaimed_rewards <> live.unclaimed_rewards OR "
+                "ucb.claim_started_windows <> live.claim_started_windows"
+            ), params).mappings().all()
+            missing = [row for row in differences if row["missing"]]
+            stale = [row for row in differences
+                     if not row["missing"] and row["stored_claim_started_windows"] != row["claim_started_windows"]]
+            mismatched = [row for row in differences
+                          if not row["missing"] and row["stored_claim_started_windows"] == row["claim_started_windows"]]
+            repaired = 0
+            if repair and differences:
+                repaired = refresh_claimable_balances(self.session, airdrop_keys(), {"airdrop_id": airdrop_id})
+            self.session.commit()
+        except SQLAlchemyError as e:
+            logger.exception(f"SQLAlchemyError: {e}")
+            self.session.rollback()
+            raise e
+
+        return {
+            "airdrop_id": airdrop_id,
+            "checked": checked,
+            "missing": len(missing),
+            "stale": len(stale),
+            "mismatched": len(mismatched),
+            "repaired": repaired,
+            "sample": [{
+                "address": row["address"],
+                "total_rewards": int(row["total_rewards"]),
+                "stored_total_rewards": int(row["stored_total_rewards"]),
+                "claimed_amount": int(row["claimed_amount"]),
+                "stored_claimed_amount": int(row["stored_claimed_amount"]),
+                "unclaimed_rewards": int(row["unclaimed_rewards"]),
+                "stored_unclaimed_rewards": int(row["stored_unclaimed_rewards"])
+            } for row in mismatched[:RECONCILE_SAMPLE_ROWS]]
+        }
+
+    def get_sample_addresses(self, airdrop_id: int, size: int) -> list[str]:
+        try:
+            rows = self.session.execute(text(
+                "SELECT address FROM user_claimable_balance WHERE airdrop_id = :airdrop_id ORDER BY RAND() LIMIT :size"
+            ), {"airdrop_id": airdrop_id, "size": size}).all()
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+        return [row.address for row in rows]
@@ -161,6 +161,44 @@ class UserRegistrationRepository(BaseRepository):
             self.session.rollback()
             raise e
 
+    def get_user_registrations_for_windows(
+        self,
+        airdrop_window_ids: list[int],
+        address: Optional[str] = None,
+        payment_part: Optional[str] = None,
+        staking_part: Optional[str] = None
+    ) -> dict[int, list[UserRegistration]]:
+        """
+        Registrations of an address for all the given windows in one query, matched the
+        same way as get_user_registration_details, grouped by window id.
+        """
+        or_clause = list()
+        if payment_part:
+            or_clause.append(UserRegistration.payment_part == payment_part)
+        if staking_part:
+            or_clause.append(UserRegistration.staking_part == staking_part)
+        if address:
+            or_clause.append(UserRegistration.address == address)
+        registrations = {window_id: [] for window_id in airdrop_window_ids}
+        if not airdrop_window_ids or not or_clause:
+            return registrations
+        try:
+            user_registrations = (
+                self.session.query(UserRegistration)
+                .filter(
+                    UserRegistration.airdrop_window_id.in_(airdrop_window_ids),
+                    UserRegistration.registered_at != None,
+                    or_(*or_clause)
+                )
+                .all()
+            )
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+        for user_registration in user_registrations:
+            registrations[user_registration.airdrop_window_id].append(user_registration)
+        return registrations
+
     def get_unclaimed_reward(self, airdrop_id, address):
         in_progress_or_completed_tx_statuses = (
             AirdropClaimStatus.SUCCESS.value, AirdropClaimStatus.PENDING.value,
@@ -0,0 +1,83 @@
+import gzip
+import json
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from airdrop.infrastructure.models import UserRewardAudit, UserRewardAuditArtifact
+from airdrop.infrastructure.repositories.base_repository import BaseRepository
+from common.logger import get_logger
+
+logger = get_logger(__name__)
+
+AUDIT_ARTIFACT_FORMAT = "json.gz/v1"
+AUDIT_ARTIFACT_COLUMNS = ("address", "balance", "staked", "score", "normalized_score", "rewards_awarded", "comment")
+AUDIT_ARTIFACT_DECIMAL_COLUMNS = ("balance", "staked", "score", "normalized_score", "rewards_awarded")
+
+
+def encode_audit_artifact(rows) -> bytes:
+    """
+    Packs audit rows, tuples in AUDIT_ARTIFACT_COLUMNS order, into gzipped columnar JSON.
+    Decimals are stored as strings so they are read back exactly.
+    """
+    columns = {name: [] for name in AUDIT_ARTIFACT_COLUMNS}
+    for row in rows:
+        for name, value in zip(AUDIT_ARTIFACT_COLUMNS, row):
+            columns[name].append(str(value) if name in AUDIT_ARTIFACT_DECIMAL_COLUMNS else value)
+    return gzip.compress(json.dumps(columns, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_audit_artifact(payload: bytes) -> list[dict]:
+    columns = json.loads(gzip.decompress(payload))
+    for name in AUDIT_ARTIFACT_DECIMAL_COLUMNS:
+        columns[name] = [Decimal(value) for value in columns[name]]
+    return [dict(zip(AUDIT_ARTIFACT_COLUMNS, values)) for values in zip(*(columns[name] for name in AUDIT_ARTIFACT_COLUMNS))]
+
+
+class UserRewardAuditRepository(BaseRepository):
+    """
+    Reads reward audits from both layouts: individual user_rewards_audit rows and the
+    compact per-run artifacts, which hold the users that didn't get an individual row.
+    """
+
+    def get_audit_rows(self, airdrop_window_id: int, snapshot_guid: str | None = None,
+                       address: str | None = None) -> list[dict]:
+        rows_query = select(UserRewardAudit).where(UserRewardAudit.airdrop_window_id == airdrop_window_id)
+        artifacts_query = select(UserRewardAuditArtifact)\
+            .where(UserRewardAuditArtifact.airdrop_window_id == airdrop_window_id)\
+            .order_by(UserRewardAuditArtifact.id)
+        if snapshot_guid is not None:
+            rows_query = rows_query.where(UserRewardAudit.snapshot_guid == snapshot_guid)
+            artifacts_query = artifacts_query.where(UserRewardAuditArtifact.snapshot_guid == snapshot_guid)
+        if address is not None:
+            rows_query = rows_query.where(UserRewardAudit.address == address)
+        try:
+            audits = self.session.execute(rows_query).scalars().all()
+            artifacts = self.session.execute(artifacts_query).scalars().all()
+        except SQLAlchemyError as e:
+            logger.exception(f"SQLAlchemyError: {e}")
+            self.session.rollback()
+            raise e
+
+        result = [{
+            "airdrop_id": audit.airdrop_id,
+            "airdrop_window_id": audit.airdrop_window_id,
+            "snapshot_guid": audit.snapshot_guid,
+            "address": audit.address,
+            "balance": audit.balance,
+            "staked": audit.staked,
+            "score": audit.score,
+            "normalized_score": audit.normalized_score,
+            "rewards_awarded": audit.rewards_awarded,
+            "comment": audit.comment,
+            "row_created": audit.row_created
+        } for audit in audits]
+        for artifact in artifacts:
+            for row in decode_audit_artifact(artifact.payload):
+                if address is not None and row["address"] != address:
+                    continue
+                row.update(airdrop_id=artifact.airdrop_id, airdrop_window_id=artifact.airdrop_window_id,
+                           snapshot_guid=artifact.snapshot_guid, row_created=artifact.row_created)
+                result.append(row)
+        return result
@@ -1,84 +1,154 @@
-from decimal import Decimal
-from sqlalchemy import select, or_
+from sqlalchemy import String, func, literal, or_, select, union, union_all
+from sqlalchemy.dialects.mysql import insert
 from sqlalchemy.exc import SQLAlchemyError
 from airdrop.constants import CardanoEra, CARDANO_ADDRESS_PREFIXES
 from airdrop.infrastructure.repositories.base_repository import BaseRepository
-from airdrop.infrastructure.models import UserReward, UserRegistration, UserBalanceSnapshot
+from airdrop.infrastructure.models import UserReward, UserRegistration
+from airdrop.infrastructure.repositories.balance_snapshot import window_balance_snapshots
+
+USER_REWARDS_BATCH_SIZE = 5000
 
 
 class UserRewardRepository(BaseRepository):
 
-    @staticmethod
-    def create_user_reward(airdrop_id: int,
-                           airdrop_window_id: int,
-                           address: str,
-                           condition: str | None,
-                           rewards_awarded: Decimal,
-                           score: Decimal,
-                           normalized_score: Decimal):
-        user_reward = UserReward(
-            airdrop_id=airdrop_id,
-            airdrop_window_id=airdrop_window_id,
-            address=address,
-            condition=condition,
-            rewards_awarded=rewards_awarded,
-            score=score,
-            normalized_score=normalized_score
+    def upsert_user_rewards(self, user_rewards: list[dict], batch_size: int = USER_REWARDS_BATCH_SIZE) -> int:
+        """
+        Writes the rewards of a window with chunked INSERT ... ON DUPLICATE KEY UPDATE
+        statements in a single transaction, so processing a window again replaces its
+        previous rewards. Each item holds the user_rewards columns airdrop_id,
+        airdrop_window_id, address, condition, rewards_awarded, score and normalized_score.
+        """
+        if not user_rewards:
+            return 0
+        query = insert(UserReward.__table__)
+        query = query.on_duplicate_key_update(
+            airdrop_id=query.inserted.airdrop_id,
+            condition=query.inserted.condition,
+            rewards_awarded=query.inserted.rewards_awarded,
+            score=query.inserted.score,
+            normalized_score=query.inserted.normalized_score,
+            row_updated=func.current_timestamp()
         )
-        return user_reward
+        try:
+            for start in range(0, len(user_rewards), batch_size):
+                self.session.execute(query, user_rewards[start:start + batch_size])
+            self.session.commit()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+        return len(user_rewards)
+
+    def get_window_rewards(self, airdrop_window_id: int) -> dict:
+        query = select(UserReward.address, UserReward.rewards_awarded)\
+            .where(UserReward.airdrop_window_id == airdrop_window_id)
+        try:
+            return {row.address: row.rewards_awarded for row in self.session.execute(query).all()}
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
 
     def get_ethereum_registrations_balances(self,
                                             airdrop_window_id: int,
                                             snapshot_window_id: int = None,
                                             snapshot_guid: str = None):
+        snapshots = window_balance_snapshots(
+            lambda columns: self.__snapshot_filters(columns, snapshot_window_id, snapshot_guid)
+        )
         query = select(UserRegistration.address,
-                       UserBalanceSnapshot.balance,
-                       UserBalanceSnapshot.staked,
-                       UserBalanceSnapshot.total)\
-            .join(UserBalanceSnapshot, UserRegistration.address == UserBalanceSnapshot.address)\
+                       snapshots.c.balance,
+                       snapshots.c.staked,
+                       snapshots.c.total)\
+            .join(snapshots, UserRegistration.address == snapshots.c.address)\
             .where(UserRegistration.airdrop_window_id == airdrop_window_id,
                    UserRegistration.address.like("0x%"))
-        if snapshot_window_id is not None:
-            query = query.where(UserBalanceSnapshot.airdrop_window_id == snapshot_window_id)
-        if snapshot_guid is not None:
-            query = query.where(UserBalanceSnapshot.snapshot_guid == snapshot_guid)
         result = self.session.execute(query).all()
         return result
 
     def get_cardano_registrations(self, airdrop_window_id: int, *, address_era: CardanoEra = CardanoEra.ANY):
         prefixes = CARDANO_ADDRESS_PREFIXES[address_era]
-        query = select(UserRegistration.address)\
+        query = select(UserRegistration.address, UserRegistration.payment_part, UserRegistration.staking_part)\
             .where(UserRegistration.airdrop_window_id == airdrop_window_id)\
             .where(or_(UserRegistration.address.like(f"{prefix}%") for prefix in prefixes))
         result = self.session.execute(query).all()
         return result
 
-    def get_cardano_balances(self,
-                             address: str | None = None,
-                             payment_part: str | None = None,
-                             staking_part: str | None = None,
-                             *,
-                             snapshot_window_id: int | None = None,
-                             snapshot_guid: str | None = None):
-        if not address and not payment_part and not staking_part:
-            raise ValueError("At least one of address / payment_part / staking_part arguments must be provided")
-        or_clause = list()
-        if address:
-            or_clause.append(UserBalanceSnapshot.address == address)
-        if payment_part:
-            or_clause.append(UserBalanceSnapshot.payment_part == payment_part)
-        if staking_part:
-            or_clause.append(UserBalanceSnapshot.staking_part == staking_part)
-        query = select(UserBalanceSnapshot.address,
-                       UserBalanceSnapshot.payment_part,
-                       UserBalanceSnapshot.staking_part,
-                       UserBalanceSnapshot.balance,
-                       UserBalanceSnapshot.staked,
-                       UserBalanceSnapshot.total)\
-            .where(or_(*or_clause))
+    def get_cardano_registrations_balances(self,
+                                           airdrop_window_id: int,
+                                           *,
+                                           address_era: CardanoEra = CardanoEra.ANY,
+                                           snapshot_window_id: int | None = None,
+                                           snapshot_guid: str | None = None,
+                                           registration_parts: dict | None = None):
+        """
+        Total balance and stake of every Cardano registration of a window in one grouped
+        query. Snapshot rows are matched to a registration by address, payment part or
+        staking part; the branches are unioned without duplicates, so a snapshot row that
+        matches on several keys is counted once. Byron registrations are matched by address
+        only. Registrations without matching snapshot rows are not returned.
+        registration_parts maps the address of registrations stored without parts to the
+        (payment_part, staking_part) decoded by the caller. They are only used for matching,
+        user_registrations is left as it is.
+        """
+        prefixes = CARDANO_ADDRESS_PREFIXES[address_era]
+        # Built once and referenced by every branch of the union
+        snapshots = select(window_balance_snapshots(
+            lambda columns: self.__snapshot_filters(columns, snapshot_window_id, snapshot_guid)
+        )).cte("window_snapshot")
+        registrations = select(UserRegistration.address, UserRegistration.payment_part, UserRegistration.staking_part)
+        if registration_parts:
+            decoded = union_all(*(select(literal(address, String).label("address"),
+                                         literal(payment_part, String).label("payment_part"),
+                                         literal(staking_part, String).label("staking_part"))
+                                  for address, (payment_part, staking_part) in registration_parts.items()))\
+                .subquery("decoded_registration")
+            registrations = select(UserRegistration.address,
+                                   func.coalesce(decoded.c.payment_part, UserRegistration.payment_part)
+                                   .label("payment_part"),
+                                   func.coalesce(decoded.c.staking_part, UserRegistration.staking_part)
+                                   .label("staking_part"))\
+                .outerjoin(decoded, decoded.c.address == UserRegistration.address)
+        registrations = registrations\
+            .where(UserRegistration.airdrop_window_id == airdrop_window_id,
+                   or_(UserRegistration.address.like(f"{prefix}%") for prefix in prefixes))\
+            .cte("window_registration")
+
+        def matches(key):
+            registration_key = getattr(registrations.c, key)
+            snapshot_key = getattr(snapshots.c, key)
+            query = select(registrations.c.address.label("registration_address"),
+                           snapshots.c.airdrop_window_id,
+                           snapshots.c.snapshot_guid,
+                           snapshots.c.address,
+                           snapshots.c.balance,
+                           snapshots.c.staked)\
+                .join(snapshots, snapshot_key == registration_key)
+            if key != "address":
+                # Rows whose parts were never filled in must not match each other
+                query = query.where(registration_key.is_not(None), registration_key != "",
+                                    snapshot_key.is_not(None), snapshot_key != "")
+            return query
+
+        branches = [matches("address")]
+        if address_era != CardanoEra.BYRON:
+            branches.append(matches("payment_part"))
+            branches.append(matches("staking_part"))
+        matched = union(*branches).subquery("matched_snapshot")
+        query = select(matched.c.registration_address.label("address"),
+                       func.sum(matched.c.balance).label("balance"),
+                       func.sum(matched.c.staked).label("staked"),
+                       func.count().label("related_addresses"))\
+            .group_by(matched.c.registration_address)
+        try:
+            return self.session.execute(query).all()
+        except SQLAlchemyError as e:
+            self.session.rollback()
+            raise e
+
+    @staticmethod
+    def __snapshot_filters(columns, snapshot_window_id: int | None, snapshot_guid: str | None) -> list:
+        filters = list()
         if snapshot_window_id is not None:
-            query = query.where(UserBalanceSnapshot.airdrop_window_id == snapshot_window_id)
+            filters.append(columns.airdrop_window_id == snapshot_window_id)
         if snapshot_guid:
-            query = query.where(UserBalanceSnapshot.snapshot_guid == snapshot_guid)
-        result = self.session.execute(query).all()
-        return result
+            filters.append(columns.snapshot_guid == snapshot_guid)
+        return filters
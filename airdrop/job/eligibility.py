@@ -15,9 +15,21 @@ from airdrop.job.reward_processors.rejuve_reward_processor import RejuveRewardPr
 
 import time
 import uuid
-
-from airdrop.constants import PROCESSOR_PATH
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import wait
+
+from airdrop.application.services.airdrop_services import AirdropServices
+from airdrop.constants import CLAIM_SIGNATURE_HOURS_BEFORE_CLAIM, PROCESSOR_PATH, SnapshotStorage
+from airdrop.infrastructure.repositories.airdrop_repository import AirdropRepository
+from airdrop.infrastructure.repositories.airdrop_window_repository import AirdropWindowRepository
+from airdrop.infrastructure.repositories.base_repository import default_session, engine
+from airdrop.infrastructure.repositories.claim_signature_repo import ClaimSignatureRepository
+from airdrop.infrastructure.repositories.user_claimable_balance_repository import UserClaimableBalanceRepository
+from airdrop.job.merkle_distribution import MerkleDistributionBuilder, publish_distribution
 from airdrop.job.repository import Repository
+from airdrop.job.reward_staging import RewardStaging
+from airdrop.job.snapshot_writer import DeltaSnapshotWriter, HistorySnapshotWriter, SnapshotWriter, \
+    check_window_storage
 from common.exception_handler import exception_handler
 from common.utils import generate_lambda_response
 from airdrop.config import BALANCE_DB_CONFIG, MATTERMOST_CONFIG, NETWORK
@@ -27,9 +39,40 @@ from decimal import Decimal
 
 logger = get_logger(__name__)
 
+# Addresses per airdrop whose claimable amount is also computed with the live query
+CLAIMABLE_BALANCE_SAMPLE_SIZE = 100
+
+
+def process_window_reward(connection, processor_name, airdrop_id, window, identifier, only_registered,
+                          reward_options):
+    # Runs in a worker process, so it opens its own connection instead of sharing the parent's.
+    # The result, the reward diff of a dry run, is sent back with the timing
+    started_at = time.perf_counter()
+    error = None
+    result = None
+    try:
+        processor_class = locate("airdrop.job.reward_processors." + processor_name)
+        processor = processor_class(Repository(NETWORK["db"]), airdrop_id, window, identifier, **reward_options)
+        result = processor.process_rewards(only_registered)
+    except Exception as e:
+        logger.exception(f"Reward processing failed for window {window}")
+        error = repr(e)
+    connection.send((window, time.perf_counter() - started_at, error, result))
+    connection.close()
+
 
 class EligibilityProcessor:
-    def __init__(self):
+    def __init__(self, streaming_snapshot=False, bulk_load=False, snapshot_storage=SnapshotStorage.PER_WINDOW,
+                 maintain_aggregates=False, reward_options=None, reward_concurrency=1):
+        self._streaming_snapshot = streaming_snapshot
+        # Number of windows whose rewards are processed at the same time, each in its own process
+        self._reward_concurrency = max(1, reward_concurrency)
+        # Extra keyword arguments for the reward processors, e.g. vectorized_scoring
+        self._reward_options = reward_options or {}
+        self._maintain_aggregates = maintain_aggregates
+        self._bulk_load = bulk_load
+        self._snapshot_storage = snapshot_storage
+        self._snapshot_writer = None
         self._airdrop_db = Repository(NETWORK["db"])
         self._balances_db = Repository(BALANCE_DB_CONFIG)
         # self._airdrop_windows_open_for_snapshot = []
@@ -74,6 +117,13 @@ class EligibilityProcessor:
         if (len(values) > 0):
             self.__rows_to_insert.append(tuple(values))
 
+    def __write_holder(self, address, balance, staked, total):
+        if self._snapshot_writer is not None:
+            self._snapshot_writer.add_holder(address, balance, staked, total)
+        else:
+            for window in self._active_airdrop_window_map:
+                self.__batch_insert([window, address, balance, staked, total, self._snapshot_guid])
+
     def __populate_snapshot(self):
         snapshot_rows = {}
         query = "select wallet_address, sum(amount) as balance from agix_balances " + \
@@ -100,61 +150,224 @@ class EligibilityProcessor:
                 snapshot_rows[row["wallet_address"]] = row
 
         for address in snapshot_rows:
-            for window in self._active_airdrop_window_map:
-                self.__batch_insert(
-                    [window, address, snapshot_rows[address]["balance"], snapshot_rows[address]["staked"],
-                     snapshot_rows[address]["total"], self._snapshot_guid])
+            self.__write_holder(address, snapshot_rows[address]["balance"], snapshot_rows[address]["staked"],
+                                snapshot_rows[address]["total"])
         self.__batch_insert([], True)
 
+    def __stream_snapshot(self):
+        # Balances and stakes are merged in a single grouped query and read through an
+        # unbuffered cursor, so rows go straight to the writer without being held in memory.
+        query = "select wallet_address, " + \
+                "sum(case when balance_type <> 'STAKED' then amount else 0 end) as balance, " + \
+                "max(case when balance_type = 'STAKED' then amount end) as staked, " + \
+                "count(case when balance_type = 'STAKED' then 1 end) as stake_rows " + \
+                "from agix_balances group by wallet_address " + \
+                "having balance > 0 or stake_rows > 0"
+        holders = 0
+        for row in self._balances_db.stream(query):
+            balance = row["balance"] if row["balance"] > 0 else 0
+            staked = row["staked"] if row["staked"] is not None else 0
+            total = Decimal(balance) + Decimal(staked)
+            holders += 1
+            self.__write_holder(row["wallet_address"], balance, staked, total)
+        self.__batch_insert([], True)
+        logger.info(f"Streamed snapshot of {holders} holders")
+
+    def __get_snapshot_writer(self):
+        windows = self._active_airdrop_window_map.keys()
+        if self._snapshot_storage == SnapshotStorage.DELTA:
+            return DeltaSnapshotWriter(self._airdrop_db, self._snapshot_guid, windows,
+                                       maintain_aggregates=self._maintain_aggregates)
+        if self._snapshot_storage == SnapshotStorage.HISTORY:
+            return HistorySnapshotWriter(self._airdrop_db, self._snapshot_guid, windows,
+                                         maintain_aggregates=self._maintain_aggregates)
+        return SnapshotWriter(self._airdrop_db, self._snapshot_guid, windows, self._snapshot_storage,
+                              maintain_aggregates=self._maintain_aggregates)
+
+    def __ingest_snapshot(self):
+        if self._streaming_snapshot:
+            self.__stream_snapshot()
+        else:
+            self.__populate_snapshot()
+
+    def __latest_snapshot_guid(self, window):
+        # Shared, delta and history snapshots are numbered per window, per-window rows in insertion order
+        result = self._airdrop_db.execute(
+            "select snapshot_guid from balance_snapshot_window where airdrop_window_id = %s "
+            "order by snapshot_seq desc, row_id desc limit 1", [window])
+        if not result:
+            result = self._airdrop_db.execute(
+                "select snapshot_guid from user_balance_snapshot where airdrop_window_id = %s "
+                "order by row_id desc limit 1", [window])
+        return result[0]["snapshot_guid"] if result else None
+
+    def __stored_snapshot_rewards(self):
+        # A dry run writes nothing, so no snapshot is taken and the active windows are
+        # scored against the snapshots they already hold
+        rewards = []
+        for window in self._active_airdrop_window_map:
+            snapshot_guid = self.__latest_snapshot_guid(window)
+            if snapshot_guid is None:
+                logger.warning(f"Window {window} has no stored snapshot, it is left out of the dry run")
+                continue
+            processor_name = self._active_airdrop_window_map[window]["airdrop_processor"]
+            airdrop_id = self._active_airdrop_window_map[window]["airdrop_id"]
+            rewards.append((processor_name, airdrop_id, window, snapshot_guid, False))
+        return rewards
+
     def __process_reward(self, processor_name, airdrop_id, window, identifier, only_registered):
         logger.info(
             f"Processing rewards for window {window} using processor {processor_name} with snapshot {identifier}. For all {only_registered}")
         processor_class = locate("airdrop.job.reward_processors." + processor_name)
-        processor = processor_class(self._airdrop_db, airdrop_id, window, identifier)
-        processor.process_rewards(only_registered)
+        processor = processor_class(self._airdrop_db, airdrop_id, window, identifier, **self._reward_options)
+        return processor.process_rewards(only_registered)
+
+    # Returns the results of the windows whose processor returned one, the reward diffs of dry runs
+    def __process_rewards(self, rewards):
+        if self._reward_concurrency == 1 or len(rewards) < 2:
+            results = {window: self.__process_reward(processor_name, airdrop_id, window, identifier, only_registered)
+                       for processor_name, airdrop_id, window, identifier, only_registered in rewards}
+        else:
+            results = self.__process_rewards_in_parallel(rewards)
+        return {window: result for window, result in results.items() if result is not None}
+
+    def __close_connections(self):
+        # Forked workers would inherit the open MySQL sockets and could write to the parent's
+        # sessions, so nothing is left open while they are started
+        self._airdrop_db.connection.close()
+        self._balances_db.connection.close()
+        default_session.close()
+        engine.dispose()
+
+    def __open_connections(self):
+        self._airdrop_db = Repository(NETWORK["db"])
+        self._balances_db = Repository(BALANCE_DB_CONFIG)
+
+    def __process_rewards_in_parallel(self, rewards):
+        # Workers report back through pipes, which unlike pools and queues also work on Lambda
+        logger.info(f"Processing rewards for {len(rewards)} windows with concurrency {self._reward_concurrency}")
+        started_at = time.perf_counter()
+        self.__close_connections()
+        try:
+            results = self.__run_reward_workers(rewards)
+        finally:
+            self.__open_connections()
+
+        for window, (elapsed, error, _) in results.items():
+            timing = f"{elapsed:.2f}s" if elapsed is not None else "unknown time"
+            if error is None:
+                logger.info(f"Window {window} rewards processed in {timing}")
+            else:
+                logger.error(f"Window {window} rewards failed after {timing}, error: {error}")
+        failed = {window: error for window, (_, error, _) in results.items() if error is not None}
+        logger.info(f"Processed rewards for {len(results) - len(failed)} of {len(results)} windows "
+                    f"in {time.perf_counter() - started_at:.2f}s")
+        if failed:
+            raise Exception(f"Reward processing failed for windows {failed}")
+        return {window: result for window, (_, _, result) in results.items()}
+
+    def __run_reward_workers(self, rewards):
+        pending = list(rewards)
+        running = {}
+        results = {}
+        while pending or running:
+            while pending and len(running) < self._reward_concurrency:
+                processor_name, airdrop_id, window, identifier, only_registered = pending.pop(0)
+                logger.info(f"Processing rewards for window {window} using processor {processor_name} "
+                            f"with snapshot {identifier}. For all {only_registered}")
+                parent_connection, child_connection = Pipe(duplex=False)
+                worker = Process(target=process_window_reward,
+                                 args=(child_connection, processor_name, airdrop_id, window, identifier,
+                                       only_registered, self._reward_options))
+                worker.start()
+                child_connection.close()
+                running[parent_connection] = (window, worker)
+            for connection in wait(list(running)):
+                window, worker = running.pop(connection)
+                result = None
+                try:
+                    _, elapsed, error, result = connection.recv()
+                except EOFError:
+                    elapsed, error = None, "worker exited without a result"
+                connection.close()
+                worker.join()
+                if error is None and worker.exitcode != 0:
+                    error = f"worker exited with code {worker.exitcode}"
+                results[window] = (elapsed, error, result)
+        return results
 
     def process_specific_reward(self, event):
-        self.__process_reward(event['processor_name'], event['airdrop_id'], event['window_id'], "REGISTRATION", False)
+        return self.__process_reward(event['processor_name'], event['airdrop_id'], event['window_id'], "REGISTRATION", False)
 
+    # Returns the reward diffs of dry runs by window
     def process_eligibility(self):
         self.__populate_state()
+        results = {}
 
         if len(self._reward_airdrop_window_map) > 0:
             logger.info("Processing final rewards")
+            rewards = []
             for window in self._reward_airdrop_window_map:
                 airdrop_id = self._reward_airdrop_window_map[window]["airdrop_id"]
                 airdrop_class_name = self._reward_airdrop_window_map[window]["airdrop_processor"]
                 airdrop_class = locate(f"{PROCESSOR_PATH}.{airdrop_class_name}")
                 reward_processor_name = airdrop_class(airdrop_id).reward_processor_name
-                self.__process_reward(reward_processor_name, airdrop_id, window, "FINAL", True)
+                rewards.append((reward_processor_name, airdrop_id, window, "FINAL", True))
+            results.update(self.__process_rewards(rewards))
 
         if len(self._active_airdrop_window_map) == 0:
             logger.info(f"No airdrop windows to process for")
-            return
+            return results
+
+        if self._reward_options.get("dry_run"):
+            results.update(self.__process_rewards(self.__stored_snapshot_rewards()))
+            return results
 
         logger.info(
             f"Processing eligibility for windows {self._active_airdrop_window_map.keys()}. Snapshot Index is {self._snapshot_guid}")
-        self.__populate_snapshot()
+        # Other storages and running aggregates are only written through the bulk loaders
+        if self._bulk_load or self._maintain_aggregates or self._snapshot_storage != SnapshotStorage.PER_WINDOW:
+            with self.__get_snapshot_writer() as writer:
+                self._snapshot_writer = writer
+                try:
+                    self.__ingest_snapshot()
+                finally:
+                    self._snapshot_writer = None
+        else:
+            check_window_storage(self._airdrop_db, self._active_airdrop_window_map.keys(), self._snapshot_storage)
+            self.__ingest_snapshot()
+        rewards = []
         for window in self._active_airdrop_window_map:
             processor_name = self._active_airdrop_window_map[window]["airdrop_processor"]
             airdrop_id = self._active_airdrop_window_map[window]["airdrop_id"]
-            self.__process_reward(processor_name, airdrop_id, window, self._snapshot_guid, False)
+            rewards.append((processor_name, airdrop_id, window, self._snapshot_guid, False))
+        results.update(self.__process_rewards(rewards))
+        return results
 
 
 @exception_handler(PROCESSOR_CONFIG=MATTERMOST_CONFIG, logger=logger)
 def process_eligibility(event, context):
     logger.info(f"Processing eligibility")
 
-    e = EligibilityProcessor()
+    options = event if isinstance(event, dict) else {}
+    e = EligibilityProcessor(streaming_snapshot=options.get("streaming_snapshot", False),
+                             bulk_load=options.get("bulk_load", False),
+                             snapshot_storage=SnapshotStorage(options.get("snapshot_storage",
+                                                                          SnapshotStorage.PER_WINDOW.value)),
+                             maintain_aggregates=options.get("maintain_aggregates", False),
+                             reward_options=options.get("reward_options"),
+                             reward_concurrency=options.get("reward_concurrency", 1))
     if event is not None and 'window_id' in event:
-        e.process_specific_reward(event)
+        result = e.process_specific_reward(event)
     else:
-        e.process_eligibility()
+        result = e.process_eligibility() or None
 
     logger.info(f"Completed Processing eligibility")
     return generate_lambda_response(
         200,
-        "Success"
+        "Success",
+        # Reward diff of a dry run, by window when all windows are processed
+        data=result
     )
 
 
@@ -179,7 +392,12 @@ def process_loyalty_airdrop_reward_eligibility(event, context):
             "failed"
         )
 
-    response = LoyaltyEligibilityProcessor(airdrop_id=airdrop_id, window_id=window_id).process_reward()
+    response = LoyaltyEligibilityProcessor(airdrop_id=airdrop_id, window_id=window_id,
+                                           streaming=event.get('streaming', False),
+                                           server_side=event.get('server_side', False),
+                                           verify_parity=event.get('verify_parity', False),
+                                           dry_run=event.get('dry_run', False),
+                                           cross_schema=event.get('cross_schema', False)).process_reward()
 
     logger.info(f"Completed Processing eligibility")
     return generate_lambda_response(
@@ -201,9 +419,141 @@ def process_rejuve_airdrop_reward(event, context):
         logger.error(f"Invalid airdrop_id={airdrop_id} or airdrop_window_id={airdrop_window_id}")
         return {}
 
-    RejuveRewardProcessor(airdrop_id, airdrop_window_id, snapshot_guid).process_user_rewards()
+    result = RejuveRewardProcessor(airdrop_id, airdrop_window_id, snapshot_guid,
+                                   dry_run=event.get("dry_run", False)).process_user_rewards()
+
+    # Reward diff of a dry run
+    return result or {}
 
-    return {}
+
+@exception_handler(PROCESSOR_CONFIG=MATTERMOST_CONFIG, logger=logger)
+def rollback_reward_run(event, context):
+    logger.info(f"Rolling back reward run with the event={json.dumps(event)}")
+
+    window_id = event.get("window_id") if isinstance(event, dict) else None
+    if not window_id:
+        logger.info(f"Invalid window_id={window_id} provided")
+        return generate_lambda_response(
+            200,
+            "failed"
+        )
+
+    run_guid = RewardStaging.rollback_window(Repository(NETWORK["db"]), window_id)
+
+    logger.info(f"Completed rolling back window {window_id} to run {run_guid}")
+    return generate_lambda_response(
+        200,
+        run_guid
+    )
+
+
+@exception_handler(PROCESSOR_CONFIG=MATTERMOST_CONFIG, logger=logger)
+def reconcile_claimable_balances(event, context):
+    logger.info(f"Reconciling claimable balances with the event={json.dumps(event)}")
+
+    options = event if isinstance(event, dict) else {}
+    repair = options.get("repair", False)
+    sample_size = options.get("sample_size", CLAIMABLE_BALANCE_SAMPLE_SIZE)
+    airdrop_repository = AirdropRepository()
+    claimable_balance_repository = UserClaimableBalanceRepository()
+    airdrops = airdrop_repository.get_airdrops_in_claim_period()
+    if options.get("airdrop_id"):
+        airdrops = [airdrop for airdrop in airdrops if airdrop.id == options["airdrop_id"]]
+
+    results = []
+    for airdrop in airdrops:
+        result = claimable_balance_repository.reconcile(airdrop.id, repair)
+        # End to end check of a few addresses against the query the table replaces
+        airdrop_class = airdrop.airdrop_processor.split(".")[-1] if airdrop.airdrop_processor else None
+        result["sample_differences"] = []
+        for address in claimable_balance_repository.get_sample_addresses(airdrop.id, sample_size):
+            stored = airdrop_repository.fetch_total_rewards_amount(airdrop.id, address, airdrop_class)
+            live = airdrop_repository.fetch_total_rewards_amount_live(airdrop.id, address, airdrop_class)
+            if stored != live:
+                result["sample_differences"].append({"address": address, "stored": stored, "live": live})
+        if result["missing"] or result["mismatched"] or result["sample_differences"]:
+            logger.error(f"Claimable balances of airdrop {airdrop.id} drifted: {json.dumps(result)}")
+        else:
+            logger.info(f"Claimable balances of airdrop {airdrop.id} match for {result['checked']} addresses, "
+                        f"{result['stale']} stale")
+        results.append(result)
+
+    return generate_lambda_response(
+        200,
+        "Success",
+        data=results
+    )
+
+
+@exception_handler(PROCESSOR_CONFIG=MATTERMOST_CONFIG, logger=logger)
+def sign_claims(event, context):
+    logger.info(f"Signing claims with the event={json.dumps(event)}")
+
+    options = event if isinstance(event, dict) else {}
+    if options.get("window_id"):
+        # Right after the rewards of a window are published
+        airdrop_window = AirdropWindowRepository().get_airdrop_window_by_id(options["window_id"])
+        airdrop_windows = [airdrop_window] if airdrop_window is not None else []
+    else:
+        airdrop_windows = ClaimSignatureRepository().get_windows_to_sign(
+            options.get("hours_before_claim", CLAIM_SIGNATURE_HOURS_BEFORE_CLAIM))
+
+    airdrop_services = AirdropServices()
+    results = [airdrop_services.sign_window_claims(airdrop_window) for airdrop_window in airdrop_windows]
+
+    logger.info(f"Completed signing claims of {len(results)} windows")
+    return generate_lambda_response(
+        200,
+        "Success",
+        data=results
+    )
+
+
+@exception_handler(PROCESSOR_CONFIG=MATTERMOST_CONFIG, logger=logger)
+def build_merkle_distribution(event, context):
+    logger.info(f"Building Merkle distribution with the event={json.dumps(event)}")
+
+    options = event if isinstance(event, dict) else {}
+    airdrop_id = options.get("airdrop_id")
+    if not airdrop_id:
+        logger.info(f"Invalid airdrop_id={airdrop_id} provided")
+        return generate_lambda_response(
+            200,
+            "failed"
+        )
+
+    builder = MerkleDistributionBuilder(Repository(NETWORK["db"]), airdrop_id)
+    result = builder.build()
+    # Only when the contract already accepts the root, otherwise publish_merkle_distribution once it's set
+    if options.get("publish", False):
+        builder.publish()
+
+    logger.info(f"Completed building Merkle distribution {result['distribution_guid']} of airdrop {airdrop_id}")
+    return generate_lambda_response(
+        200,
+        "Success",
+        data=result
+    )
+
+
+@exception_handler(PROCESSOR_CONFIG=MATTERMOST_CONFIG, logger=logger)
+def publish_merkle_distribution(event, context):
+    logger.info(f"Publishing Merkle distribution with the event={json.dumps(event)}")
+
+    distribution_guid = event.get("distribution_guid") if isinstance(event, dict) else None
+    if not distribution_guid:
+        logger.info(f"Invalid distribution_guid={distribution_guid} provided")
+        return generate_lambda_response(
+            200,
+            "failed"
+        )
+
+    publish_distribution(Repository(NETWORK["db"]), distribution_guid)
+
+    return generate_lambda_response(
+        200,
+        distribution_guid
+    )
 
 
 # Use for RJV Airdrop ONLY
@@ -0,0 +1,160 @@
+import uuid
+
+from airdrop.constants import MerkleDistributionStatus
+from common.logger import get_logger
+from common.merkle import LEAF_SIZE, MerkleTree, decode_leaf, encode_leaf, hash_leaf_data
+
+logger = get_logger(__name__)
+
+PROOF_BUFFER_SIZE = 10000
+# Proofs of this many latest distributions per airdrop are kept besides the published one
+DISTRIBUTIONS_TO_KEEP = 2
+
+
+def publish_distribution(airdrop_db, distribution_guid):
+    """
+    Serves the proofs of a staged distribution to claims instead of the published one.
+    Its root must be set in the airdrop contract first, proofs of another root are rejected.
+    """
+    distributions = airdrop_db.execute(
+        "select airdrop_id, status from merkle_distribution where distribution_guid = %s", [distribution_guid])
+    if not distributions or distributions[0]["status"] != MerkleDistributionStatus.STAGED.value:
+        raise Exception(f"No staged Merkle distribution {distribution_guid}")
+    airdrop_id = distributions[0]["airdrop_id"]
+    try:
+        airdrop_db.begin_transaction()
+        airdrop_db.execute(
+            "update merkle_distribution set status = %s, row_updated = current_timestamp " +
+            "where airdrop_id = %s and status = %s",
+            [MerkleDistributionStatus.SUPERSEDED.value, airdrop_id, MerkleDistributionStatus.PUBLISHED.value])
+        airdrop_db.execute(
+            "update merkle_distribution set status = %s, published_at = current_timestamp, " +
+            "row_updated = current_timestamp where distribution_guid = %s",
+            [MerkleDistributionStatus.PUBLISHED.value, distribution_guid])
+        airdrop_db.commit_transaction()
+    except Exception as e:
+        airdrop_db.rollback_transaction()
+        logger.error(f"Publishing Merkle distribution {distribution_guid} failed, error: {repr(e)}")
+        raise e
+    logger.info(f"Published Merkle distribution {distribution_guid} of airdrop {airdrop_id}")
+    purge_distributions(airdrop_db, airdrop_id)
+
+
+def purge_distributions(airdrop_db, airdrop_id):
+    # Proofs are only needed for the published distribution and the latest ones that may be published
+    distributions = airdrop_db.execute(
+        "select row_id, status from merkle_distribution where airdrop_id = %s and status <> %s order by row_id desc",
+        [airdrop_id, MerkleDistributionStatus.FAILED.value])
+    kept = [distribution["row_id"] for index, distribution in enumerate(distributions)
+            if index < DISTRIBUTIONS_TO_KEEP or distribution["status"] == MerkleDistributionStatus.PUBLISHED.value]
+    for distribution in distributions:
+        if distribution["row_id"] not in kept:
+            airdrop_db.execute("delete from merkle_proof where merkle_distribution_id = %s", [distribution["row_id"]])
+
+
+class MerkleDistributionBuilder:
+    """
+    Builds the Merkle tree of the rewards of an airdrop, one (address, amount, window) leaf
+    per rewarded address of a window, in one streaming pass over user_rewards. Leaves are
+    kept as their 84 byte encodings and the tree as packed hashes, so about 150 bytes per
+    leaf are held in memory. The root is stored in merkle_distribution and the proof of
+    every leaf in merkle_proof, where the claim endpoint reads it with a single lookup.
+    """
+
+    def __init__(self, airdrop_db, airdrop_id, buffer_size=PROOF_BUFFER_SIZE):
+        self._airdrop_db = airdrop_db
+        self._airdrop_id = airdrop_id
+        self._buffer_size = buffer_size
+        self._distribution_guid = str(uuid.uuid4())
+        self._distribution_id = None
+        self._skipped_addresses = 0
+
+    @property
+    def distribution_guid(self):
+        return self._distribution_guid
+
+    def build(self) -> dict:
+        result = self._airdrop_db.execute(
+            "insert into merkle_distribution (distribution_guid, airdrop_id, status, row_created, row_updated) " +
+            "values (%s, %s, %s, current_timestamp, current_timestamp)",
+            [self._distribution_guid, self._airdrop_id, MerkleDistributionStatus.STAGED.value])
+        self._distribution_id = result[1]["last_row_id"]
+        try:
+            tree, leaves = self.__read_leaves()
+            if len(tree) == 0:
+                raise Exception(f"No rewards to distribute for airdrop {self._airdrop_id}")
+            merkle_root = "0x" + tree.build().hex()
+            self.__save_proofs(tree, leaves)
+            self._airdrop_db.execute(
+                "update merkle_distribution set merkle_root = %s, leaf_count = %s, depth = %s, " +
+                "row_updated = current_timestamp where row_id = %s",
+                [merkle_root, len(tree), tree.depth, self._distribution_id])
+        except Exception as e:
+            logger.error(f"Building Merkle distribution {self._distribution_guid} failed, error: {repr(e)}")
+            self.discard()
+            raise e
+        logger.info(f"Staged Merkle distribution {self._distribution_guid} of airdrop {self._airdrop_id} with "
+                    f"root {merkle_root}, {len(tree)} leaves, {self._skipped_addresses} addresses skipped")
+        purge_distributions(self._airdrop_db, self._airdrop_id)
+        return {
+            "distribution_guid": self._distribution_guid,
+            "merkle_root": merkle_root,
+            "leaf_count": len(tree),
+            "depth": tree.depth,
+            "skipped_addresses": self._skipped_addresses
+        }
+
+    def publish(self):
+        publish_distribution(self._airdrop_db, self._distribution_guid)
+
+    def discard(self):
+        self._airdrop_db.execute("delete from merkle_proof where merkle_distribution_id = %s",
+                                 [self._distribution_id])
+        self._airdrop_db.execute(
+            "update merkle_distribution set status = %s, row_updated = current_timestamp where row_id = %s",
+            [MerkleDistributionStatus.FAILED.value, self._distribution_id])
+
+    def __read_leaves(self):
+        # Rewards of windows that require registration are only claimable by registered addresses
+        tree = MerkleTree()
+        leaves = bytearray()
+        rewards = self._airdrop_db.stream(
+            "select ur.airdrop_window_id, ur.address, ur.rewards_awarded from user_rewards ur " +
+            "join airdrop_window aw on aw.row_id = ur.airdrop_window_id " +
+            "where ur.airdrop_id = %s and ur.rewards_awarded > 0 and (aw.registration_required = 0 or exists (" +
+            "select 1 from user_registrations reg where reg.airdrop_window_id = ur.airdrop_window_id " +
+            "and reg.address = ur.address)) order by ur.airdrop_window_id, ur.address",
+            [self._airdrop_id])
+        for reward in rewards:
+            leaf_data = None
+            if reward["address"].startswith("0x"):
+                try:
+                    leaf_data = encode_leaf(reward["address"], reward["rewards_awarded"], reward["airdrop_window_id"])
+                except ValueError:
+                    pass
+            if leaf_data is None or len(leaf_data) != LEAF_SIZE:
+                # Only Ethereum addresses can claim from the contract
+                self._skipped_addresses += 1
+                continue
+            leaves += leaf_data
+            tree.add_leaf(hash_leaf_data(leaf_data))
+        return tree, leaves
+
+    def __save_proofs(self, tree, leaves):
+        rows = []
+        for index in range(len(tree)):
+            address, amount, window_id = decode_leaf(leaves[index * LEAF_SIZE:(index + 1) * LEAF_SIZE])
+            rows.append((self._distribution_id, window_id, address, amount, tree.proof(index).hex()))
+            if len(rows) >= self._buffer_size:
+                self.__insert_proofs(rows)
+        self.__insert_proofs(rows)
+
+    def __insert_proofs(self, rows):
+        if len(rows) == 0:
+            return
+        self._airdrop_db.bulk_insert(
+            "insert into merkle_proof (merkle_distribution_id, airdrop_window_id, address, amount, proof, " +
+            "row_created, row_updated) values ",
+            "(%s,%s,%s,%s,unhex(%s),current_timestamp,current_timestamp)",
+            rows)
+        rows.clear()
@@ -7,7 +7,8 @@ from web3 import Web3
 
 from airdrop.application.services.common_logic_service import CommonLogicService
 from airdrop.constants import CARDANO_ADDRESS_PREFIXES, Blockchain, CardanoEra
-from airdrop.infrastructure.models import UserBalanceSnapshot, UserRegistration
+from airdrop.infrastructure.models import BalanceSnapshot, BalanceSnapshotWindow, UserBalanceHistory, \
+    UserBalanceSnapshot, UserBalanceSnapshotDelta, UserRegistration
 from airdrop.infrastructure.repositories.airdrop_repository import AirdropRepository
 from airdrop.infrastructure.repositories.user_registration_repo import UserRegistrationRepository
 from airdrop.utils import Utils
@@ -146,6 +147,49 @@ def snapshot_cardano_addresses(event: dict):
         )
     )
     result = repo.session.execute(query).all()
+
+    # Snapshots in shared storage are linked to the window instead of being copied per window
+    shared_query = select(BalanceSnapshot).join(
+        BalanceSnapshotWindow,
+        BalanceSnapshotWindow.snapshot_guid == BalanceSnapshot.snapshot_guid
+    ).where(
+        BalanceSnapshot.snapshot_guid == snapshot_guid,
+        BalanceSnapshotWindow.airdrop_window_id == window_id,
+        BalanceSnapshot.address.like("addr%"),
+        or_(
+            BalanceSnapshot.payment_part.is_(None),
+            BalanceSnapshot.payment_part == "",
+            BalanceSnapshot.staking_part.is_(None),
+            BalanceSnapshot.staking_part == ""
+        )
+    )
+    result += repo.session.execute(shared_query).all()
+
+    # A delta snapshot only holds the changed addresses, the rest of it lives in the earlier delta rows of the window
+    delta_query = select(UserBalanceSnapshotDelta).where(
+        UserBalanceSnapshotDelta.airdrop_window_id == window_id,
+        UserBalanceSnapshotDelta.address.like("addr%"),
+        or_(
+            UserBalanceSnapshotDelta.payment_part.is_(None),
+            UserBalanceSnapshotDelta.payment_part == "",
+            UserBalanceSnapshotDelta.staking_part.is_(None),
+            UserBalanceSnapshotDelta.staking_part == ""
+        )
+    )
+    result += repo.session.execute(delta_query).all()
+
+    # Balance intervals of the history storage outlive the snapshot that opened them
+    history_query = select(UserBalanceHistory).where(
+        UserBalanceHistory.airdrop_window_id == window_id,
+        UserBalanceHistory.address.like("addr%"),
+        or_(
+            UserBalanceHistory.payment_part.is_(None),
+            UserBalanceHistory.payment_part == "",
+            UserBalanceHistory.staking_part.is_(None),
+            UserBalanceHistory.staking_part == ""
+        )
+    )
+    result += repo.session.execute(history_query).all()
     total = len(result)
 
     batch_count = 0
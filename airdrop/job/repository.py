@@ -1,8 +1,13 @@
 import pymysql
+import pymysql.cursors
 from common.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Upper bound for a single multi-row statement, even if the server allows larger packets
+MAX_BULK_STATEMENT_SIZE = 16 * 1024 * 1024
+BULK_STATEMENT_HEADROOM = 1024
+
 class Repository:
     connection = None
 
@@ -14,6 +19,7 @@ class Repository:
         self.DB_PORT = db['DB_PORT']
         self.connection = self.__get_connection()
         self.auto_commit = True
+        self._max_allowed_packet = None
 
     def execute(self, query, params=None):
         return self.__execute_query(query, params)
@@ -53,6 +59,26 @@ class Repository:
             raise e
         return result
 
+    def stream(self, query, params=None, fetch_size=1000):
+        # Unbuffered server-side cursor: rows are pulled from the server in chunks of
+        # fetch_size, so memory stays flat regardless of the result size. The connection
+        # can't run other statements until the generator is exhausted or closed.
+        cursor = self.connection.cursor(pymysql.cursors.SSCursor)
+        try:
+            cursor.execute(query, params)
+            field_name = [field[0] for field in cursor.description]
+            while True:
+                db_rows = cursor.fetchmany(fetch_size)
+                if not db_rows:
+                    break
+                for values in db_rows:
+                    yield dict(zip(field_name, values))
+        except Exception as e:
+            logger.error(f"DB Error in {str(query)}, error: {repr(e)}")
+            raise e
+        finally:
+            cursor.close()
+
     def bulk_query(self, query, params=None):
         try:
             with self.connection.cursor() as cursor:
@@ -65,6 +91,43 @@ class Repository:
                 self.connection.rollback()
             logger.error(f"DB Error in {str(query)}, error: {repr(err)}")
 
+    def get_max_allowed_packet(self):
+        if self._max_allowed_packet is None:
+            result = self.execute("select @@max_allowed_packet as max_allowed_packet")
+            self._max_allowed_packet = min(int(result[0]["max_allowed_packet"]), MAX_BULK_STATEMENT_SIZE)
+        return self._max_allowed_packet
+
+    def bulk_insert(self, insert_clause, row_template, rows, suffix=""):
+        # Builds multi-row "insert ... values (...),(...)" statements, each sized to fit in the
+        # server's max_allowed_packet, instead of executemany round trips. Unlike bulk_query
+        # errors are raised, so callers can roll back the surrounding transaction.
+        budget = self.get_max_allowed_packet() - len(insert_clause) - len(suffix) - BULK_STATEMENT_HEADROOM
+        inserted = 0
+        try:
+            with self.connection.cursor() as cursor:
+                values = []
+                size = 0
+                for row in rows:
+                    value = cursor.mogrify(row_template, row)
+                    # Bytes are escaped to surrogates, pymysql encodes the statement the same way
+                    value_size = len(value.encode("utf-8", "surrogateescape")) + 1
+                    if values and size + value_size > budget:
+                        inserted += cursor.execute(insert_clause + ",".join(values) + suffix)
+                        values.clear()
+                        size = 0
+                    values.append(value)
+                    size += value_size
+                if values:
+                    inserted += cursor.execute(insert_clause + ",".join(values) + suffix)
+                if self.auto_commit:
+                    self.connection.commit()
+        except Exception as err:
+            if self.auto_commit:
+                self.connection.rollback()
+            logger.error(f"DB Error in bulk insert {str(insert_clause)}, error: {repr(err)}")
+            raise err
+        return inserted
+
     def begin_transaction(self):
         self.connection.begin()
         self.auto_commit = False
@@ -74,4 +137,5 @@ class Repository:
         self.auto_commit = True
 
     def rollback_transaction(self):
-        self.connection.rollback()
\ No newline at end of file
+        self.connection.rollback()
+        self.auto_commit = True
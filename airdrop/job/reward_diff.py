@@ -0,0 +1,69 @@
+from common.logger import get_logger
+
+logger = get_logger(__name__)
+
+TOP_MOVERS = 10
+
+
+def load_window_rewards(airdrop_db, window_id):
+    rows = airdrop_db.execute("select address, rewards_awarded from user_rewards where airdrop_window_id = %s",
+                              [window_id])
+    return {row["address"]: row["rewards_awarded"] for row in rows}
+
+
+def diff_rewards(current, proposed, replaces_window=True, top_movers=TOP_MOVERS):
+    """
+    Compact diff between the stored rewards of a window and the rewards a dry run would
+    write, both given as address -> reward maps. With replaces_window the run resets
+    every address it doesn't reward, as NunetRewardProcessor does; otherwise addresses
+    missing from proposed keep their current reward, as with the upserting processors.
+    Amounts are ints so the result can be returned as JSON.
+    """
+    if replaces_window:
+        addresses = set(current) | set(proposed)
+    else:
+        addresses = set(proposed)
+    added, removed, changed = 0, 0, 0
+    total_current, total_proposed = 0, 0
+    movers = []
+    for address in addresses:
+        before = int(current.get(address) or 0)
+        after = int(proposed.get(address) or 0)
+        total_current += before
+        total_proposed += after
+        if before == after:
+            continue
+        # A stored zero reward, as the resetting runs leave, counts as no reward
+        if before == 0:
+            added += 1
+        elif after == 0:
+            removed += 1
+        else:
+            changed += 1
+        movers.append((address, before, after))
+    if not replaces_window:
+        untouched = sum(int(reward or 0) for address, reward in current.items() if address not in proposed)
+        total_current += untouched
+        total_proposed += untouched
+    movers.sort(key=lambda mover: abs(mover[2] - mover[1]), reverse=True)
+    return {
+        "addresses": len(addresses),
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "unchanged": len(addresses) - len(movers),
+        "total_current": total_current,
+        "total_proposed": total_proposed,
+        "total_delta": total_proposed - total_current,
+        "top_movers": [{"address": address, "current": before, "proposed": after, "delta": after - before}
+                       for address, before, after in movers[:top_movers]]
+    }
+
+
+def log_reward_diff(window_id, diff):
+    logger.info(f"Dry run for window {window_id}: {diff['added']} added, {diff['removed']} removed, "
+                f"{diff['changed']} changed and {diff['unchanged']} unchanged addresses, total rewards "
+                f"{diff['total_current']} -> {diff['total_proposed']} (delta {diff['total_delta']})")
+    for mover in diff["top_movers"]:
+        logger.info(f"Dry run for window {window_id}: {mover['address']} {mover['current']} -> "
+                    f"{mover['proposed']} (delta {mover['delta']})")
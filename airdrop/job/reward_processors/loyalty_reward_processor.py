@@ -1,33 +1,45 @@
 from airdrop.config import NETWORK, TOKEN_SNAPSHOT_DB_CONFIG, TOTAL_LOYALTY_REWARD_IN_COGS, \
     TOTAL_WALLET_BALANCE_IN_COGS, TOTAL_STAKE_BALANCE_IN_COGS, EXCLUDED_LOYALTY_WALLETS
+from airdrop.infrastructure.repositories.user_claimable_balance_repository import UserClaimableBalanceRepository
 from airdrop.job.repository import Repository
+from airdrop.job.reward_diff import diff_rewards, load_window_rewards, log_reward_diff
 from airdrop.utils import datetime_in_utcnow
 from common.logger import get_logger
 
 logger = get_logger(__name__)
 
+REWARD_BATCH_SIZE = 5000
+# Server-side rewards within this relative distance of an integer are recomputed with
+# calculate_reward, since MySQL and Python may round the last bits of the divisions differently
+SERVER_SIDE_BOUNDARY_TOLERANCE = 2e-15
+
 
 class LoyaltyEligibilityProcessor:
-    def __init__(self, airdrop_id, window_id):
+    def __init__(self, airdrop_id, window_id, streaming=False, batch_size=REWARD_BATCH_SIZE, server_side=False,
+                 verify_parity=False, dry_run=False, cross_schema=False):
+        self._dry_run = dry_run
+        # Server-side rewards read the token snapshot schema through the airdrop connection. Only for
+        # deployments where both schemas share a server and the airdrop user may read the snapshots
+        self._cross_schema = cross_schema
+        self._streaming = streaming
+        self._server_side = server_side
+        self._verify_parity = verify_parity
+        self._batch_size = batch_size
         self.current_datetime = datetime_in_utcnow()
         self._airdrop_db = Repository(NETWORK["db"])
         self._token_snapshot_db = Repository(TOKEN_SNAPSHOT_DB_CONFIG)
         self._airdrop_id = airdrop_id
         self._window_id = window_id
-        excluded_wallets = "('" + "','".join(str(x) for x in EXCLUDED_LOYALTY_WALLETS) + "')"
-        self.__eligible_user_query = "SELECT * FROM (SELECT sts.staker_address, tsm.wallet_address ," \
-                                     "sts.balance_in_cogs AS staker_balance, tsm.balance_in_cogs AS " \
-                                     "wallet_balance, tsm.is_contract  FROM staking_token_snapshots sts LEFT JOIN " \
-                                     "token_snapshots_00MINS tsm ON sts.staker_address = tsm.wallet_address UNION " \
-                                     "SELECT sts.staker_address, tsm.wallet_address ,sts.balance_in_cogs AS stake_balance ," \
-                                     "tsm.balance_in_cogs AS wallet_balance, tsm.is_contract FROM staking_token_snapshots sts RIGHT JOIN " \
-                                     "token_snapshots_00MINS tsm  ON sts.staker_address = tsm.wallet_address ) a  where " \
-                                     "( wallet_balance >= 1000000000 or staker_balance >= 1000000000 )and (" \
-                                     f"wallet_address is null or  wallet_address not in {excluded_wallets}) "
+        self.__eligible_user_query = self.__eligible_user_sql()
         self.__insert_reward = "insert into user_rewards (airdrop_id, airdrop_window_id, address, rewards_awarded, " \
                                "score, normalized_score, row_created, row_updated) " + \
                                "values(%s,%s,%s,%s,0,0, current_timestamp, current_timestamp)  " + \
                                "on duplicate key update rewards_awarded = %s, score = 0, normalized_score = 0, row_updated = current_timestamp"
+        self.__upsert_reward = "insert into user_rewards (airdrop_id, airdrop_window_id, address, rewards_awarded, " \
+                               "score, normalized_score, row_created, row_updated) values "
+        self.__upsert_reward_row = "(%s,%s,%s,%s,0,0,current_timestamp,current_timestamp)"
+        self.__upsert_reward_suffix = " on duplicate key update rewards_awarded = values(rewards_awarded), score = 0, " \
+                                      "normalized_score = 0, row_updated = current_timestamp"
         self._window_detail_query = f"select a.org_name , a.token_name , aw.registration_start_period , " \
                                     "aw.registration_end_period , aw.claim_start_period , aw.claim_end_period from airdrop " \
                                     f"a join airdrop_window aw on a.row_id = aw.airdrop_id where a.row_id = {self._airdrop_id} and " \
@@ -36,6 +48,20 @@ class LoyaltyEligibilityProcessor:
 
         self.total_no_of_windows = 0
 
+    @staticmethod
+    def __eligible_user_sql(schema=None):
+        prefix = f"`{schema}`." if schema else ""
+        excluded_wallets = "('" + "','".join(str(x) for x in EXCLUDED_LOYALTY_WALLETS) + "')"
+        return "SELECT * FROM (SELECT sts.staker_address, tsm.wallet_address ," \
+               "sts.balance_in_cogs AS staker_balance, tsm.balance_in_cogs AS " \
+               f"wallet_balance, tsm.is_contract  FROM {prefix}staking_token_snapshots sts LEFT JOIN " \
+               f"{prefix}token_snapshots_00MINS tsm ON sts.staker_address = tsm.wallet_address UNION " \
+               "SELECT sts.staker_address, tsm.wallet_address ,sts.balance_in_cogs AS stake_balance ," \
+               f"tsm.balance_in_cogs AS wallet_balance, tsm.is_contract FROM {prefix}staking_token_snapshots sts RIGHT JOIN " \
+               f"{prefix}token_snapshots_00MINS tsm  ON sts.staker_address = tsm.wallet_address ) a  where " \
+               "( wallet_balance >= 1000000000 or staker_balance >= 1000000000 )and (" \
+               f"wallet_address is null or  wallet_address not in {excluded_wallets}) "
+
     def get_eligible_users(self):
         users = self._token_snapshot_db.execute(self.__eligible_user_query)
         return users
@@ -106,17 +132,26 @@ class LoyaltyEligibilityProcessor:
             return "Validation failed"
 
         self.set_total_windows()
+        if self._dry_run:
+            return self.__dry_run_rewards()
+        if self._server_side:
+            response = self.__compute_rewards_server_side()
+        elif self._streaming:
+            response = self.__stream_rewards()
+        else:
+            response = self.__compute_rewards()
+        UserClaimableBalanceRepository().refresh_window(self._window_id)
+        if self._verify_parity:
+            self.verify_rewards()
+        return response
+
+    def __compute_rewards(self):
         eligible_users = self.get_eligible_users()
         logger.info(f"Total eligible users={len(eligible_users)}")
 
         final_users = list()
         for eligible_user in eligible_users:
-            address = eligible_user.get('wallet_address')
-            if not address:
-                address = eligible_user.get('staker_address')
-
-            reward = self.calculate_reward(stake_balance_in_cogs=eligible_user.get('staker_balance'),
-                                           wallet_balance_in_cogs=eligible_user.get('wallet_balance'))
+            address, reward = self.__user_reward(eligible_user)
             final_users.append(
                 tuple([self._airdrop_id, self._window_id, address, reward, reward]))
 
@@ -125,3 +160,145 @@ class LoyaltyEligibilityProcessor:
 
         return f"{len(final_users)} users are eligible for claim on airdrop_id={self._airdrop_id}, " \
                f"window_id={self._window_id}"
+
+    def __reward_sql(self):
+        # Same double arithmetic and evaluation order as calculate_reward
+        wallet_balance = "coalesce(eligible.wallet_balance, 0)"
+        stake_balance = "coalesce(eligible.staker_balance, 0)"
+        return f"((({wallet_balance} + {stake_balance}) * 1e0 / {TOTAL_WALLET_BALANCE_IN_COGS}e0 * 8e-1 * " \
+               f"{TOTAL_LOYALTY_REWARD_IN_COGS}e0 + {stake_balance} * 1e0 / {TOTAL_STAKE_BALANCE_IN_COGS}e0 * 2e-1 * " \
+               f"{TOTAL_LOYALTY_REWARD_IN_COGS}e0) / {int(self.total_no_of_windows)}e0)"
+
+    def __stage_eligible_users(self):
+        # The eligible users are read once into a temporary table on the airdrop server, so the
+        # reward insert and the boundary check don't evaluate the snapshot UNION again
+        self._airdrop_db.execute("drop temporary table if exists tmp_loyalty_eligible_users")
+        self._airdrop_db.execute(
+            "create temporary table tmp_loyalty_eligible_users (staker_address varchar(250) null, "
+            "wallet_address varchar(250) null, staker_balance bigint null, wallet_balance bigint null)")
+        if self._cross_schema:
+            logger.info("Staging eligible users with a cross-schema query on the airdrop server")
+            staged = self._airdrop_db.execute(
+                "insert into tmp_loyalty_eligible_users (staker_address, wallet_address, staker_balance, "
+                "wallet_balance) select eligible.staker_address, eligible.wallet_address, eligible.staker_balance, "
+                f"eligible.wallet_balance from ({self.__eligible_user_sql(TOKEN_SNAPSHOT_DB_CONFIG['DB_NAME'])}) "
+                "as eligible")[0]
+            logger.info(f"Staged {staged} eligible users in a temporary table")
+            return staged
+        rows = list()
+        staged = 0
+        for eligible_user in self._token_snapshot_db.stream(self.__eligible_user_query):
+            rows.append((eligible_user.get('staker_address'), eligible_user.get('wallet_address'),
+                         eligible_user.get('staker_balance'), eligible_user.get('wallet_balance')))
+            if len(rows) >= self._batch_size:
+                staged += self._airdrop_db.bulk_insert(
+                    "insert into tmp_loyalty_eligible_users (staker_address, wallet_address, staker_balance, "
+                    "wallet_balance) values ", "(%s,%s,%s,%s)", rows)
+                rows.clear()
+        if rows:
+            staged += self._airdrop_db.bulk_insert(
+                "insert into tmp_loyalty_eligible_users (staker_address, wallet_address, staker_balance, "
+                "wallet_balance) values ", "(%s,%s,%s,%s)", rows)
+        logger.info(f"Staged {staged} eligible users in a temporary table")
+        return staged
+
+    def __compute_rewards_server_side(self):
+        eligible_users = self.__stage_eligible_users()
+        source = "tmp_loyalty_eligible_users as eligible"
+        reward = self.__reward_sql()
+        try:
+            self._airdrop_db.begin_transaction()
+            self._airdrop_db.execute(
+                "insert into user_rewards (airdrop_id, airdrop_window_id, address, rewards_awarded, score, "
+                "normalized_score, row_created, row_updated) "
+                "select %s, %s, coalesce(nullif(eligible.wallet_address, ''), eligible.staker_address), "
+                f"floor({reward}), 0, 0, current_timestamp, current_timestamp from {source}" +
+                self.__upsert_reward_suffix,
+                [self._airdrop_id, self._window_id])
+            boundary_users = self._airdrop_db.execute(
+                "select eligible.staker_address, eligible.wallet_address, eligible.staker_balance, "
+                f"eligible.wallet_balance from {source} "
+                f"where {reward} - floor({reward}) < {SERVER_SIDE_BOUNDARY_TOLERANCE} * greatest({reward}, 1) "
+                f"or floor({reward}) + 1 - {reward} < {SERVER_SIDE_BOUNDARY_TOLERANCE} * greatest({reward}, 1)")
+            rewards = list()
+            for eligible_user in boundary_users:
+                address, reward_in_cogs = self.__user_reward(eligible_user)
+                rewards.append((self._airdrop_id, self._window_id, address, reward_in_cogs))
+            self.__upsert_rewards(rewards)
+            self._airdrop_db.commit_transaction()
+        except Exception as e:
+            self._airdrop_db.rollback_transaction()
+            logger.error(f"Server-side loyalty rewards rolled back, error: {repr(e)}")
+            raise e
+        finally:
+            self._airdrop_db.execute("drop temporary table if exists tmp_loyalty_eligible_users")
+        logger.info(f"Rewards computed on the server, {len(boundary_users)} users near a rounding boundary "
+                    f"recomputed with calculate_reward")
+
+        return f"{eligible_users} users are eligible for claim on airdrop_id={self._airdrop_id}, " \
+               f"window_id={self._window_id}"
+
+    def verify_rewards(self):
+        """
+        Parity check for the reward modes: recomputes every eligible user's reward with
+        calculate_reward and compares it with the stored user_rewards of the window.
+        Returns the addresses whose stored reward is missing or different.
+        """
+        stored = {row["address"]: int(row["rewards_awarded"]) for row in self._airdrop_db.execute(
+            "select address, rewards_awarded from user_rewards where airdrop_id = %s and airdrop_window_id = %s",
+            [self._airdrop_id, self._window_id])}
+        mismatches = dict()
+        checked = 0
+        for eligible_user in self._token_snapshot_db.stream(self.__eligible_user_query):
+            address, reward = self.__user_reward(eligible_user)
+            checked += 1
+            if stored.get(address) != reward:
+                mismatches[address] = (stored.get(address), reward)
+        if mismatches:
+            logger.error(f"Loyalty reward parity check failed for {len(mismatches)} of {checked} users, "
+                         f"first mismatches (stored, expected): {dict(list(mismatches.items())[:10])}")
+        else:
+            logger.info(f"Loyalty reward parity check passed for {checked} users")
+        return mismatches
+
+    def __dry_run_rewards(self):
+        proposed = dict()
+        for eligible_user in self._token_snapshot_db.stream(self.__eligible_user_query):
+            address, reward = self.__user_reward(eligible_user)
+            proposed[address] = reward
+        diff = diff_rewards(load_window_rewards(self._airdrop_db, self._window_id), proposed, replaces_window=False)
+        log_reward_diff(self._window_id, diff)
+        return diff
+
+    def __user_reward(self, eligible_user):
+        address = eligible_user.get('wallet_address')
+        if not address:
+            address = eligible_user.get('staker_address')
+
+        reward = self.calculate_reward(stake_balance_in_cogs=eligible_user.get('staker_balance'),
+                                       wallet_balance_in_cogs=eligible_user.get('wallet_balance'))
+        return address, reward
+
+    def __stream_rewards(self):
+        # The joined snapshot is read through a server-side cursor and the rewards are upserted
+        # in batches on the airdrop connection while the read is still running
+        rewards = list()
+        eligible_users = 0
+        for eligible_user in self._token_snapshot_db.stream(self.__eligible_user_query):
+            address, reward = self.__user_reward(eligible_user)
+            rewards.append((self._airdrop_id, self._window_id, address, reward))
+            eligible_users += 1
+            if len(rewards) >= self._batch_size:
+                self.__upsert_rewards(rewards)
+        self.__upsert_rewards(rewards)
+        logger.info(f"Total eligible users={eligible_users}")
+
+        return f"{eligible_users} users are eligible for claim on airdrop_id={self._airdrop_id}, " \
+               f"window_id={self._window_id}"
+
+    def __upsert_rewards(self, rewards):
+        if not rewards:
+            return
+        self._airdrop_db.bulk_insert(self.__upsert_reward, self.__upsert_reward_row, rewards,
+                                     self.__upsert_reward_suffix)
+        rewards.clear()
@@ -1,45 +1,125 @@
 
 import math
+import uuid
 
-from decimal import Decimal
+import numpy as np
+from decimal import Decimal, ROUND_HALF_UP
 from common.alerts import MattermostProcessor
 from common.exception_handler import exception_handler
 from airdrop.config import MATTERMOST_CONFIG
+from airdrop.job.reward_processors.nunet_scoring import (
+    AGIX_DECIMALS,
+    MICRO,
+    allocate_rewards,
+    can_vectorize,
+    decimal_score,
+    micro_to_decimal,
+    score_holders,
+)
+from airdrop.infrastructure.repositories.user_claimable_balance_repository import UserClaimableBalanceRepository
+from airdrop.infrastructure.repositories.user_reward_audit_repository import AUDIT_ARTIFACT_FORMAT, encode_audit_artifact
+from airdrop.job.reward_diff import diff_rewards, load_window_rewards, log_reward_diff
+from airdrop.job.reward_staging import RewardStaging
+from airdrop.job.snapshot_storage import window_snapshot_guids, window_snapshot_rows
+from airdrop.job.snapshot_writer import fold_window_aggregates
 from common.logger import get_logger
 
 logger = get_logger(__name__)
 
 TOKENS_ALLOCATED_PER_WINDOW = Decimal(12500000)
-SCORE_DENOMINATOR = Decimal(100000)
 NUNET_DECIMALS = Decimal(1000000)
-AGIX_DECIMALS = Decimal(100000000)
 AGIX_THRESHOLD_IN_COGS = 250000000000
+SCORE_CACHE_DELETE_BATCH_SIZE = 1000
+AUDIT_ARTIFACT_PART_ROWS = 50000
 
 class UserRewardObject:
+    # One object per holder is kept for the whole run. Slots avoid a __dict__ per object and
+    # amounts are held as ints, in cogs and millionths of a score; the Decimals are built on access
+    __slots__ = ("_address", "_balance_cogs", "_staked_cogs", "_score_micro", "_log10_score_micro", "_reward",
+                 "_comment", "_rewarded")
+
     def __init__(self, address, balance, staked):
+        _, _, score, log10_score = decimal_score(balance, staked)
+        self.__set_values(address, balance, staked, score, log10_score)
+
+    @classmethod
+    def from_scores(cls, address, balance, staked, score, log10_score):
+        user = cls.__new__(cls)
+        user.__set_values(address, balance, staked, score, log10_score)
+        return user
+
+    @classmethod
+    def from_micro_scores(cls, address, balance, staked, score_micro, log10_score_micro):
+        # Scores already in millionths, as score_holders returns them
+        user = cls.__new__(cls)
+        user.__set_values(address, balance, staked, 0, 0)
+        user._score_micro = score_micro
+        user._log10_score_micro = log10_score_micro
+        return user
+
+    def __set_values(self, address, balance, staked, score, log10_score):
         self._address = address
-        self._balance = Decimal(balance) / AGIX_DECIMALS
-        self._staked = Decimal(staked) / AGIX_DECIMALS
-        self._score = round((self._balance + (Decimal(0.2) * self._staked)) / SCORE_DENOMINATOR, 6)
-        self._log10_score = round(Decimal(math.log10(self._score + 1)),6)
+        # Balances are read as Decimals from the DECIMAL columns, ints take a fraction of their memory
+        self._balance_cogs = int(balance)
+        self._staked_cogs = int(staked)
+        # Scores are rounded to 6 decimals, so the conversion is exact
+        self._score_micro = int(score * MICRO)
+        self._log10_score_micro = int(log10_score * MICRO)
         self._reward = 0
         self._comment = None
+        self._rewarded = False
+
+    @property
+    def _balance(self):
+        return Decimal(self._balance_cogs) / AGIX_DECIMALS
+
+    @property
+    def _staked(self):
+        return Decimal(self._staked_cogs) / AGIX_DECIMALS
+
+    @property
+    def _score(self):
+        return micro_to_decimal(self._score_micro)
+
+    @property
+    def _log10_score(self):
+        return micro_to_decimal(self._log10_score_micro)
 
     def set_comment(self, comment):
         self._comment = comment
+
+    def set_rewarded(self, rewarded):
+        self._rewarded = rewarded
     
     def set_reward(self, reward):
-        self._reward = round(reward,0)
+        self._reward = int(round(reward,0))
 
 
 class NunetRewardProcessor:
-    def __init__(self, airdrop_db, airdrop_id, window_id, snapshpt_guid):
+    def __init__(self, airdrop_db, airdrop_id, window_id, snapshpt_guid, vectorized_scoring=False, staged_publish=False,
+                 dry_run=False, incremental=False, compact_audit=False):
+        # Incremental runs only write the rewards that changed, straight to user_rewards, a staged
+        # run would be opened and never published
+        if incremental and staged_publish:
+            raise Exception("Incremental runs cannot be staged, use either incremental or staged_publish")
         self._airdrop_db = airdrop_db
+        # Audit only skipped and adjusted users individually, the others in a gzipped artifact per run
+        self._compact_audit = compact_audit
+        self._adjusted_addresses = set()
+        # Reuse cached scores of unchanged addresses and only write rewards that changed
+        self._incremental = incremental
+        # Compute the rewards and return a diff against user_rewards without writing anything
+        self._dry_run = dry_run
+        # Stage the rewards of the run and publish them to user_rewards in one short merge
+        self._staged_publish = staged_publish
+        # Score and allocate with NumPy arrays. Users are still kept per holder for the audit and the
+        # rewards written, which is most of the run time of large windows
+        self._vectorized_scoring = vectorized_scoring
         self._airdrop_id = airdrop_id
         self._window_id = window_id
         self._snapshot_guid = snapshpt_guid
-        self._all_users = []
-        self._users_to_reward = []
+        # All holders of the window, the ones to reward are flagged with _rewarded
+        self._users = []
         self.__insert_reward = "insert into user_rewards (airdrop_id, airdrop_window_id, address, rewards_awarded, score, normalized_score, row_created, row_updated) "+\
                                "values(%s,%s,%s,%s,%s,%s, current_timestamp, current_timestamp) "+\
                                "on duplicate key update rewards_awarded = %s, score = %s, normalized_score = %s, row_updated = current_timestamp"
@@ -53,7 +133,7 @@ class NunetRewardProcessor:
         return        
 
     def __get_distinct_snapshots(self):
-        result = self._airdrop_db.execute("select count(distinct snapshot_guid) as distinct_snapshots from user_balance_snapshot where airdrop_window_id = %s", [self._window_id])
+        result = self._airdrop_db.execute(f"select count(*) as distinct_snapshots from {window_snapshot_guids(self._window_id)}")
         return result[0]["distinct_snapshots"]
     
     def __reset_user_rewards(self):
@@ -68,6 +148,38 @@ class NunetRewardProcessor:
         return [self._airdrop_id, self._window_id, self._snapshot_guid, getattr(user, "_address"), getattr(user, "_balance"), getattr(user, "_staked"), 
                 getattr(user, "_score"), getattr(user, "_log10_score"), getattr(user, "_reward"), getattr(user, "_comment")]
 
+    # Splits the audit of the given users into individual user_rewards_audit rows and, with
+    # compact_audit, the parts of the run's artifact for users that were neither skipped nor adjusted.
+    # Staged runs pass their run_guid so the artifact is linked to the published run
+    def __get_audit_rows(self, users, run_guid=None, compact=None):
+        if not (self._compact_audit if compact is None else compact):
+            return [tuple(self.__get_audit_values(user)) for user in users], []
+        audit_rows = []
+        artifact_rows = []
+        for user in users:
+            if getattr(user, "_comment") is not None or getattr(user, "_address") in self._adjusted_addresses:
+                audit_rows.append(tuple(self.__get_audit_values(user)))
+            else:
+                # Rounded like the BIGINT balance columns of user_rewards_audit
+                artifact_rows.append((getattr(user, "_address"),
+                                      getattr(user, "_balance").quantize(Decimal(1), rounding=ROUND_HALF_UP),
+                                      getattr(user, "_staked").quantize(Decimal(1), rounding=ROUND_HALF_UP),
+                                      getattr(user, "_score"), getattr(user, "_log10_score"), getattr(user, "_reward"), None))
+        run_guid = run_guid or str(uuid.uuid4())
+        artifact_parts = [(self._airdrop_id, self._window_id, self._snapshot_guid, run_guid, part, len(rows), AUDIT_ARTIFACT_FORMAT,
+                           encode_audit_artifact(rows))
+                          for part, rows in enumerate(artifact_rows[start:start + AUDIT_ARTIFACT_PART_ROWS]
+                                                      for start in range(0, len(artifact_rows), AUDIT_ARTIFACT_PART_ROWS))]
+        return audit_rows, artifact_parts
+
+    def __insert_audit_artifact(self, artifact_parts):
+        if len(artifact_parts) == 0:
+            return
+        self._airdrop_db.bulk_insert(
+            "insert into user_rewards_audit_artifact (airdrop_id, airdrop_window_id, snapshot_guid, run_guid, part, row_count, format, payload, row_created, row_updated) values ",
+            "(%s,%s,%s,%s,%s,%s,%s,%s,current_timestamp,current_timestamp)", artifact_parts)
+        logger.info(f"Stored audit of {sum(part[5] for part in artifact_parts)} users in {len(artifact_parts)} artifact parts for window {self._window_id}")
+
     def __batch_insert(self, values, is_audit_row, force=False):
         query = self.__insert_reward
         rows = self.__reward_rows
@@ -105,60 +217,204 @@ class NunetRewardProcessor:
             user_pending_rewards[row["address"].lower()] = row["pending_reward"]
         return additional_rewards, user_pending_rewards
 
+    def __get_score_cache(self):
+        rows = self._airdrop_db.execute("select address, balance, staked, score, normalized_score from user_reward_score_cache where airdrop_window_id = %s", [self._window_id])
+        return {row["address"]: (int(row["balance"]), int(row["staked"]), row["score"], row["normalized_score"]) for row in rows}
+
+    # Writes only the user_rewards rows whose values differ from the stored ones and refreshes the
+    # score cache for the addresses that were rescored. The audit still covers every user, compacted
+    # into an artifact so it doesn't cost a row per holder
+    def __write_changed_rewards(self, proposed_rewards, rescored, score_cache):
+        stored = self._airdrop_db.execute("select address, rewards_awarded, score, normalized_score from user_rewards where airdrop_window_id = %s", [self._window_id])
+        stored = {row["address"]: (row["rewards_awarded"], row["score"], row["normalized_score"]) for row in stored}
+        users = {getattr(user, "_address"): user for user in self._users}
+        changed_rows = []
+        for address, reward in proposed_rewards.items():
+            user = users[address]
+            values = (reward, getattr(user, "_score"), getattr(user, "_log10_score"))
+            if stored.get(address) != values:
+                changed_rows.append((self._airdrop_id, self._window_id, address) + values)
+        # Addresses no longer rewarded are reset, as __reset_user_rewards does for full runs
+        for address, values in stored.items():
+            if address not in proposed_rewards and values != (0, 0, 0):
+                changed_rows.append((self._airdrop_id, self._window_id, address, 0, 0, 0))
+        removed_addresses = [address for address in score_cache if address not in users]
+
+        try:
+            self._airdrop_db.begin_transaction()
+            self._airdrop_db.bulk_insert(
+                "insert into user_rewards (airdrop_id, airdrop_window_id, address, rewards_awarded, score, normalized_score, row_created, row_updated) values ",
+                "(%s,%s,%s,%s,%s,%s,current_timestamp,current_timestamp)", changed_rows,
+                " on duplicate key update rewards_awarded = values(rewards_awarded), score = values(score), normalized_score = values(normalized_score), row_updated = current_timestamp")
+            audit_rows, artifact_parts = self.__get_audit_rows(self._users, compact=True)
+            self._airdrop_db.bulk_insert(
+                "insert into user_rewards_audit (airdrop_id, airdrop_window_id, snapshot_guid, address, balance, staked, score, normalized_score, rewards_awarded, comment, row_created, row_updated) values ",
+                "(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,current_timestamp,current_timestamp)", audit_rows)
+            self.__insert_audit_artifact(artifact_parts)
+            self._airdrop_db.bulk_insert(
+                "insert into user_reward_score_cache (airdrop_window_id, address, balance, staked, score, normalized_score, row_created, row_updated) values ",
+                "(%s,%s,%s,%s,%s,%s,current_timestamp,current_timestamp)", rescored,
+                " on duplicate key update balance = values(balance), staked = values(staked), score = values(score), normalized_score = values(normalized_score), row_updated = current_timestamp")
+            for start in range(0, len(removed_addresses), SCORE_CACHE_DELETE_BATCH_SIZE):
+                batch = removed_addresses[start:start + SCORE_CACHE_DELETE_BATCH_SIZE]
+                self._airdrop_db.execute("delete from user_reward_score_cache where airdrop_window_id = %s and address in (" + ",".join(["%s"] * len(batch)) + ")",
+                                         [self._window_id] + batch)
+            self._airdrop_db.commit_transaction()
+        except Exception as e:
+            self._airdrop_db.rollback_transaction()
+            raise e
+        logger.info(f"Incremental run for window {self._window_id}: rescored {len(rescored)} of {len(self._users)} addresses, "
+                    f"wrote {len(changed_rows)} changed rewards")
+
+    def __get_aggregated_snapshots(self):
+        result = self._airdrop_db.execute("select count(*) as aggregated_snapshots from balance_snapshot_window where airdrop_window_id = %s and aggregated = 1", [self._window_id])
+        return result[0]["aggregated_snapshots"]
+
+    # Reads one row per address from the running aggregates when every snapshot of the window
+    # was folded into them, otherwise aggregates the full snapshot history of the window.
+    # Incremental runs first fold the snapshots added since the previous run into the aggregates
+    def __get_rewards_query(self, only_registered):
+        registered_filter = f"address in (select address from user_registrations where airdrop_window_id = {self._window_id})"
+        if self._incremental and not self._dry_run and not fold_window_aggregates(self._airdrop_db, self._window_id):
+            logger.warning(f"Window {self._window_id} has snapshots that are not linked, the incremental run scans all of them")
+        if self._distinct_snapshots > 0 and self.__get_aggregated_snapshots() == self._distinct_snapshots:
+            logger.info(f"Using running snapshot aggregates for window {self._window_id}")
+            rewards_query = "select address, min_total as balance, min_staked as staked, occurrences, " +\
+                            f"min_total < {AGIX_THRESHOLD_IN_COGS} as below_threshold " +\
+                            "from user_balance_snapshot_aggregate " +\
+                            f"where airdrop_window_id = {self._window_id} and max_total >= {AGIX_THRESHOLD_IN_COGS} "
+            if only_registered:
+                rewards_query += f"and {registered_filter} "
+            return rewards_query
+
+        condition = f"total >= {AGIX_THRESHOLD_IN_COGS}"
+        if only_registered:
+            condition += f" and {registered_filter}"
+        return "select address, min(total) as balance, min(staked) as staked, sum(occurrences) as occurrences, " +\
+               "0 as below_threshold " +\
+               f"from {window_snapshot_rows(self._window_id, condition)} " +\
+               "group by address "
+
     # @exception_handler(PROCESSOR_CONFIG=MATTERMOST_CONFIG, logger=logger)
     def process_rewards(self, only_registered):
         if only_registered:
             self.__send_slack_message(f"Computing final rewards for window {self._window_id}")
-            rewards_query = "select address, min(total) as balance, min(staked) as staked, count(*) as occurrences " +\
-                            "from user_balance_snapshot " +\
-                            f"where airdrop_window_id = {self._window_id} and total >= {AGIX_THRESHOLD_IN_COGS} " +\
-                            f"and address in (select address from user_registrations where airdrop_window_id = {self._window_id}) " +\
-                            "group by address "
-        else:            
-            rewards_query = "select address, min(total) as balance, min(staked) as staked, count(*) as occurrences " +\
-                            "from user_balance_snapshot " +\
-                            f"where airdrop_window_id = {self._window_id} and total >= {AGIX_THRESHOLD_IN_COGS} " +\
-                            "group by address "
-        
-        sum_of_log_values = 0
+        rewards_query = self.__get_rewards_query(only_registered)
+
         user_balances = self._airdrop_db.execute(rewards_query)
-        for user_balance in user_balances:
-            u = UserRewardObject(user_balance["address"], user_balance["balance"], user_balance["staked"])
-            self._all_users.append(u)
-            if user_balance["occurrences"] < self._distinct_snapshots:
+        balances = np.array([int(row["balance"]) for row in user_balances], dtype=object)
+        staked = np.array([int(row["staked"]) for row in user_balances], dtype=object)
+        eligible = np.array([not row["below_threshold"] and row["occurrences"] >= self._distinct_snapshots
+                             for row in user_balances], dtype=bool)
+        vectorized = self._vectorized_scoring and can_vectorize(balances, staked, TOKENS_ALLOCATED_PER_WINDOW * NUNET_DECIMALS)
+        if vectorized:
+            score_micro, log10_micro = score_holders(balances.astype(np.int64), staked.astype(np.int64))
+            # Python ints for the users, the arrays stay in use for the sum and the allocation
+            holder_scores = zip(score_micro.tolist(), log10_micro.tolist())
+
+        score_cache = self.__get_score_cache() if self._incremental else {}
+        rescored = []
+        sum_of_log_values = 0
+        rewarded_users = 0
+        for index, user_balance in enumerate(user_balances):
+            cached = score_cache.get(user_balance["address"])
+            unchanged = cached is not None and cached[:2] == (int(user_balance["balance"]), int(user_balance["staked"]))
+            if vectorized:
+                u = UserRewardObject.from_micro_scores(user_balance["address"], user_balance["balance"],
+                                                       user_balance["staked"], *next(holder_scores))
+            elif unchanged:
+                u = UserRewardObject.from_scores(user_balance["address"], user_balance["balance"], user_balance["staked"],
+                                                 cached[2], cached[3])
+            else:
+                u = UserRewardObject(user_balance["address"], user_balance["balance"], user_balance["staked"])
+            if self._incremental and not unchanged:
+                rescored.append((self._window_id, user_balance["address"], user_balance["balance"], user_balance["staked"],
+                                 getattr(u, "_score"), getattr(u, "_log10_score")))
+            self._users.append(u)
+            if user_balance["below_threshold"]:
+                u.set_comment(f"User balance fell below the threshold in some of the {self._distinct_snapshots} snapshots and hence ignored")
+            elif user_balance["occurrences"] < self._distinct_snapshots:
                 u.set_comment(f"User appeared only in {user_balance['occurrences']} out of {self._distinct_snapshots} snapshots and hence ignored")
             else:
-                self._users_to_reward.append(u)
-                sum_of_log_values += getattr(u,"_log10_score")
+                u.set_rewarded(True)
+                rewarded_users += 1
+                if not vectorized:
+                    sum_of_log_values += getattr(u,"_log10_score")
+        if vectorized:
+            sum_of_log_values = micro_to_decimal(log10_micro[eligible].sum())
         
-        score_message = f"For window {self._window_id}, Normalized Score is {sum_of_log_values} for {len(self._users_to_reward)}. Skipped users {len(self._users_to_reward) - len(self._users_to_reward)}"
+        score_message = f"For window {self._window_id}, Normalized Score is {sum_of_log_values} for {rewarded_users}. Skipped users {len(self._users) - rewarded_users}"
         logger.info(score_message)
         self.__send_slack_message(score_message)
         try:
             total_pending_rewards, user_pending_rewards_map = self.__process_pending_rewards()
             tokens_to_distribute = (TOKENS_ALLOCATED_PER_WINDOW * NUNET_DECIMALS) - total_pending_rewards
             logger.info(f"For window {self._window_id} tokens to distribute are {tokens_to_distribute}")
-            self._airdrop_db.begin_transaction()
-            self.__reset_user_rewards()
+            eligible_rewards = None
+            staging = None
+            if vectorized and can_vectorize(balances, staked, tokens_to_distribute):
+                rewards, _ = allocate_rewards(log10_micro, eligible, tokens_to_distribute)
+                eligible_rewards = rewards[eligible]
+            proposed_rewards = {}
+            if self._dry_run:
+                logger.info(f"Dry run for window {self._window_id}, rewards will not be written")
+            elif self._staged_publish:
+                staging = RewardStaging(self._airdrop_db, self._airdrop_id, self._window_id, self._snapshot_guid).open()
+            elif not self._incremental:
+                self._airdrop_db.begin_transaction()
+                self.__reset_user_rewards()
 
-            for user in self._users_to_reward:
-                reward = Decimal(math.floor(getattr(user, "_log10_score") / sum_of_log_values * tokens_to_distribute))
+            for index, user in enumerate(user for user in self._users if getattr(user, "_rewarded")):
+                if eligible_rewards is not None:
+                    reward = Decimal(int(eligible_rewards[index]))
+                else:
+                    reward = Decimal(math.floor(getattr(user, "_log10_score") / sum_of_log_values * tokens_to_distribute))
                 user_address = getattr(user, "_address").lower()
                 if user_address in user_pending_rewards_map:
                     logger.info(f"Adding additional {user_pending_rewards_map[user_address]} tokens to user {user_address} who had {reward}")
                     reward += user_pending_rewards_map[user_address]
+                    self._adjusted_addresses.add(getattr(user, "_address"))
                 user.set_reward(reward)
                 #logger.info(f"Reward for {getattr(user,'_address')} is {reward} {getattr(user, '_score')} {getattr(user, '_log10_score')} ")
-                self.__batch_insert(self.__get_reward_values(user), False)
+                if self._dry_run or self._incremental:
+                    proposed_rewards[getattr(user, "_address")] = reward
+                elif self._staged_publish:
+                    staging.add_reward(getattr(user, "_address"), reward, getattr(user, "_score"), getattr(user, "_log10_score"))
+                else:
+                    self.__batch_insert(self.__get_reward_values(user), False)
 
-            for user in self._all_users:
-                self.__batch_insert(self.__get_audit_values(user), True)
-            
-            self.__batch_insert([], False, True)
-            self.__batch_insert([], True, True)
-            self._airdrop_db.commit_transaction()
+            if self._dry_run:
+                diff = diff_rewards(load_window_rewards(self._airdrop_db, self._window_id), proposed_rewards)
+                log_reward_diff(self._window_id, diff)
+                return diff
+            if self._incremental:
+                self.__write_changed_rewards(proposed_rewards, rescored, score_cache)
+                UserClaimableBalanceRepository().refresh_window(self._window_id)
+                self.__send_slack_message(f"Successfully completed updating rewards for window {self._window_id}", only_registered)
+                return
+
+            audit_rows, artifact_parts = self.__get_audit_rows(self._users, staging.run_guid if staging else None)
+            if self._staged_publish:
+                # The audit is published with the rewards, in the same transaction
+                for audit_row in audit_rows:
+                    staging.add_audit(audit_row)
+                staging.add_audit_artifact(artifact_parts)
+                staging.publish()
+            else:
+                for audit_row in audit_rows:
+                    self.__batch_insert(audit_row, True)
+                self.__insert_audit_artifact(artifact_parts)
+
+                self.__batch_insert([], False, True)
+                self.__batch_insert([], True, True)
+                self._airdrop_db.commit_transaction()
             self.__send_slack_message(f"Successfully completed updating rewards for window {self._window_id}", only_registered)
         except Exception as e:
             logger.error(e)
-            self._airdrop_db.rollback_transaction()
+            if staging is not None:
+                staging.discard()
+            elif not (self._staged_publish or self._dry_run or self._incremental):
+                self._airdrop_db.rollback_transaction()
             raise(e)
+        # Outside the try, a failed refresh must not discard the published run
+        UserClaimableBalanceRepository().refresh_window(self._window_id)
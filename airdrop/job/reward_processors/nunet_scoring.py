@@ -0,0 +1,113 @@
+import math
+
+import numpy as np
+from decimal import Decimal
+
+SCORE_DENOMINATOR = Decimal(100000)
+AGIX_DECIMALS = Decimal(100000000)
+STAKE_WEIGHT = Decimal(0.2)
+
+# score * 10^6 = (balance + 0.2 * staked) / 10^7 = (5 * balance + staked) / (5 * 10^7), balances in cogs
+SCORE_MICRO_DIVISOR = 50000000
+MICRO = 1000000
+# Balances above this could overflow int64 in 5 * balance + staked
+MAX_VECTORIZED_COGS = 10 ** 18
+# Keeps log10 * tokens - share * sum exact in wrapping int64 arithmetic
+MAX_VECTORIZED_TOKENS = 10 ** 15
+# Fractions closer than this to a rounding boundary are recomputed with the Decimal formulas
+BOUNDARY_TOLERANCE = 1e-6
+ALLOCATION_TOLERANCE = 10 ** 12
+
+
+def decimal_score(balance, staked):
+    """
+    Reference Decimal scoring used by UserRewardObject. Returns the balance and stake
+    in AGIX with the score and log10 score, both rounded to 6 decimals.
+    """
+    balance = Decimal(balance) / AGIX_DECIMALS
+    staked = Decimal(staked) / AGIX_DECIMALS
+    score = round((balance + (STAKE_WEIGHT * staked)) / SCORE_DENOMINATOR, 6)
+    log10_score = round(Decimal(math.log10(score + 1)), 6)
+    return balance, staked, score, log10_score
+
+
+def decimal_reward(log10_score, sum_of_log_values, tokens_to_distribute):
+    return Decimal(math.floor(log10_score / sum_of_log_values * tokens_to_distribute))
+
+
+def can_vectorize(balances, staked, tokens_to_distribute):
+    if tokens_to_distribute != int(tokens_to_distribute) or not 0 <= tokens_to_distribute < MAX_VECTORIZED_TOKENS:
+        return False
+    return len(balances) == 0 or (int(np.max(balances)) < MAX_VECTORIZED_COGS and
+                                  int(np.max(staked)) < MAX_VECTORIZED_COGS and
+                                  int(np.min(balances)) >= 0 and int(np.min(staked)) >= 0)
+
+
+def score_holders(balances, staked):
+    """
+    Vectorized equivalent of decimal_score for int64 arrays of balances and stakes in
+    cogs. Returns int64 arrays of score and log10 score in millionths. The few values
+    that fall on a rounding boundary, where float rounding or the binary value of
+    Decimal(0.2) could tip the result, are recomputed with decimal_score.
+    """
+    balances = np.asarray(balances, dtype=np.int64)
+    staked = np.asarray(staked, dtype=np.int64)
+
+    quotient, remainder = np.divmod(5 * balances + staked, SCORE_MICRO_DIVISOR)
+    half = SCORE_MICRO_DIVISOR // 2
+    score_micro = quotient + (remainder > half)
+    ambiguous = np.abs(remainder - half) <= 1 + staked // 10 ** 15
+
+    scaled_log = np.log10((score_micro + MICRO).astype(np.float64) / MICRO) * MICRO
+    log10_micro = np.rint(scaled_log).astype(np.int64)
+    ambiguous |= np.abs(scaled_log - np.floor(scaled_log) - 0.5) < BOUNDARY_TOLERANCE
+
+    for index in np.flatnonzero(ambiguous):
+        _, _, score, log10_score = decimal_score(int(balances[index]), int(staked[index]))
+        score_micro[index] = int(score * MICRO)
+        log10_micro[index] = int(log10_score * MICRO)
+    return score_micro, log10_micro
+
+
+def allocate_rewards(log10_micro, eligible, tokens_to_distribute):
+    """
+    Splits an integer number of tokens across the eligible holders in proportion to their
+    log10 score, flooring every share like decimal_reward. Shares are estimated in float64
+    and then corrected exactly: the remainder log10 * tokens - share * sum is computed with
+    wrapping int64 arithmetic, which is exact because the true remainder is small. Shares
+    within 1e-12 of an integer, where the 28 digit Decimal arithmetic could round to the
+    other side, use decimal_reward.
+    """
+    log10_micro = np.asarray(log10_micro, dtype=np.int64)
+    eligible = np.asarray(eligible, dtype=bool)
+    rewards = np.zeros(len(log10_micro), dtype=np.int64)
+    sum_of_log_micro = int(log10_micro[eligible].sum())
+    if sum_of_log_micro == 0:
+        return rewards, sum_of_log_micro
+
+    tokens_to_distribute = int(tokens_to_distribute)
+    eligible_log = log10_micro[eligible]
+    shares = np.floor(eligible_log * (tokens_to_distribute / sum_of_log_micro)).astype(np.int64)
+    with np.errstate(over="ignore"):
+        remainders = eligible_log * np.int64(tokens_to_distribute) - shares * np.int64(sum_of_log_micro)
+    while True:
+        low = remainders < 0
+        high = remainders >= sum_of_log_micro
+        if not (low.any() or high.any()):
+            break
+        shares += high.astype(np.int64) - low.astype(np.int64)
+        remainders += (low.astype(np.int64) - high.astype(np.int64)) * sum_of_log_micro
+
+    fraction = remainders / sum_of_log_micro
+    near_integer = (fraction < 1 / ALLOCATION_TOLERANCE) | (fraction > 1 - 1 / ALLOCATION_TOLERANCE)
+    if near_integer.any():
+        sum_of_log_values = Decimal(sum_of_log_micro) / MICRO
+        for index in np.flatnonzero(near_integer):
+            shares[index] = int(decimal_reward(Decimal(int(eligible_log[index])) / MICRO, sum_of_log_values,
+                                               Decimal(tokens_to_distribute)))
+    rewards[eligible] = shares
+    return rewards, sum_of_log_micro
+
+
+def micro_to_decimal(value):
+    return Decimal(int(value)).scaleb(-6)
@@ -5,7 +5,9 @@ from airdrop.application.services.airdrop_services import AirdropServices
 from airdrop.processor.rejuve_airdrop import RejuveAirdrop
 from airdrop.infrastructure.repositories.airdrop_repository import AirdropRepository
 from airdrop.infrastructure.repositories.airdrop_window_repository import AirdropWindowRepository
+from airdrop.infrastructure.repositories.user_claimable_balance_repository import UserClaimableBalanceRepository
 from airdrop.infrastructure.repositories.user_reward_repository import UserRewardRepository
+from airdrop.job.reward_diff import diff_rewards, log_reward_diff
 from common.logger import get_logger
 
 logger = get_logger(__name__)
@@ -17,17 +19,19 @@ class RejuveRewardProcessor:
     REWARD_SCORE_DENOM = Decimal("100_000")
     TOKEN_DECIMALS = 6
 
-    def __init__(self, airdrop_id: int, airdrop_window_id: int, snapshot_guid: str):
+    def __init__(self, airdrop_id: int, airdrop_window_id: int, snapshot_guid: str, dry_run: bool = False):
         logger.info(f"Init Rejuve Rewards Processor for airdrop_id={airdrop_id}, "
                     f"airdrop_window_id={airdrop_window_id}, snapshot_guid={snapshot_guid}")
 
         self.airdrop_id = airdrop_id
         self.airdrop_window_id = airdrop_window_id
         self.snapshot_guid = snapshot_guid
+        self.dry_run = dry_run
 
         self.airdrop_repository = AirdropRepository()
         self.airdrop_window_repository = AirdropWindowRepository()
         self.user_reward_repository = UserRewardRepository()
+        self.user_claimable_balance_repository = UserClaimableBalanceRepository()
 
         try:
 
@@ -74,74 +78,79 @@ class RejuveRewardProcessor:
             score, normalized_score = self.calculate_score(row.balance, row.staked)
             address_score[row.address] = (score, normalized_score)
             total_score += normalized_score
-            logger.info(f"[{index+1}/{amount}] Ethereum address {row.address} with balance={row.balance} and "
-                        f"stake={row.staked}, calculated normalized score = {normalized_score}")
+            logger.debug(f"[{index+1}/{amount}] Ethereum address {row.address} with balance={row.balance} and "
+                         f"stake={row.staked}, calculated normalized score = {normalized_score}")
+        logger.info(f"Scored {amount} Ethereum addresses")
 
-        cardano_byron_addresses = self.user_reward_repository.get_cardano_registrations(
-            airdrop_window_id=self.airdrop_window_id,
-            address_era=CardanoEra.BYRON
-        )
-        amount = len(cardano_byron_addresses)
-        for index, row in enumerate(cardano_byron_addresses):
-            total_balance = Decimal(0)
-            total_stake = Decimal(0)
-            snapshot_balances = self.user_reward_repository.get_cardano_balances(
-                address=row.address,
+        for address_era in (CardanoEra.BYRON, CardanoEra.SHELLEY):
+            registrations = self.user_reward_repository.get_cardano_registrations(
+                airdrop_window_id=self.airdrop_window_id,
+                address_era=address_era
+            )
+            balances = {row.address: row for row in self.user_reward_repository.get_cardano_registrations_balances(
+                airdrop_window_id=self.airdrop_window_id,
+                address_era=address_era,
                 snapshot_window_id=self.airdrop_first_window_id,
-                snapshot_guid=self.snapshot_guid)
-            for balance in snapshot_balances:
-                total_balance += balance.balance
-                total_stake += balance.staked
-            score, normalized_score = self.calculate_score(total_balance, total_stake)
-            address_score[row.address] = (score, normalized_score)
-            total_score += normalized_score
-            logger.info(f"[{index+1}/{amount}] Cardano Byron address {row.address} and {len(snapshot_balances)} "
-                        f"related addresses with total balance={total_balance} and stake={total_stake}, "
-                        f"calculated normalized score = {normalized_score}")
+                snapshot_guid=self.snapshot_guid,
+                registration_parts=self.__decode_registration_parts(registrations)
+                if address_era == CardanoEra.SHELLEY else None)}
+            amount = len(registrations)
+            for index, row in enumerate(registrations):
+                balance = balances.get(row.address)
+                total_balance = balance.balance if balance else Decimal(0)
+                total_stake = balance.staked if balance else Decimal(0)
+                related_addresses = balance.related_addresses if balance else 0
+                score, normalized_score = self.calculate_score(total_balance, total_stake)
+                address_score[row.address] = (score, normalized_score)
+                total_score += normalized_score
+                logger.debug(f"[{index + 1}/{amount}] Cardano {address_era.name.capitalize()} address {row.address} "
+                             f"and {related_addresses} related addresses with total balance={total_balance} and "
+                             f"stake={total_stake}, calculated normalized score = {normalized_score}")
+            logger.info(f"Scored {amount} Cardano {address_era.name.capitalize()} addresses, "
+                        f"{len(balances)} with snapshot balances")
 
-        cardano_shelley_addresses = self.user_reward_repository.get_cardano_registrations(
-            airdrop_window_id=self.airdrop_window_id,
-            address_era=CardanoEra.SHELLEY
-        )
-        amount = len(cardano_shelley_addresses)
-        for index, row in enumerate(cardano_shelley_addresses):
-            total_balance = Decimal(0)
-            total_stake = Decimal(0)
-            address_obj = pycardano.Address.decode(row.address)
+        user_rewards = []
+        for address, (score, normalized_score) in address_score.items():
+            user_rewards.append({
+                "airdrop_id": self.airdrop_id,
+                "airdrop_window_id": self.airdrop_window_id,
+                "address": address,
+                "condition": None,
+                "rewards_awarded": self.calculate_reward(normalized_score, total_score),
+                "score": score,
+                "normalized_score": normalized_score
+            })
+        if self.dry_run:
+            diff = diff_rewards(self.user_reward_repository.get_window_rewards(self.airdrop_window_id),
+                                {item["address"]: item["rewards_awarded"] for item in user_rewards},
+                                replaces_window=False)
+            log_reward_diff(self.airdrop_window_id, diff)
+            return diff
+        saved = self.user_reward_repository.upsert_user_rewards(user_rewards)
+        logger.info(f"Saved rewards of {saved} addresses for airdrop_window_id={self.airdrop_window_id}")
+        self.user_claimable_balance_repository.refresh_window(self.airdrop_window_id)
+
+    @staticmethod
+    def __decode_registration_parts(registrations) -> dict:
+        # Shelley registrations are matched to snapshot rows on their payment and staking
+        # parts in SQL, the parts of older registrations stored without them are decoded here
+        parts = {}
+        for row in registrations:
+            if row.payment_part or row.staking_part:
+                continue
+            try:
+                address_obj = pycardano.Address.decode(row.address)
+            except Exception as e:
+                logger.warning(f"Unable to decode Cardano address {row.address}, it will be matched by address "
+                               f"only: {repr(e)}")
+                continue
             payment_part = str(address_obj.payment_part) if address_obj.payment_part else None
             staking_part = str(address_obj.staking_part) if address_obj.staking_part else None
-            snapshot_balances = self.user_reward_repository.get_cardano_balances(
-                address=row.address,
-                payment_part=payment_part,
-                staking_part=staking_part,
-                snapshot_window_id=self.airdrop_first_window_id,
-                snapshot_guid=self.snapshot_guid)
-            for balance in snapshot_balances:
-                total_balance += balance.balance
-                total_stake += balance.staked
-            score, normalized_score = self.calculate_score(total_balance, total_stake)
-            address_score[row.address] = (score, normalized_score)
-            total_score += normalized_score
-            logger.info(f"[{index + 1}/{amount}] Cardano Shelley address {row.address} and {len(snapshot_balances)} "
-                        f"related addresses with total balance={total_balance} and stake={total_stake}, "
-                        f"calculated normalized score = {normalized_score}")
-
-        user_rewards = []
-        for key, value in address_score.items():
-            address = key
-            score, normalized_score = value
-            reward = self.calculate_reward(normalized_score, total_score)
-            user_reward = self.user_reward_repository.create_user_reward(
-                airdrop_id=self.airdrop_id,
-                airdrop_window_id=self.airdrop_window_id,
-                address=address,
-                condition=None,
-                rewards_awarded=reward,
-                score=score,
-                normalized_score=normalized_score
-            )
-            user_rewards.append(user_reward)
-        self.user_reward_repository.add_all_items(user_rewards)  # TODO: batching
+            if payment_part or staking_part:
+                parts[row.address] = (payment_part, staking_part)
+        if parts:
+            logger.info(f"Decoded payment and staking parts of {len(parts)} Cardano Shelley registrations")
+        return parts
 
     def calculate_score(self, balance: Decimal, stake: Decimal) -> tuple[Decimal, Decimal]:
         score = (balance + self.REWARD_STAKE_RATIO * stake) / self.REWARD_SCORE_DENOM
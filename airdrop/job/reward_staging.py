@@ -0,0 +1,205 @@
+import uuid
+
+from airdrop.constants import RewardRunStatus
+from airdrop.infrastructure.repositories.user_claimable_balance_repository import UserClaimableBalanceRepository
+from common.logger import get_logger
+
+logger = get_logger(__name__)
+
+STAGING_BUFFER_SIZE = 10000
+# Staged rows of this many latest runs per window are kept so a window can be rolled back
+RUNS_TO_KEEP = 3
+
+
+def publish_run(airdrop_db, run_guid, window_id):
+    """
+    Replaces the rewards of a window in user_rewards with the staged rewards of a run.
+    Addresses missing from the run are reset to zero, as a full reprocessing would do.
+    Must run inside a transaction so readers see either the previous or the new rewards.
+    """
+    airdrop_db.execute(
+        "update user_rewards set rewards_awarded = 0, score = 0, normalized_score = 0, row_updated = current_timestamp " +
+        "where airdrop_window_id = %s and (rewards_awarded <> 0 or score <> 0 or normalized_score <> 0) and " +
+        "not exists (select 1 from user_rewards_staging as staged " +
+        "where staged.run_guid = %s and staged.address = user_rewards.address)",
+        [window_id, run_guid])
+    result = airdrop_db.execute(
+        "insert into user_rewards (airdrop_id, airdrop_window_id, address, rewards_awarded, score, normalized_score, " +
+        "row_created, row_updated) " +
+        "select airdrop_id, airdrop_window_id, address, rewards_awarded, score, normalized_score, " +
+        "current_timestamp, current_timestamp from user_rewards_staging where run_guid = %s " +
+        "on duplicate key update rewards_awarded = values(rewards_awarded), score = values(score), " +
+        "normalized_score = values(normalized_score), row_updated = current_timestamp",
+        [run_guid])
+    return result[0]
+
+
+def publish_run_audit(airdrop_db, run_guid):
+    """
+    Moves the staged audit of a run to user_rewards_audit, inside the publishing transaction
+    so the audit is written if and only if the rewards of the run are published.
+    """
+    result = airdrop_db.execute(
+        "insert into user_rewards_audit (airdrop_id, airdrop_window_id, snapshot_guid, address, balance, staked, " +
+        "score, normalized_score, rewards_awarded, comment, row_created, row_updated) " +
+        "select airdrop_id, airdrop_window_id, snapshot_guid, address, balance, staked, score, normalized_score, " +
+        "rewards_awarded, comment, current_timestamp, current_timestamp from user_rewards_audit_staging " +
+        "where run_guid = %s",
+        [run_guid])
+    airdrop_db.execute("delete from user_rewards_audit_staging where run_guid = %s", [run_guid])
+    return result[0]
+
+
+class RewardStaging:
+    """
+    Writes the rewards of one processing run of a window to user_rewards_staging and
+    publishes them to user_rewards with a single set-based merge in a short transaction,
+    so readers of user_rewards never see a half-written window. The staged rows of the
+    latest runs are kept and rollback_window publishes the previous run again.
+    The audit of the run is staged in user_rewards_audit_staging, and its artifact parts
+    kept in memory, until they are written in the same transaction as the rewards.
+    Only the Nunet processor stages its runs, Rejuve and Loyalty rewards are upserted directly.
+    """
+
+    def __init__(self, airdrop_db, airdrop_id, window_id, snapshot_guid=None, buffer_size=STAGING_BUFFER_SIZE):
+        self._airdrop_db = airdrop_db
+        self._airdrop_id = airdrop_id
+        self._window_id = window_id
+        self._snapshot_guid = snapshot_guid
+        self._buffer_size = buffer_size
+        self._run_guid = str(uuid.uuid4())
+        self._rows = []
+        self._rows_staged = 0
+        self._audit_rows = []
+        self._artifact_parts = []
+
+    @property
+    def run_guid(self):
+        return self._run_guid
+
+    def open(self):
+        self._airdrop_db.execute(
+            "insert into user_rewards_run (run_guid, airdrop_id, airdrop_window_id, snapshot_guid, status, " +
+            "row_created, row_updated) values (%s, %s, %s, %s, %s, current_timestamp, current_timestamp)",
+            [self._run_guid, self._airdrop_id, self._window_id, self._snapshot_guid, RewardRunStatus.STAGED.value])
+        logger.info(f"Staging rewards of window {self._window_id} in run {self._run_guid}")
+        return self
+
+    def add_reward(self, address, rewards_awarded, score, normalized_score):
+        self._rows.append((self._run_guid, self._airdrop_id, self._window_id, address, rewards_awarded, score,
+                           normalized_score))
+        if len(self._rows) >= self._buffer_size:
+            self.flush()
+
+    def add_audit(self, audit_values):
+        # Values in the column order of user_rewards_audit, from airdrop_id to comment
+        self._audit_rows.append((self._run_guid, *audit_values))
+        if len(self._audit_rows) >= self._buffer_size:
+            self.flush()
+
+    def add_audit_artifact(self, artifact_parts):
+        self._artifact_parts.extend(artifact_parts)
+
+    def flush(self):
+        if len(self._audit_rows) > 0:
+            self._airdrop_db.bulk_insert(
+                "insert into user_rewards_audit_staging (run_guid, airdrop_id, airdrop_window_id, snapshot_guid, " +
+                "address, balance, staked, score, normalized_score, rewards_awarded, comment, row_created, " +
+                "row_updated) values ",
+                "(%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,current_timestamp,current_timestamp)",
+                self._audit_rows)
+            self._audit_rows.clear()
+        if len(self._rows) == 0:
+            return
+        self._airdrop_db.bulk_insert(
+            "insert into user_rewards_staging (run_guid, airdrop_id, airdrop_window_id, address, rewards_awarded, " +
+            "score, normalized_score, row_created, row_updated) values ",
+            "(%s,%s,%s,%s,%s,%s,%s,current_timestamp,current_timestamp)",
+            self._rows)
+        self._rows_staged += len(self._rows)
+        self._rows.clear()
+
+    def publish(self):
+        self.flush()
+        try:
+            self._airdrop_db.begin_transaction()
+            self._airdrop_db.execute(
+                "update user_rewards_run set status = %s, row_updated = current_timestamp " +
+                "where airdrop_window_id = %s and status = %s",
+                [RewardRunStatus.SUPERSEDED.value, self._window_id, RewardRunStatus.PUBLISHED.value])
+            publish_run(self._airdrop_db, self._run_guid, self._window_id)
+            publish_run_audit(self._airdrop_db, self._run_guid)
+            if len(self._artifact_parts) > 0:
+                self._airdrop_db.bulk_insert(
+                    "insert into user_rewards_audit_artifact (airdrop_id, airdrop_window_id, snapshot_guid, run_guid, " +
+                    "part, row_count, format, payload, row_created, row_updated) values ",
+                    "(%s,%s,%s,%s,%s,%s,%s,%s,current_timestamp,current_timestamp)",
+                    self._artifact_parts)
+            self._airdrop_db.execute(
+                "update user_rewards_run set status = %s, rewarded_users = %s, published_at = current_timestamp, " +
+                "row_updated = current_timestamp where run_guid = %s",
+                [RewardRunStatus.PUBLISHED.value, self._rows_staged, self._run_guid])
+            self._airdrop_db.commit_transaction()
+        except Exception as e:
+            self._airdrop_db.rollback_transaction()
+            logger.error(f"Publishing run {self._run_guid} of window {self._window_id} failed, error: {repr(e)}")
+            raise e
+        logger.info(f"Published run {self._run_guid} with rewards of {self._rows_staged} users "
+                    f"for window {self._window_id}")
+        self.__purge_runs()
+        return self._rows_staged
+
+    def discard(self):
+        self._rows.clear()
+        self._audit_rows.clear()
+        self._artifact_parts.clear()
+        self._airdrop_db.execute("delete from user_rewards_staging where run_guid = %s", [self._run_guid])
+        self._airdrop_db.execute("delete from user_rewards_audit_staging where run_guid = %s", [self._run_guid])
+        self._airdrop_db.execute(
+            "update user_rewards_run set status = %s, row_updated = current_timestamp where run_guid = %s",
+            [RewardRunStatus.FAILED.value, self._run_guid])
+        logger.info(f"Discarded run {self._run_guid} of window {self._window_id}")
+
+    def __purge_runs(self):
+        # Staged rows are only needed for the published run and the runs it may be rolled back to
+        runs = self._airdrop_db.execute(
+            "select run_guid from user_rewards_run where airdrop_window_id = %s and status in (%s, %s) " +
+            "order by published_at desc, row_id desc",
+            [self._window_id, RewardRunStatus.PUBLISHED.value, RewardRunStatus.SUPERSEDED.value])
+        kept = [run["run_guid"] for run in runs[:RUNS_TO_KEEP]]
+        self._airdrop_db.execute(
+            "delete from user_rewards_staging where run_guid in (select run_guid from user_rewards_run " +
+            "where airdrop_window_id = %s and status in (%s, %s) " +
+            "and run_guid not in (" + ",".join(["%s"] * len(kept)) + "))",
+            [self._window_id, RewardRunStatus.SUPERSEDED.value, RewardRunStatus.ROLLED_BACK.value] + kept)
+
+    @staticmethod
+    def rollback_window(airdrop_db, window_id):
+        """
+        Publishes again the run that was published before the current one and marks the
+        current run as rolled back. Returns the guid of the restored run.
+        """
+        runs = airdrop_db.execute(
+            "select run_guid, status from user_rewards_run where airdrop_window_id = %s and status in (%s, %s) " +
+            "order by published_at desc, row_id desc limit 2",
+            [window_id, RewardRunStatus.PUBLISHED.value, RewardRunStatus.SUPERSEDED.value])
+        if len(runs) < 2 or runs[0]["status"] != RewardRunStatus.PUBLISHED.value:
+            raise Exception(f"No previous reward run to roll back to for window {window_id}")
+        current_run, previous_run = runs[0]["run_guid"], runs[1]["run_guid"]
+        try:
+            airdrop_db.begin_transaction()
+            publish_run(airdrop_db, previous_run, window_id)
+            airdrop_db.execute(
+                "update user_rewards_run set status = %s, row_updated = current_timestamp where run_guid = %s",
+                [RewardRunStatus.ROLLED_BACK.value, current_run])
+            airdrop_db.execute(
+                "update user_rewards_run set status = %s, row_updated = current_timestamp where run_guid = %s",
+                [RewardRunStatus.PUBLISHED.value, previous_run])
+            airdrop_db.commit_transaction()
+        except Exception as e:
+            airdrop_db.rollback_transaction()
+            logger.error(f"Rolling back window {window_id} to run {previous_run} failed, error: {repr(e)}")
+            raise e
+        logger.info(f"Window {window_id} rolled back from run {current_run} to run {previous_run}")
+        UserClaimableBalanceRepository().refresh_window(window_id)
+        return previous_run
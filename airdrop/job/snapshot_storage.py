@@ -0,0 +1,95 @@
+# Snapshot rows of a window can live in four layouts: the legacy per-window rows of
+# user_balance_snapshot, the shared rows of balance_snapshot linked to windows through
+# balance_snapshot_window, the delta rows of user_balance_snapshot_delta and the
+# balance intervals of user_balance_history. These helpers let raw SQL readers see all
+# of them as full logical snapshots.
+
+SNAPSHOT_COLUMNS = "address, payment_part, staking_part, balance, staked, total, snapshot_guid"
+
+
+def window_snapshot_rows(window_id, condition=None, alias="window_snapshot"):
+    """
+    Derived table with the snapshot rows of a window from all layouts. Each row carries
+    the number of snapshots it stands for in `occurrences`: 1 for full snapshot rows and
+    the number of consecutive snapshots a delta row or history interval stands for. The optional
+    condition is applied inside each branch, so indexes on window and snapshot are used.
+    """
+    window_id = int(window_id)
+    where = f" and {condition}" if condition else ""
+    return f"(select {SNAPSHOT_COLUMNS}, 1 as occurrences from user_balance_snapshot " + \
+           f"where airdrop_window_id = {window_id}{where} " + \
+           "union all " + \
+           f"select {SNAPSHOT_COLUMNS}, 1 as occurrences from balance_snapshot " + \
+           "join balance_snapshot_window using (snapshot_guid) " + \
+           f"where balance_snapshot_window.airdrop_window_id = {window_id}{where} " + \
+           "union all " + \
+           f"select {SNAPSHOT_COLUMNS}, occurrences from {delta_snapshot_intervals(window_id)} " + \
+           f"where is_removed = 0{where} " + \
+           "union all " + \
+           f"select {SNAPSHOT_COLUMNS}, occurrences from {history_snapshot_intervals(window_id)} " + \
+           f"where 1 = 1{where}) as {alias}"
+
+
+def window_snapshot_guids(window_id):
+    window_id = int(window_id)
+    return "(select distinct snapshot_guid from user_balance_snapshot " + \
+           f"where airdrop_window_id = {window_id} " + \
+           "union " + \
+           "select snapshot_guid from balance_snapshot_window " + \
+           f"where airdrop_window_id = {window_id}) as window_snapshot_guid"
+
+
+def delta_snapshot_intervals(window_id, alias="delta_interval"):
+    """
+    Delta rows of a window, each with the number of snapshots it stays valid for:
+    up to the next delta row of the same address, or up to the latest snapshot.
+    """
+    window_id = int(window_id)
+    return f"(select {SNAPSHOT_COLUMNS}, is_removed, " + \
+           "coalesce(lead(snapshot_seq) over (partition by address order by snapshot_seq), latest_seq + 1) " + \
+           "- snapshot_seq as occurrences " + \
+           "from user_balance_snapshot_delta, " + \
+           "(select coalesce(max(snapshot_seq), 0) as latest_seq from balance_snapshot_window " + \
+           f"where airdrop_window_id = {window_id}) as latest " + \
+           f"where airdrop_window_id = {window_id}) as {alias}"
+
+
+def delta_snapshot_at(window_id, snapshot_seq, alias="delta_snapshot"):
+    """
+    Reconstructs the full logical snapshot number `snapshot_seq` of a window from its
+    delta rows: the latest row of every address up to that snapshot, unless removed.
+    """
+    window_id = int(window_id)
+    snapshot_seq = int(snapshot_seq)
+    return "(select address, payment_part, staking_part, balance, staked, total from (" + \
+           "select address, payment_part, staking_part, balance, staked, total, is_removed, " + \
+           "row_number() over (partition by address order by snapshot_seq desc) as version " + \
+           "from user_balance_snapshot_delta " + \
+           f"where airdrop_window_id = {window_id} and snapshot_seq <= {snapshot_seq}) as delta_version " + \
+           f"where version = 1 and is_removed = 0) as {alias}"
+
+
+def history_snapshot_intervals(window_id, alias="history_interval"):
+    """
+    Balance intervals of a window from user_balance_history with the number of
+    snapshots each covers; open intervals run up to the latest snapshot.
+    """
+    window_id = int(window_id)
+    return f"(select {SNAPSHOT_COLUMNS}, " + \
+           "coalesce(valid_to_snapshot, latest_seq) - valid_from_snapshot + 1 as occurrences " + \
+           "from user_balance_history, " + \
+           "(select coalesce(max(snapshot_seq), 0) as latest_seq from balance_snapshot_window " + \
+           f"where airdrop_window_id = {window_id}) as latest " + \
+           f"where airdrop_window_id = {window_id}) as {alias}"
+
+
+def history_snapshot_at(window_id, snapshot_seq, alias="history_snapshot"):
+    """
+    Reconstructs the full logical snapshot number `snapshot_seq` of a window from its
+    balance intervals: the interval of every address that covers that snapshot.
+    """
+    window_id = int(window_id)
+    snapshot_seq = int(snapshot_seq)
+    return "(select address, payment_part, staking_part, balance, staked, total from user_balance_history " + \
+           f"where airdrop_window_id = {window_id} and valid_from_snapshot <= {snapshot_seq} " + \
+           f"and (valid_to_snapshot is null or valid_to_snapshot >= {snapshot_seq})) as {alias}"
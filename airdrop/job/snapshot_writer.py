@@ -0,0 +1,299 @@
+import time
+
+from airdrop.constants import SnapshotStorage
+from airdrop.job.snapshot_storage import delta_snapshot_at, history_snapshot_at, window_snapshot_guids
+from common.logger import get_logger
+
+logger = get_logger(__name__)
+
+SNAPSHOT_BUFFER_SIZE = 10000
+
+
+def check_window_storage(airdrop_db, window_ids, storage):
+    """
+    Raises if a window already holds snapshots written in another storage layout. The
+    readers add up the rows of all layouts and number snapshots per window, so switching
+    a window between layouts would count its earlier snapshots twice.
+    """
+    for window_id in window_ids:
+        window_id = int(window_id)
+        result = airdrop_db.execute(
+            "select exists(select 1 from user_balance_snapshot where airdrop_window_id = %s) as per_window, " +
+            "exists(select 1 from balance_snapshot_window join balance_snapshot using (snapshot_guid) " +
+            "where balance_snapshot_window.airdrop_window_id = %s) as shared, " +
+            "exists(select 1 from user_balance_snapshot_delta where airdrop_window_id = %s) as delta, " +
+            "exists(select 1 from user_balance_history where airdrop_window_id = %s) as history",
+            [window_id] * 4)
+        other_layouts = [layout for layout in SnapshotStorage if layout != storage and result[0][layout.name.lower()]]
+        if other_layouts:
+            raise Exception(f"Window {window_id} already has {other_layouts[0].value} snapshots, "
+                            f"they cannot be continued with {storage.value} storage")
+
+
+def fold_snapshot_aggregates(airdrop_db, window_id, source, params):
+    # Folds one snapshot of a window, read from the derived table `source` aliased cur,
+    # into the running per-address aggregates of user_balance_snapshot_aggregate
+    airdrop_db.execute(
+        "insert into user_balance_snapshot_aggregate (airdrop_window_id, address, min_total, min_staked, " +
+        "max_total, occurrences, row_created, row_updated) " +
+        f"select %s, cur.address, cur.total, cur.staked, cur.total, 1, current_timestamp, current_timestamp from {source} " +
+        "on duplicate key update min_total = least(min_total, values(min_total)), " +
+        "min_staked = least(min_staked, values(min_staked)), max_total = greatest(max_total, values(max_total)), " +
+        "occurrences = occurrences + 1, row_updated = current_timestamp",
+        [window_id] + params)
+
+
+def fold_window_aggregates(airdrop_db, window_id):
+    """
+    Folds the linked snapshots of a window that are not aggregated yet into its running
+    aggregates, reading each one from whichever layout holds it. Returns whether every
+    snapshot of the window is aggregated; legacy per-window snapshots that were never
+    linked cannot be tracked and leave the window to the full snapshot scan.
+    """
+    linked = airdrop_db.execute(
+        "select snapshot_guid, snapshot_seq, aggregated from balance_snapshot_window where airdrop_window_id = %s " +
+        "order by snapshot_seq, row_id", [window_id])
+    distinct_snapshots = airdrop_db.execute(
+        f"select count(*) as distinct_snapshots from {window_snapshot_guids(window_id)}")[0]["distinct_snapshots"]
+    if len(linked) < distinct_snapshots:
+        return False
+    pending = [link for link in linked if not link["aggregated"]]
+    if len(pending) == 0:
+        return True
+    try:
+        airdrop_db.begin_transaction()
+        for link in pending:
+            source = "(select address, total, staked from balance_snapshot where snapshot_guid = %s " + \
+                     "union all select address, total, staked from user_balance_snapshot " + \
+                     "where airdrop_window_id = %s and snapshot_guid = %s"
+            if link["snapshot_seq"] is not None:
+                source += f" union all select address, total, staked from {delta_snapshot_at(window_id, link['snapshot_seq'])}" + \
+                          f" union all select address, total, staked from {history_snapshot_at(window_id, link['snapshot_seq'])}"
+            fold_snapshot_aggregates(airdrop_db, window_id, source + ") as cur",
+                                     [link["snapshot_guid"], window_id, link["snapshot_guid"]])
+            airdrop_db.execute(
+                "update balance_snapshot_window set aggregated = 1, row_updated = current_timestamp " +
+                "where airdrop_window_id = %s and snapshot_guid = %s", [window_id, link["snapshot_guid"]])
+        airdrop_db.commit_transaction()
+    except Exception as e:
+        airdrop_db.rollback_transaction()
+        raise e
+    logger.info(f"Folded {len(pending)} snapshots of window {window_id} into its running aggregates")
+    return True
+
+
+class SnapshotWriter:
+    """
+    Bulk loader for balance snapshots. Rows are buffered and written as large
+    multi-row inserts sized from the connection's max_allowed_packet, and the whole
+    snapshot is committed once when the writer is closed.
+
+    With SnapshotStorage.PER_WINDOW every holder is written to user_balance_snapshot
+    once per window; with SnapshotStorage.SHARED it is written once to balance_snapshot
+    and the snapshot is linked to the windows through balance_snapshot_window.
+
+    With maintain_aggregates the snapshot is also folded into the running per-address
+    aggregates of user_balance_snapshot_aggregate in the same transaction.
+    """
+
+    def __init__(self, airdrop_db, snapshot_guid, window_ids, storage=SnapshotStorage.PER_WINDOW,
+                 buffer_size=SNAPSHOT_BUFFER_SIZE, maintain_aggregates=False):
+        self._airdrop_db = airdrop_db
+        self._maintain_aggregates = maintain_aggregates
+        self._snapshot_guid = snapshot_guid
+        self._window_ids = list(window_ids)
+        self._storage = storage
+        self._buffer_size = buffer_size
+        if storage == SnapshotStorage.SHARED:
+            self._insert_snapshot = "insert into balance_snapshot (address, balance, staked, total, " + \
+                                    "snapshot_guid, row_created, row_updated) values "
+            self._row_template = "(%s,%s,%s,%s,%s,current_timestamp,current_timestamp)"
+        else:
+            self._insert_snapshot = "insert into user_balance_snapshot (airdrop_window_id, address, balance, staked, total, " + \
+                                    "snapshot_guid, row_created, row_updated) values "
+            self._row_template = "(%s,%s,%s,%s,%s,%s,current_timestamp,current_timestamp)"
+        self._rows = []
+        self._rows_written = 0
+        self._started_at = None
+
+    def __enter__(self):
+        self._started_at = time.perf_counter()
+        check_window_storage(self._airdrop_db, self._window_ids, self._storage)
+        self._airdrop_db.begin_transaction()
+        self._prepare()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._rows.clear()
+            self._airdrop_db.rollback_transaction()
+            logger.error(f"Snapshot {self._snapshot_guid} rolled back after {self._rows_written} rows")
+            return False
+        try:
+            self.flush()
+            self._complete()
+            if self._maintain_aggregates:
+                self.__update_aggregates()
+            self._cleanup()
+            self._airdrop_db.commit_transaction()
+        except Exception as e:
+            self._airdrop_db.rollback_transaction()
+            logger.error(f"Snapshot {self._snapshot_guid} rolled back while completing, error: {repr(e)}")
+            raise e
+        elapsed = time.perf_counter() - self._started_at
+        rows_per_second = self._rows_written / elapsed if elapsed > 0 else self._rows_written
+        logger.info(f"Snapshot {self._snapshot_guid} ({self._storage.value}) loaded {self._rows_written} rows "
+                    f"in {elapsed:.2f}s ({rows_per_second:.0f} rows/sec)")
+        return False
+
+    @property
+    def rows_written(self):
+        return self._rows_written
+
+    def _prepare(self):
+        # Per-window snapshots are only linked when their aggregation has to be tracked
+        if self._storage == SnapshotStorage.SHARED or self._maintain_aggregates:
+            self._link_windows({window_id: self._next_sequence(window_id) for window_id in self._window_ids})
+
+    def _complete(self):
+        pass
+
+    def _cleanup(self):
+        pass
+
+    def _current_snapshot(self, window_id):
+        if self._storage == SnapshotStorage.SHARED:
+            return "(select address, total, staked from balance_snapshot where snapshot_guid = %s) as cur", \
+                [self._snapshot_guid]
+        return "(select address, total, staked from user_balance_snapshot " + \
+            "where airdrop_window_id = %s and snapshot_guid = %s) as cur", [window_id, self._snapshot_guid]
+
+    def __update_aggregates(self):
+        # Folds this snapshot into the running per-address aggregates of every window
+        for window_id in self._window_ids:
+            source, params = self._current_snapshot(window_id)
+            fold_snapshot_aggregates(self._airdrop_db, window_id, source, params)
+        self._airdrop_db.execute(
+            "update balance_snapshot_window set aggregated = 1, row_updated = current_timestamp where snapshot_guid = %s",
+            [self._snapshot_guid])
+
+    def _next_sequence(self, window_id):
+        result = self._airdrop_db.execute(
+            "select coalesce(max(snapshot_seq), 0) as latest_seq from balance_snapshot_window where airdrop_window_id = %s",
+            [window_id])
+        return int(result[0]["latest_seq"]) + 1
+
+    def _link_windows(self, window_sequences):
+        self._airdrop_db.bulk_insert(
+            "insert into balance_snapshot_window (airdrop_window_id, snapshot_guid, snapshot_seq, row_created, row_updated) values ",
+            "(%s,%s,%s,current_timestamp,current_timestamp)",
+            [(window_id, self._snapshot_guid, seq) for window_id, seq in window_sequences.items()]
+        )
+
+    def _holder_rows(self, address, balance, staked, total):
+        if self._storage == SnapshotStorage.SHARED:
+            return [(address, balance, staked, total, self._snapshot_guid)]
+        return [(window_id, address, balance, staked, total, self._snapshot_guid) for window_id in self._window_ids]
+
+    def add_holder(self, address, balance, staked, total):
+        self._rows.extend(self._holder_rows(address, balance, staked, total))
+        if len(self._rows) >= self._buffer_size:
+            self.flush()
+
+    def flush(self):
+        if len(self._rows) == 0:
+            return
+        self._airdrop_db.bulk_insert(self._insert_snapshot, self._row_template, self._rows)
+        self._rows_written += len(self._rows)
+        self._rows.clear()
+
+
+class DeltaSnapshotWriter(SnapshotWriter):
+    """
+    Writes SnapshotStorage.DELTA snapshots. The current balances are staged once in a
+    temporary table, then for every window only the addresses that are new, changed or
+    gone since the window's previous snapshot are written to user_balance_snapshot_delta.
+    """
+
+    def __init__(self, airdrop_db, snapshot_guid, window_ids, buffer_size=SNAPSHOT_BUFFER_SIZE,
+                 storage=SnapshotStorage.DELTA, maintain_aggregates=False):
+        super().__init__(airdrop_db, snapshot_guid, window_ids, storage, buffer_size, maintain_aggregates)
+        self._insert_snapshot = "insert into tmp_current_snapshot (address, balance, staked, total) values "
+        self._row_template = "(%s,%s,%s,%s)"
+        self._delta_rows = 0
+
+    def _prepare(self):
+        self._airdrop_db.execute("drop temporary table if exists tmp_current_snapshot")
+        self._airdrop_db.execute(
+            "create temporary table tmp_current_snapshot (address varchar(250) not null primary key, "
+            "balance decimal(64,0) not null, staked decimal(64,0) not null, total decimal(64,0) not null)")
+
+    def _complete(self):
+        window_sequences = {window_id: self._next_sequence(window_id) for window_id in self._window_ids}
+        self._link_windows(window_sequences)
+        for window_id, seq in window_sequences.items():
+            self._write_window(window_id, seq)
+        logger.info(f"Snapshot {self._snapshot_guid} wrote {self._delta_rows} changed rows for "
+                    f"{self._rows_written} holders and {len(self._window_ids)} windows")
+
+    def _cleanup(self):
+        self._airdrop_db.execute("drop temporary table if exists tmp_current_snapshot")
+
+    def _current_snapshot(self, window_id):
+        return "tmp_current_snapshot as cur", []
+
+    def _holder_rows(self, address, balance, staked, total):
+        return [(address, balance, staked, total)]
+
+    def _write_window(self, window_id, seq):
+        insert_delta = "insert into user_balance_snapshot_delta (airdrop_window_id, snapshot_guid, snapshot_seq, address, " + \
+                       "balance, staked, total, is_removed, row_created, row_updated) "
+        previous = delta_snapshot_at(window_id, seq - 1, "prev")
+        changed = self._airdrop_db.execute(
+            insert_delta +
+            "select %s, %s, %s, cur.address, cur.balance, cur.staked, cur.total, 0, " +
+            "current_timestamp, current_timestamp " +
+            f"from tmp_current_snapshot as cur left join {previous} on prev.address = cur.address " +
+            "where prev.address is null or prev.balance <> cur.balance or prev.staked <> cur.staked",
+            [window_id, self._snapshot_guid, seq])
+        removed = self._airdrop_db.execute(
+            insert_delta +
+            "select %s, %s, %s, prev.address, 0, 0, 0, 1, current_timestamp, current_timestamp " +
+            f"from {previous} left join tmp_current_snapshot as cur on cur.address = prev.address " +
+            "where cur.address is null",
+            [window_id, self._snapshot_guid, seq])
+        self._delta_rows += changed[0] + removed[0]
+        logger.info(f"Window {window_id} snapshot {seq}: {changed[0]} new or changed, {removed[0]} removed addresses")
+
+
+class HistorySnapshotWriter(DeltaSnapshotWriter):
+    """
+    Writes SnapshotStorage.HISTORY snapshots using the same staged comparison as
+    DeltaSnapshotWriter. Each address keeps one user_balance_history row per stable
+    balance interval: intervals whose balance changed or disappeared are closed at the
+    previous snapshot and new intervals are opened for new or changed balances.
+    """
+
+    def __init__(self, airdrop_db, snapshot_guid, window_ids, buffer_size=SNAPSHOT_BUFFER_SIZE,
+                 maintain_aggregates=False):
+        super().__init__(airdrop_db, snapshot_guid, window_ids, buffer_size, SnapshotStorage.HISTORY,
+                         maintain_aggregates)
+
+    def _write_window(self, window_id, seq):
+        closed = self._airdrop_db.execute(
+            "update user_balance_history set valid_to_snapshot = %s, row_updated = current_timestamp " +
+            "where airdrop_window_id = %s and valid_to_snapshot is null " +
+            "and not exists (select 1 from tmp_current_snapshot as cur " +
+            "where cur.address = user_balance_history.address and cur.balance = user_balance_history.balance " +
+            "and cur.staked = user_balance_history.staked)",
+            [seq - 1, window_id])
+        opened = self._airdrop_db.execute(
+            "insert into user_balance_history (airdrop_window_id, address, balance, staked, total, " +
+            "snapshot_guid, valid_from_snapshot, valid_to_snapshot, row_created, row_updated) " +
+            "select %s, cur.address, cur.balance, cur.staked, cur.total, %s, %s, null, current_timestamp, current_timestamp " +
+            "from tmp_current_snapshot as cur left join user_balance_history as history " +
+            "on history.airdrop_window_id = %s and history.address = cur.address and history.valid_to_snapshot is null " +
+            "where history.address is null",
+            [window_id, self._snapshot_guid, seq, window_id])
+        self._delta_rows += closed[0] + opened[0]
+        logger.info(f"Window {window_id} snapshot {seq}: {closed[0]} intervals closed, {opened[0]} opened")
@@ -5,9 +5,9 @@ from typing import Tuple, Optional
 from web3 import Web3
 
 from airdrop.config import AIRDROP_RECEIPT_SECRET_KEY, AIRDROP_RECEIPT_SECRET_KEY_STORAGE_REGION
-from airdrop.constants import Blockchain
+from airdrop.constants import Blockchain, ClaimMode
 from airdrop.utils import Utils, datetime_in_utcnow
-from common.boto_utils import BotoUtils
+from common.boto_utils import secret_provider
 from common.logger import get_logger
 from common.utils import get_registration_receipt_ethereum
 
@@ -23,6 +23,7 @@ class BaseAirdrop(ABC):
         self.register_all_window_at_once = False
         self.allow_update_registration = False
         self.is_claim_signature_required = False
+        self.claim_mode = ClaimMode.SIGNATURE
         self.chain_context = {}
         self.reward_processor_name = ""
 
@@ -61,10 +62,9 @@ class BaseAirdrop(ABC):
 
     @staticmethod
     def get_secret_key_for_receipt():
-        boto_client = BotoUtils(region_name=AIRDROP_RECEIPT_SECRET_KEY_STORAGE_REGION)
         try:
-            private_key = boto_client. \
-                get_parameter_value_from_secrets_manager(secret_name=AIRDROP_RECEIPT_SECRET_KEY)
+            private_key = secret_provider.get_secret(secret_name=AIRDROP_RECEIPT_SECRET_KEY,
+                                                     region_name=AIRDROP_RECEIPT_SECRET_KEY_STORAGE_REGION)
         except BaseException as e:
             raise e
         return private_key
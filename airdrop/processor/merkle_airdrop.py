@@ -0,0 +1,20 @@
+from airdrop.constants import ClaimMode
+from airdrop.processor.default_airdrop import DefaultAirdrop
+from airdrop.processor.nunet_airdrop import NunetAirdrop
+
+
+class MerkleAirdrop(DefaultAirdrop):
+    # Claimed with a proof against the Merkle root built by the build_merkle_distribution job
+
+    def __init__(self, airdrop_id, airdrop_window_id=None):
+        super().__init__(airdrop_id, airdrop_window_id)
+        self.is_claim_signature_required = False
+        self.claim_mode = ClaimMode.MERKLE_PROOF
+
+
+class NunetMerkleAirdrop(NunetAirdrop):
+
+    def __init__(self, airdrop_id, airdrop_window_id=None):
+        super().__init__(airdrop_id, airdrop_window_id)
+        self.is_claim_signature_required = False
+        self.claim_mode = ClaimMode.MERKLE_PROOF
@@ -4,7 +4,6 @@ from typing import Dict, List, Tuple, Union
 
 from blockfrost import BlockFrostApi
 from blockfrost.utils import ApiError as BlockFrostApiError
-from eth_account.messages import encode_defunct
 from pycardano import Address
 from web3 import Web3
 
@@ -20,9 +19,10 @@ from airdrop.infrastructure.repositories.pending_transaction_repo import Pending
 from airdrop.infrastructure.repositories.user_registration_repo import UserRegistrationRepository
 from airdrop.processor.default_airdrop import DefaultAirdrop
 from airdrop.utils import Utils, datetime_in_utcnow
-from airdrop.config import NETWORK, BlockFrostAPIBaseURL, BlockFrostAccountDetails, RejuveAirdropConfig
+from airdrop.config import BlockFrostAPIBaseURL, BlockFrostAccountDetails, RejuveAirdropConfig
 from common.exceptions import TransactionNotFound, ValidationFailedException
 from common.logger import get_logger
+from common.signing import get_local_signer
 
 logger = get_logger(__name__)
 
@@ -156,12 +156,7 @@ class RejuveAirdrop(DefaultAirdrop):
                 ["__receipt_ack_message", address, int(self.id), int(self.window_id), timestamp],
             )
 
-            message_hash = encode_defunct(message)
-
-            web3_object = Web3(Web3.HTTPProvider(NETWORK["http_provider"]))
-            signed_message = web3_object.eth.account.sign_message(message_hash, private_key=secret_key)
-
-            return b64encode(signed_message.signature).decode()
+            return b64encode(get_local_signer(secret_key).sign_digest(message)).decode()
 
         except BaseException as e:
             raise e
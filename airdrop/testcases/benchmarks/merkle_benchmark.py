@@ -0,0 +1,96 @@
+"""
+Build time of the Merkle distribution of an airdrop and lookup latency of its proofs.
+
+Leaves are built as MerkleDistributionBuilder builds them from the streamed user_rewards
+rows, then the proof of every leaf is generated and stored in an indexed SQLite table
+shaped like merkle_proof, a local stand-in for the single row read of the claim endpoint.
+Lookups read random proofs by (distribution, window, address) and verify them.
+
+    python -m airdrop.testcases.benchmarks.merkle_benchmark --leaves 1000000
+"""
+import argparse
+import random
+import sqlite3
+import statistics
+import time
+
+from common.merkle import LEAF_SIZE, MerkleTree, decode_leaf, encode_leaf, hash_leaf_data, verify_proof
+
+
+def synthetic_rewards(leaves, windows, seed=42):
+    generator = random.Random(seed)
+    for index in range(leaves):
+        yield {"airdrop_window_id": index % windows + 1, "address": f"0x{index + 1:040x}",
+               "rewards_awarded": generator.randrange(10 ** 15, 10 ** 21)}
+
+
+def build_tree(rewards):
+    tree = MerkleTree()
+    leaves = bytearray()
+    for reward in rewards:
+        leaf_data = encode_leaf(reward["address"], reward["rewards_awarded"], reward["airdrop_window_id"])
+        leaves += leaf_data
+        tree.add_leaf(hash_leaf_data(leaf_data))
+    return tree, leaves
+
+
+def store_proofs(connection, tree, leaves):
+    connection.execute("create table merkle_proof (merkle_distribution_id integer, airdrop_window_id integer, "
+                       "address text, amount text, proof blob, "
+                       "unique (merkle_distribution_id, airdrop_window_id, address))")
+
+    def rows():
+        for index in range(len(tree)):
+            address, amount, window_id = decode_leaf(leaves[index * LEAF_SIZE:(index + 1) * LEAF_SIZE])
+            yield 1, window_id, address, str(amount), tree.proof(index)
+
+    connection.executemany("insert into merkle_proof values (?, ?, ?, ?, ?)", rows())
+    connection.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leaves", type=int, default=1000000)
+    parser.add_argument("--windows", type=int, default=4)
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+    tree, leaves = build_tree(synthetic_rewards(args.leaves, args.windows))
+    hashed_at = time.perf_counter()
+    root = tree.build()
+    built_at = time.perf_counter()
+    held = len(leaves) + sum(len(level) for level in tree._levels)
+    print(f"leaves {len(tree)}, depth {tree.depth}, root 0x{root.hex()}")
+    print(f"hash leaves      {hashed_at - started_at:8.2f}s")
+    print(f"build tree       {built_at - hashed_at:8.2f}s")
+    print(f"held in memory   {held / 2 ** 20:8.1f} MiB, {held / len(tree):.0f} bytes/leaf")
+
+    connection = sqlite3.connect(":memory:")
+    started_at = time.perf_counter()
+    store_proofs(connection, tree, leaves)
+    stored_at = time.perf_counter()
+    proof_bytes = connection.execute("select sum(length(proof)) from merkle_proof").fetchone()[0]
+    print(f"proofs + insert  {stored_at - started_at:8.2f}s, {proof_bytes / 2 ** 20:.1f} MiB of proofs")
+
+    generator = random.Random(7)
+    lookup_times, verify_times = [], []
+    for _ in range(args.lookups):
+        index = generator.randrange(len(tree))
+        address, amount, window_id = decode_leaf(leaves[index * LEAF_SIZE:(index + 1) * LEAF_SIZE])
+        started_at = time.perf_counter()
+        stored_amount, proof = connection.execute(
+            "select amount, proof from merkle_proof where merkle_distribution_id = ? and airdrop_window_id = ? "
+            "and address = ?", (1, window_id, address)).fetchone()
+        looked_up_at = time.perf_counter()
+        assert verify_proof(proof, root, hash_leaf_data(encode_leaf(address, int(stored_amount), window_id)))
+        verify_times.append(time.perf_counter() - looked_up_at)
+        lookup_times.append(looked_up_at - started_at)
+    lookup_times.sort()
+    print(f"proof lookup     p50 {statistics.median(lookup_times) * 10 ** 6:6.0f} us, "
+          f"p99 {lookup_times[int(len(lookup_times) * 0.99)] * 10 ** 6:6.0f} us")
+    print(f"proof verify     p50 {statistics.median(verify_times) * 10 ** 6:6.0f} us")
+
+
+if __name__ == "__main__":
+    main()
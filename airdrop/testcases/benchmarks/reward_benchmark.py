@@ -0,0 +1,309 @@
+"""
+End to end benchmark of the reward jobs on synthetic data.
+
+For every processor, size and address mix the scenario data is generated and loaded,
+then the processor runs in a fresh process which reports its wall time, peak RSS and
+the number of statements sent to MySQL. Results are compared with a stored baseline,
+and the run exits with 1 when a scenario regressed.
+
+The processors use MySQL specific statements, so the benchmark runs against the
+databases of airdrop.config, which must be scratch databases: source tables such as
+agix_balances are truncated, and EligibilityProcessor processes every active window.
+
+    python -m airdrop.testcases.benchmarks.reward_benchmark --confirm-scratch-databases \\
+        --sizes 10000,100000 --mix mixed --processors nunet,rejuve --save-baseline
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import uuid
+from datetime import timedelta
+
+import pymysql.cursors
+
+from airdrop.config import BALANCE_DB_CONFIG, NETWORK, TOKEN_SNAPSHOT_DB_CONFIG
+from airdrop.job.repository import Repository
+from airdrop.testcases.benchmarks.synthetic_data import (
+    MIXES,
+    generate_agix_balances,
+    generate_holders,
+    generate_loyalty_snapshot,
+    generate_registrations,
+    generate_snapshot_rows,
+    load_agix_balances,
+    load_loyalty_snapshot,
+    load_registrations,
+    load_snapshot,
+)
+from airdrop.utils import datetime_in_utcnow
+from common.logger import get_logger
+
+logger = get_logger(__name__)
+
+SIZES = (10000, 100000, 1000000)
+PROCESSORS = ("eligibility", "nunet", "rejuve", "loyalty")
+SNAPSHOTS_PER_WINDOW = 3
+REJUVE_WINDOW_TOKENS = 1000000
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "reward_benchmark_baseline.json")
+# Wall time and peak RSS may grow this much over the baseline before a scenario counts as regressed
+REGRESSION_TOLERANCE = 0.2
+AIRDROP_PROCESSORS = {
+    # EligibilityProcessor locates the reward processor of an active window from airdrop_processor
+    "eligibility": ("nunet_reward_processor.NunetRewardProcessor", "NTX"),
+    "nunet": ("nunet_airdrop.NunetAirdrop", "NTX"),
+    "rejuve": ("rejuve_airdrop.RejuveAirdrop", "RJV"),
+    "loyalty": ("loyalty_airdrop.LoyaltyAirdrop", "AGIX"),
+}
+WINDOW_TABLES = ("user_rewards_staging", "user_rewards_run", "user_rewards_audit_artifact", "user_rewards_audit",
+                 "user_reward_score_cache", "user_rewards", "user_pending_rewards", "user_registrations",
+                 "user_balance_snapshot", "user_balance_snapshot_aggregate", "user_balance_snapshot_delta",
+                 "user_balance_history", "balance_snapshot_window")
+
+
+class QueryCounter:
+    # Counts the statements sent through pymysql, by the job Repository and SQLAlchemy alike
+    def __init__(self):
+        self.count = 0
+
+    def install(self):
+        execute = pymysql.cursors.Cursor.execute
+        counter = self
+
+        def counting_execute(cursor, query, args=None):
+            counter.count += 1
+            return execute(cursor, query, args)
+
+        pymysql.cursors.Cursor.execute = counting_execute
+        return self
+
+
+def run_eligibility(context, options):
+    from airdrop.job.eligibility import EligibilityProcessor
+    EligibilityProcessor(**options).process_eligibility()
+
+
+def run_nunet(context, options):
+    from airdrop.job.reward_processors.nunet_reward_processor import NunetRewardProcessor
+    NunetRewardProcessor(Repository(NETWORK["db"]), context["airdrop_id"], context["window_id"],
+                         context["snapshot_guid"], **options).process_rewards(False)
+
+
+def run_rejuve(context, options):
+    from airdrop.job.reward_processors.rejuve_reward_processor import RejuveRewardProcessor
+    RejuveRewardProcessor(context["airdrop_id"], context["window_id"], context["snapshot_guid"],
+                          **options).process_user_rewards()
+
+
+def run_loyalty(context, options):
+    from airdrop.job.reward_processors.loyalty_reward_processor import LoyaltyEligibilityProcessor
+    LoyaltyEligibilityProcessor(context["airdrop_id"], context["window_id"], **options).process_reward()
+
+
+PROCESSOR_RUNNERS = {
+    "eligibility": run_eligibility,
+    "nunet": run_nunet,
+    "rejuve": run_rejuve,
+    "loyalty": run_loyalty,
+}
+
+
+def measure_processor(connection, processor, context, options):
+    # Runs in a spawned process, so ru_maxrss only covers this processor run
+    counter = QueryCounter().install()
+    started_at = time.perf_counter()
+    error = None
+    try:
+        PROCESSOR_RUNNERS[processor](context, options)
+    except Exception as e:
+        logger.exception(f"Benchmark of {processor} failed")
+        error = repr(e)
+    connection.send({
+        "wall_time": round(time.perf_counter() - started_at, 3),
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "queries": counter.count,
+        "error": error
+    })
+    connection.close()
+
+
+def create_window(airdrop_db, processor):
+    airdrop_processor, token_name = AIRDROP_PROCESSORS[processor]
+    now = datetime_in_utcnow()
+    airdrop = airdrop_db.execute(
+        "insert into airdrop (token_address, org_name, token_name, token_type, contract_address, airdrop_processor, "
+        "row_created, row_updated) values (%s, %s, %s, %s, %s, %s, current_timestamp, current_timestamp)",
+        ["0x0", f"Benchmark {processor}", token_name, "CONTRACT", "0x0", airdrop_processor])
+    airdrop_id = airdrop[1]["last_row_id"]
+    # Open for snapshots and registration, with claims starting after the run
+    window = airdrop_db.execute(
+        "insert into airdrop_window (airdrop_id, airdrop_window_order, airdrop_window_name, registration_required, "
+        "registration_start_period, registration_end_period, snapshot_required, first_snapshot_at, last_snapshot_at, "
+        "claim_start_period, claim_end_period, total_airdrop_tokens, row_created, row_updated) "
+        "values (%s, 1, %s, 1, %s, %s, 1, %s, %s, %s, %s, %s, current_timestamp, current_timestamp)",
+        [airdrop_id, f"Benchmark {processor} window", now - timedelta(days=1), now + timedelta(days=1),
+         now - timedelta(days=1), now + timedelta(days=1), now + timedelta(days=2), now + timedelta(days=3),
+         REJUVE_WINDOW_TOKENS])
+    return airdrop_id, window[1]["last_row_id"]
+
+
+def set_up_scenario(airdrop_db, processor, holders, mix, seed):
+    airdrop_id, window_id = create_window(airdrop_db, processor)
+    context = {"airdrop_id": airdrop_id, "window_id": window_id, "snapshot_guid": None}
+    holder_rows = generate_holders(holders, mix, seed)
+    if processor == "loyalty":
+        wallets, stakers = generate_loyalty_snapshot(holder_rows, seed)
+        load_loyalty_snapshot(Repository(TOKEN_SNAPSHOT_DB_CONFIG), wallets, stakers)
+        return context
+
+    # The eligibility run takes the last snapshot of the window itself
+    snapshots = SNAPSHOTS_PER_WINDOW - 1 if processor == "eligibility" else SNAPSHOTS_PER_WINDOW
+    for snapshot_index in range(snapshots):
+        context["snapshot_guid"] = str(uuid.uuid4())
+        load_snapshot(airdrop_db, window_id, context["snapshot_guid"],
+                      generate_snapshot_rows(holder_rows, snapshot_index, seed))
+    if processor == "eligibility":
+        load_agix_balances(Repository(BALANCE_DB_CONFIG), generate_agix_balances(holder_rows))
+    elif processor == "rejuve":
+        load_registrations(airdrop_db, window_id, generate_registrations(holder_rows, seed=seed))
+    return context
+
+
+def tear_down_scenario(airdrop_db, context):
+    window_id = context["window_id"]
+    airdrop_db.execute("delete balance_snapshot from balance_snapshot join balance_snapshot_window "
+                       "using (snapshot_guid) where balance_snapshot_window.airdrop_window_id = %s", [window_id])
+    for table in WINDOW_TABLES:
+        airdrop_db.execute(f"delete from {table} where airdrop_window_id = %s", [window_id])
+    airdrop_db.execute("delete from airdrop_window where row_id = %s", [window_id])
+    airdrop_db.execute("delete from airdrop where row_id = %s", [context["airdrop_id"]])
+
+
+def scenario_key(processor, mix, holders, options):
+    key = f"{processor}/{mix}/{holders}"
+    if options:
+        key += "/" + json.dumps(options, sort_keys=True, separators=(",", ":"))
+    return key
+
+
+def run_scenario(processor, holders, mix, options, seed):
+    airdrop_db = Repository(NETWORK["db"])
+    logger.info(f"Loading {holders} {mix} holders for {processor}")
+    context = set_up_scenario(airdrop_db, processor, holders, mix, seed)
+    try:
+        spawn = multiprocessing.get_context("spawn")
+        parent_connection, child_connection = spawn.Pipe(duplex=False)
+        worker = spawn.Process(target=measure_processor, args=(child_connection, processor, context, options))
+        worker.start()
+        child_connection.close()
+        try:
+            result = parent_connection.recv()
+        except EOFError:
+            result = {"wall_time": None, "peak_rss": None, "queries": None,
+                      "error": "worker exited without a result"}
+        worker.join()
+    finally:
+        tear_down_scenario(airdrop_db, context)
+    result.update(processor=processor, holders=holders, mix=mix, options=options)
+    return result
+
+
+def compare_with_baseline(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Returns the results keyed by scenario with the baseline values and a regressed flag.
+    Statement counts don't depend on timing, so any increase counts as a regression.
+    """
+    comparison = {}
+    for result in results:
+        key = scenario_key(result["processor"], result["mix"], result["holders"], result["options"])
+        expected = baseline.get(key)
+        regressed = []
+        if result["error"] is not None:
+            regressed.append("error")
+        elif expected is not None:
+            for metric in ("wall_time", "peak_rss"):
+                if result[metric] > expected[metric] * (1 + tolerance):
+                    regressed.append(metric)
+            if result["queries"] > expected["queries"]:
+                regressed.append("queries")
+        comparison[key] = {"result": result, "baseline": expected, "regressed": regressed}
+    return comparison
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baseline_file:
+        return json.load(baseline_file)
+
+
+def save_baseline(path, results, baseline):
+    for result in results:
+        if result["error"] is None:
+            baseline[scenario_key(result["processor"], result["mix"], result["holders"], result["options"])] = {
+                metric: result[metric] for metric in ("wall_time", "peak_rss", "queries")
+            }
+    with open(path, "w") as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+
+
+def format_change(value, expected):
+    if expected is None or not expected:
+        return ""
+    return f" ({(value - expected) / expected:+.0%})"
+
+
+def print_comparison(comparison):
+    for key, entry in comparison.items():
+        result, expected = entry["result"], entry["baseline"] or {}
+        if result["error"] is not None:
+            print(f"{key}: failed, {result['error']}")
+            continue
+        print(f"{key}: {result['wall_time']:.1f}s{format_change(result['wall_time'], expected.get('wall_time'))}, "
+              f"peak RSS {result['peak_rss'] / 2 ** 20:.1f} MiB{format_change(result['peak_rss'], expected.get('peak_rss'))}, "
+              f"{result['queries']} queries{format_change(result['queries'], expected.get('queries'))}"
+              f"{', REGRESSED ' + ' '.join(entry['regressed']) if entry['regressed'] else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(size) for size in SIZES))
+    parser.add_argument("--mix", choices=sorted(MIXES), default="ethereum")
+    parser.add_argument("--processors", default=",".join(PROCESSORS))
+    parser.add_argument("--options", default="{}",
+                        help='JSON keyword arguments per processor, e.g. {"nunet": {"vectorized_scoring": true}}')
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results of this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--confirm-scratch-databases", action="store_true")
+    args = parser.parse_args()
+
+    if not args.confirm_scratch_databases:
+        parser.error(f"the benchmark writes to {NETWORK['db']['DB_NAME']}, {BALANCE_DB_CONFIG['DB_NAME']} and "
+                     f"{TOKEN_SNAPSHOT_DB_CONFIG['DB_NAME']}, pass --confirm-scratch-databases to run it")
+    processors = args.processors.split(",")
+    unknown = [processor for processor in processors if processor not in PROCESSOR_RUNNERS]
+    if unknown:
+        parser.error(f"unknown processors {unknown}, expected some of {list(PROCESSOR_RUNNERS)}")
+    options = json.loads(args.options)
+
+    results = []
+    for holders in (int(size) for size in args.sizes.split(",")):
+        for processor in processors:
+            results.append(run_scenario(processor, holders, args.mix, options.get(processor, {}), args.seed))
+
+    baseline = load_baseline(args.baseline)
+    comparison = compare_with_baseline(results, baseline, args.tolerance)
+    print_comparison(comparison)
+    if args.save_baseline:
+        save_baseline(args.baseline, results, baseline)
+        return 0
+    return 1 if any(entry["regressed"] for entry in comparison.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Peak memory of the reward candidates kept by NunetRewardProcessor.process_rewards.
+
+Compares the previous representation, a regular class holding Decimals kept in two lists
+(all holders and holders to reward), with the slotted UserRewardObject, which holds its
+amounts as ints, kept in a single flagged list.
+
+    python -m airdrop.testcases.benchmarks.reward_memory_benchmark --holders 1000000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from decimal import Decimal
+
+from airdrop.job.reward_processors.nunet_reward_processor import UserRewardObject
+from airdrop.job.reward_processors.nunet_scoring import decimal_score
+
+
+class DictUserRewardObject:
+    # UserRewardObject before __slots__ and int amounts
+    def __init__(self, address, balance, staked):
+        self._address = address
+        self._balance, self._staked, self._score, self._log10_score = decimal_score(balance, staked)
+        self._reward = 0
+        self._comment = None
+
+    def set_reward(self, reward):
+        self._reward = round(reward, 0)
+
+
+def synthetic_balances(holders, seed=42):
+    # Decimals, as the balances are read from the DECIMAL columns of the snapshots
+    generator = random.Random(seed)
+    return [(f"0x{index:040x}", Decimal(generator.randrange(25 * 10 ** 10, 10 ** 16)),
+             Decimal(generator.randrange(0, 10 ** 14) if generator.random() < 0.3 else 0))
+            for index in range(holders)]
+
+
+def build_two_lists(balances):
+    all_users, users_to_reward = [], []
+    for index, (address, balance, staked) in enumerate(balances):
+        user = DictUserRewardObject(address, balance, staked)
+        all_users.append(user)
+        if index % 10:
+            users_to_reward.append(user)
+            user.set_reward(Decimal(balance))
+    return all_users, users_to_reward
+
+
+def build_flagged_list(balances):
+    users = []
+    for index, (address, balance, staked) in enumerate(balances):
+        user = UserRewardObject(address, balance, staked)
+        users.append(user)
+        if index % 10:
+            user.set_rewarded(True)
+            user.set_reward(Decimal(balance))
+    return users
+
+
+def measure(build, balances):
+    tracemalloc.start()
+    started_at = time.perf_counter()
+    result = build(balances)
+    elapsed = time.perf_counter() - started_at
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--holders", type=int, default=1000000)
+    args = parser.parse_args()
+
+    balances = synthetic_balances(args.holders)
+    for name, build in (("regular class, two lists", build_two_lists),
+                        ("slotted class, flagged list", build_flagged_list)):
+        peak, elapsed = measure(build, balances)
+        print(f"{name:30} peak {peak / 2 ** 20:8.1f} MiB  {peak / args.holders:6.0f} B/holder  {elapsed:6.1f}s")
+
+
+if __name__ == "__main__":
+    main()
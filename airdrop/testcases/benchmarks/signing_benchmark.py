@@ -0,0 +1,69 @@
+"""
+Per signature cost of claim signatures.
+
+Compares the previous path, a Web3 HTTPProvider and the private key parsed for every
+signature, with LocalSigner signing one digest at a time and in a batch. No node is
+contacted by any of them. Most of the remaining cost is the ECDSA signature itself,
+which eth_keys computes in pure Python unless coincurve is installed.
+
+    python -m airdrop.testcases.benchmarks.signing_benchmark --signatures 2000
+"""
+import argparse
+import time
+
+from eth_account.messages import encode_defunct
+from eth_keys.backends import get_backend
+from web3 import Web3
+
+from common.signing import get_local_signer
+
+PRIVATE_KEY = "12b7972e86b2f45f130a3089ff1908d00d8fed70dc9b7b002c6656d983776001"
+CONTRACT_ADDRESS = "0x5E94577b949a56279637ff74DfcFf2C28408f049"
+
+
+def claim_digests(count):
+    return [Web3.solidity_keccak(
+        ["string", "uint256", "uint256", "address", "uint256", "uint256", "address", "address"],
+        ["__airdropclaim", 10 ** 18 + index, 10 ** 18, Web3.to_checksum_address(f"0x{index + 1:040x}"), 1, 2,
+         CONTRACT_ADDRESS, CONTRACT_ADDRESS]
+    ) for index in range(count)]
+
+
+def sign_with_provider(digests):
+    signatures = []
+    for digest in digests:
+        web3_object = Web3(Web3.HTTPProvider("http://127.0.0.1:8545"))
+        signatures.append(web3_object.eth.account.sign_message(encode_defunct(digest), private_key=PRIVATE_KEY)
+                          .signature)
+    return signatures
+
+
+def sign_one_by_one(digests):
+    return [get_local_signer(PRIVATE_KEY).sign_digest(digest) for digest in digests]
+
+
+def sign_batch(digests):
+    return get_local_signer(PRIVATE_KEY).sign_digests(digests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--signatures", type=int, default=2000)
+    args = parser.parse_args()
+
+    digests = claim_digests(args.signatures)
+    print(f"eth_keys backend: {type(get_backend()).__name__}")
+    expected = None
+    for name, sign in (("Web3 HTTPProvider per signature", sign_with_provider),
+                       ("LocalSigner, one by one", sign_one_by_one),
+                       ("LocalSigner, batch", sign_batch)):
+        started_at = time.perf_counter()
+        signatures = sign(digests)
+        elapsed = time.perf_counter() - started_at
+        expected = expected or signatures
+        assert signatures == expected, f"{name} signatures differ"
+        print(f"{name:32} {elapsed / args.signatures * 10 ** 6:8.0f} us/signature  {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Synthetic holders, snapshots, registrations and loyalty snapshots for the reward
+benchmarks. Generators are seeded, so a size, mix and seed always give the same data.
+Loaders write the data with the job Repository into the tables the processors read.
+"""
+import random
+
+from pycardano import Address, Network, VerificationKeyHash
+
+MIXES = {
+    "ethereum": {"ethereum": 1.0},
+    "byron": {"byron": 1.0},
+    "shelley": {"shelley": 1.0},
+    "mixed": {"ethereum": 0.6, "byron": 0.1, "shelley": 0.3},
+}
+# Balances are log-uniform between 10 AGIX and 100M AGIX, in cogs
+MIN_BALANCE_EXPONENT = 9
+MAX_BALANCE_EXPONENT = 16
+STAKER_RATIO = 0.3
+# Share of Shelley holders whose address reuses the staking key of the previous holder
+SHARED_STAKING_KEY_RATIO = 0.2
+# Share of holders that are missing from one of the snapshots of a window
+MISSING_HOLDER_RATIO = 0.05
+BYRON_ADDRESS_LENGTH = 104
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+CONTRACT_RATIO = 0.01
+
+
+class SyntheticHolder:
+    __slots__ = ("address", "payment_part", "staking_part", "balance", "staked")
+
+    def __init__(self, address, balance, staked, payment_part=None, staking_part=None):
+        self.address = address
+        self.payment_part = payment_part
+        self.staking_part = staking_part
+        self.balance = balance
+        self.staked = staked
+
+
+def ethereum_address(generator):
+    return f"0x{generator.getrandbits(160):040x}"
+
+
+def byron_address(generator):
+    return "DdzFF" + "".join(generator.choices(BASE58_ALPHABET, k=BYRON_ADDRESS_LENGTH - 5))
+
+
+def shelley_address(generator, staking_key=None):
+    address = Address(VerificationKeyHash(generator.randbytes(28)),
+                      staking_key or VerificationKeyHash(generator.randbytes(28)),
+                      Network.MAINNET)
+    return address.encode(), str(address.payment_part), str(address.staking_part), address.staking_part
+
+
+def generate_holders(count, mix="ethereum", seed=42):
+    """
+    Holders of the given address mix, one of MIXES. Part of the Shelley holders share a
+    staking key, so registrations have related addresses as on mainnet.
+    """
+    generator = random.Random(seed)
+    eras = list(MIXES[mix])
+    weights = [MIXES[mix][era] for era in eras]
+    holders = []
+    staking_key = None
+    for _ in range(count):
+        balance = int(10 ** generator.uniform(MIN_BALANCE_EXPONENT, MAX_BALANCE_EXPONENT))
+        staked = int(10 ** generator.uniform(MIN_BALANCE_EXPONENT, MAX_BALANCE_EXPONENT - 2)) \
+            if generator.random() < STAKER_RATIO else 0
+        era = generator.choices(eras, weights)[0]
+        if era == "ethereum":
+            holders.append(SyntheticHolder(ethereum_address(generator), balance, staked))
+        elif era == "byron":
+            holders.append(SyntheticHolder(byron_address(generator), balance, staked))
+        else:
+            shared = staking_key if generator.random() < SHARED_STAKING_KEY_RATIO else None
+            address, payment_part, staking_part, staking_key = shelley_address(generator, shared)
+            holders.append(SyntheticHolder(address, balance, staked, payment_part, staking_part))
+    return holders
+
+
+def generate_snapshot_rows(holders, snapshot_index, seed=42):
+    """
+    Rows of one snapshot of the holders as (address, payment_part, staking_part, balance,
+    staked, total). Balances drift a little between snapshots and a few holders are
+    missing from each snapshot but the first.
+    """
+    generator = random.Random(seed * 1000 + snapshot_index)
+    rows = []
+    for holder in holders:
+        if snapshot_index > 0 and generator.random() < MISSING_HOLDER_RATIO:
+            continue
+        balance = holder.balance if snapshot_index == 0 else int(holder.balance * generator.uniform(0.9, 1.1))
+        rows.append((holder.address, holder.payment_part, holder.staking_part, balance, holder.staked,
+                     balance + holder.staked))
+    return rows
+
+
+def generate_registrations(holders, ratio=0.5, seed=42):
+    # Registrations are stored without payment and staking parts, as the older ones are
+    generator = random.Random(seed)
+    return [holder.address for holder in holders if generator.random() < ratio]
+
+
+def generate_agix_balances(holders):
+    rows = []
+    for holder in holders:
+        rows.append((holder.address, holder.balance, "WALLET"))
+        if holder.staked:
+            rows.append((holder.address, holder.staked, "STAKED"))
+    return rows
+
+
+def generate_loyalty_snapshot(holders, seed=42):
+    """
+    token_snapshots_00MINS and staking_token_snapshots rows for the holders. Loyalty
+    rewards are Ethereum only, so every holder gets an Ethereum address whatever the mix.
+    """
+    generator = random.Random(seed)
+    wallets, stakers = [], []
+    for holder in holders:
+        address = holder.address if holder.address.startswith("0x") else ethereum_address(generator)
+        wallets.append((address, holder.balance, int(generator.random() < CONTRACT_RATIO)))
+        if holder.staked:
+            stakers.append((address, holder.staked))
+    return wallets, stakers
+
+
+def load_snapshot(airdrop_db, window_id, snapshot_guid, rows):
+    return airdrop_db.bulk_insert(
+        "insert into user_balance_snapshot (airdrop_window_id, address, payment_part, staking_part, balance, staked, "
+        "total, snapshot_guid, row_created, row_updated) values ",
+        "(%s,%s,%s,%s,%s,%s,%s,%s,current_timestamp,current_timestamp)",
+        [(window_id, address, payment_part, staking_part, balance, staked, total, snapshot_guid)
+         for address, payment_part, staking_part, balance, staked, total in rows])
+
+
+def load_registrations(airdrop_db, window_id, addresses):
+    return airdrop_db.bulk_insert(
+        "insert into user_registrations (airdrop_window_id, address, registered_at, row_created, row_updated) values ",
+        "(%s,%s,current_timestamp,current_timestamp,current_timestamp)",
+        [(window_id, address) for address in addresses])
+
+
+def load_agix_balances(balances_db, rows):
+    # Source table of the token balances service, created here if the database doesn't have it
+    balances_db.execute("create table if not exists agix_balances (wallet_address varchar(250) not null, "
+                        "amount decimal(64,0) not null, balance_type varchar(50) not null, "
+                        "index agix_balances_wallet_address_idx (wallet_address))")
+    balances_db.execute("truncate table agix_balances")
+    return balances_db.bulk_insert("insert into agix_balances (wallet_address, amount, balance_type) values ",
+                                   "(%s,%s,%s)", rows)
+
+
+def load_loyalty_snapshot(token_snapshot_db, wallets, stakers):
+    # Source tables of the token snapshot service, created here if the database doesn't have them
+    token_snapshot_db.execute("create table if not exists token_snapshots_00MINS (wallet_address varchar(250) not null, "
+                              "balance_in_cogs decimal(64,0) not null, is_contract tinyint(1) default 0, "
+                              "primary key (wallet_address))")
+    token_snapshot_db.execute("create table if not exists staking_token_snapshots (staker_address varchar(250) not null, "
+                              "balance_in_cogs decimal(64,0) not null, primary key (staker_address))")
+    token_snapshot_db.execute("truncate table token_snapshots_00MINS")
+    token_snapshot_db.execute("truncate table staking_token_snapshots")
+    token_snapshot_db.bulk_insert("insert into token_snapshots_00MINS (wallet_address, balance_in_cogs, is_contract) values ",
+                                  "(%s,%s,%s)", wallets)
+    token_snapshot_db.bulk_insert("insert into staking_token_snapshots (staker_address, balance_in_cogs) values ",
+                                  "(%s,%s)", stakers)
@@ -79,5 +79,27 @@ class TestLoyaltyAirdropServices(TestCase):
                                                                               UserReward.address == "0x00Aee4E1698Fe0829F4663CBef571c948160B858").first()
         assert (user_reward.rewards_awarded, Decimal(22926589306))
 
+    @patch("airdrop.job.repository.Repository.stream")
+    def test_process_loyalty_airdrop_reward_eligibility_streaming(self, mock_stream):
+        event = {"airdrop_id": self.airdrop.id, "window_id": self.loyalty_airdrop_window3.id, "streaming": True}
+
+        mock_stream.return_value = iter([
+            {'staker_address': '0x00Aee4E1698Fe0829F4663CBef571c948160B858', 'wallet_address': None,
+             'staker_balance': 3016982005590, 'wallet_balance': None, 'is_contract': None}])
+        response = process_loyalty_airdrop_reward_eligibility(event, None)
+        assert (response["statusCode"] == 200)
+
+        # Processing the window again updates the existing reward
+        mock_stream.return_value = iter([
+            {'staker_address': '0x00Aee4E1698Fe0829F4663CBef571c948160B858', 'wallet_address': None,
+             'staker_balance': 3016982005590, 'wallet_balance': None, 'is_contract': None}])
+        response = process_loyalty_airdrop_reward_eligibility(event, None)
+        assert (response["statusCode"] == 200)
+
+        user_rewards = user_reward_repository.session.query(UserReward).filter(UserReward.airdrop_id == self.airdrop.id,
+                                                                               UserReward.airdrop_window_id == self.loyalty_airdrop_window3.id).all()
+        self.assertEqual(len(user_rewards), 1)
+        self.assertEqual(user_rewards[0].address, "0x00Aee4E1698Fe0829F4663CBef571c948160B858")
+
     def tearDown(self):
         clear_database()
@@ -0,0 +1,132 @@
+"""
+Stand-in for airdrop.job.repository.Repository on an in-memory SQLite database, so the
+SQL of the jobs can run in unit tests. The MySQL constructs the jobs use are rewritten to
+their SQLite equivalents: placeholders, temporary tables, ON DUPLICATE KEY UPDATE,
+LEAST/GREATEST and multi-table UPDATE ... JOIN are not supported.
+"""
+import re
+import sqlite3
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+TABLES = {
+    "user_balance_snapshot": "airdrop_window_id integer, address text, payment_part text, staking_part text, "
+                             "balance numeric, staked numeric, total numeric, snapshot_guid text",
+    "balance_snapshot": "address text, payment_part text, staking_part text, balance numeric, staked numeric, "
+                        "total numeric, snapshot_guid text",
+    "balance_snapshot_window": "airdrop_window_id integer, snapshot_guid text, snapshot_seq integer, "
+                               "aggregated integer not null default 0, unique (airdrop_window_id, snapshot_guid)",
+    "user_balance_snapshot_aggregate": "airdrop_window_id integer, address text, min_total numeric, "
+                                       "min_staked numeric, max_total numeric, occurrences integer, "
+                                       "unique (airdrop_window_id, address)",
+    "user_balance_snapshot_delta": "airdrop_window_id integer, address text, payment_part text, staking_part text, "
+                                   "balance numeric, staked numeric, total numeric, is_removed integer, "
+                                   "snapshot_guid text, snapshot_seq integer",
+    "user_balance_history": "airdrop_window_id integer, address text, payment_part text, staking_part text, "
+                            "balance numeric, staked numeric, total numeric, snapshot_guid text, "
+                            "valid_from_snapshot integer, valid_to_snapshot integer",
+    "user_registrations": "airdrop_window_id integer, address text, payment_part text, staking_part text, "
+                          "registered_at timestamp, unique (airdrop_window_id, address)",
+    "user_pending_rewards": "airdrop_window_id integer, address text, pending_reward numeric",
+    "user_rewards": "airdrop_id integer, airdrop_window_id integer, address text, condition text, "
+                    "rewards_awarded numeric, score numeric, normalized_score numeric, "
+                    "unique (airdrop_window_id, address)",
+    "user_rewards_audit": "airdrop_id integer, airdrop_window_id integer, snapshot_guid text, address text, "
+                          "balance numeric, staked numeric, score numeric, normalized_score numeric, "
+                          "rewards_awarded numeric, comment text",
+    "user_rewards_audit_artifact": "airdrop_id integer, airdrop_window_id integer, snapshot_guid text, run_guid text, "
+                                   "part integer, row_count integer, format text, payload blob, "
+                                   "unique (run_guid, part)",
+    "user_rewards_run": "run_guid text unique, airdrop_id integer, airdrop_window_id integer, snapshot_guid text, "
+                        "status text, rewarded_users integer, published_at timestamp",
+    "user_rewards_staging": "run_guid text, airdrop_id integer, airdrop_window_id integer, address text, "
+                            "rewards_awarded numeric, score numeric, normalized_score numeric, "
+                            "unique (run_guid, address)",
+    "user_rewards_audit_staging": "run_guid text, airdrop_id integer, airdrop_window_id integer, snapshot_guid text, "
+                                  "address text, balance numeric, staked numeric, score numeric, "
+                                  "normalized_score numeric, rewards_awarded numeric, comment text",
+    "user_reward_score_cache": "airdrop_window_id integer, address text, balance numeric, staked numeric, "
+                               "score numeric, normalized_score numeric, unique (airdrop_window_id, address)",
+}
+
+sqlite3.register_adapter(Decimal, lambda value: int(value) if value == value.to_integral_value() else str(value))
+# Numeric columns are read back as ints or Decimals, as the DECIMAL columns of MySQL are
+sqlite3.register_converter("numeric", lambda value: int(value) if value.isdigit() or value[1:].isdigit() and value[:1] == b"-"
+                           else Decimal(value.decode()))
+
+
+def to_sqlite(query):
+    query = query.replace("%s", "?").replace("drop temporary table", "drop table")
+    query = re.sub(r"\bleast\(", "min(", query)
+    query = re.sub(r"\bgreatest\(", "max(", query)
+    query = re.sub(r"\bunhex\(\?\)", "?", query)
+    head, separator, update = query.partition(" on duplicate key update ")
+    if separator:
+        update = re.sub(r"\bvalues\((\w+)\)", r"excluded.\1", update)
+        # An upsert from a select needs a where clause, or its ON is read as a join constraint
+        insert, select, rest = head.partition(" select ")
+        if select:
+            head = f"{insert} select * from (select {rest}) where true"
+        query = head + " on conflict do update set " + update
+    return query
+
+
+class SqliteRepository:
+
+    def __init__(self, tables=TABLES):
+        self.connection = sqlite3.connect(":memory:", isolation_level=None, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.auto_commit = True
+        self.statements = []
+        for table, columns in tables.items():
+            self.connection.execute(f"create table {table} (row_id integer primary key, "
+                                    "row_created timestamp default current_timestamp, "
+                                    f"row_updated timestamp default current_timestamp, {columns})")
+
+    def __cursor(self, query, params=None):
+        self.statements.append(query)
+        return self.connection.execute(to_sqlite(query), list(params or []))
+
+    def execute(self, query, params=None):
+        cursor = self.__cursor(query, params)
+        if cursor.description is None:
+            return [cursor.rowcount, {"last_row_id": cursor.lastrowid}]
+        field_name = [field[0] for field in cursor.description]
+        return [dict(zip(field_name, values)) for values in cursor.fetchall()]
+
+    def stream(self, query, params=None, fetch_size=1000):
+        yield from self.execute(query, params)
+
+    def bulk_query(self, query, params=None):
+        self.statements.append(query)
+        return self.connection.executemany(to_sqlite(query), [list(row) for row in params]).rowcount
+
+    def bulk_insert(self, insert_clause, row_template, rows, suffix=""):
+        rows = [list(row) for row in rows]
+        if not rows:
+            return 0
+        query = insert_clause + row_template + suffix
+        self.statements.append(query)
+        self.connection.executemany(to_sqlite(query), rows)
+        return len(rows)
+
+    def begin_transaction(self):
+        self.connection.execute("begin")
+        self.auto_commit = False
+
+    def commit_transaction(self):
+        self.connection.execute("commit")
+        self.auto_commit = True
+
+    def rollback_transaction(self):
+        if self.connection.in_transaction:
+            self.connection.execute("rollback")
+        self.auto_commit = True
+
+
+def sqlite_session(airdrop_db):
+    # SQLAlchemy session on the same database, for the repositories of the API layer
+    engine = create_engine("sqlite://", creator=lambda: airdrop_db.connection, poolclass=StaticPool)
+    return Session(engine)
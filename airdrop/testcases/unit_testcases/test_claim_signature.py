@@ -0,0 +1,100 @@
+import unittest
+from http import HTTPStatus
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airdrop.application.services.airdrop_services import AirdropServices, claim_signature_lookups
+from airdrop.processor.nunet_airdrop import NunetAirdrop
+from common.signing import get_local_signer
+
+PRIVATE_KEY = "12b7972e86b2f45f130a3089ff1908d00d8fed70dc9b7b002c6656d983776001"
+CONTRACT_ADDRESS = "0x5E94577b949a56279637ff74DfcFf2C28408f049"
+TOKEN_ADDRESS = "0x765C9E1BCa00002e294c9aa9dC3F96C2a022025C"
+USER_ADDRESS = "0x164096a3878ded9c2a30c85d9c4b713d5305ab10"
+SIGNER_ADDRESS = get_local_signer(PRIVATE_KEY).address
+
+
+@patch("airdrop.application.services.airdrop_services.ClaimSignatureRepository")
+@patch("airdrop.application.services.airdrop_services.AirdropServices.get_private_key_for_generating_claim_signature",
+       return_value=PRIVATE_KEY)
+@patch("airdrop.application.services.airdrop_services.AirdropServices.load_airdrop_class", return_value=NunetAirdrop)
+@patch("airdrop.application.services.airdrop_services.AirdropWindowRepository")
+@patch("airdrop.application.services.airdrop_services.AirdropRepository")
+class ClaimSignatureTest(TestCase):
+
+    def setUp(self):
+        self.airdrop = Mock(id=1, contract_address=CONTRACT_ADDRESS, token_address=TOKEN_ADDRESS)
+        self.inputs = {"address": USER_ADDRESS, "airdrop_id": "1", "airdrop_window_id": "2"}
+        claim_signature_lookups.update(hits=0, misses=0)
+
+    def __expected_signature(self, claimable_amount, total_eligible_amount):
+        signature_format, formatted_message = NunetAirdrop(1, 2).format_and_get_claim_signature_details(
+            signature_parameters={"claimable_amount": claimable_amount, "total_eligible_amount": total_eligible_amount,
+                                  "user_address": USER_ADDRESS, "contract_address": CONTRACT_ADDRESS,
+                                  "token_address": TOKEN_ADDRESS})
+        return AirdropServices.generate_signature(PRIVATE_KEY, signature_format, formatted_message)
+
+    def __claim(self, airdrop_repository, window_repository):
+        airdrop_repository.return_value.get_airdrop_details.return_value = self.airdrop
+        window_repository.return_value.get_airdrop_window_by_id.return_value = Mock(id=2)
+        with patch.object(NunetAirdrop, "get_claimable_amount", return_value=(100, 300)):
+            return AirdropServices().airdrop_window_claim(self.inputs)
+
+    def test_claim_serves_signed_claim(self, airdrop_repository, window_repository, load_airdrop_class,
+                                       get_private_key, claim_signature_repository):
+        claim_signature_repository.return_value.get_signature.return_value = "signed"
+        status, response = self.__claim(airdrop_repository, window_repository)
+        self.assertEqual(status, HTTPStatus.OK)
+        self.assertEqual(response["signature"], "signed")
+        # Only signatures of the current key are served
+        claim_signature_repository.return_value.get_signature.assert_called_once_with(
+            2, USER_ADDRESS, 100, 300, CONTRACT_ADDRESS, TOKEN_ADDRESS, SIGNER_ADDRESS)
+        claim_signature_repository.return_value.save_signatures.assert_not_called()
+        self.assertEqual(claim_signature_lookups, {"hits": 1, "misses": 0})
+
+    def test_claim_of_changed_amounts_is_signed_and_saved(self, airdrop_repository, window_repository,
+                                                          load_airdrop_class, get_private_key,
+                                                          claim_signature_repository):
+        claim_signature_repository.return_value.get_signature.return_value = None
+        status, response = self.__claim(airdrop_repository, window_repository)
+        self.assertEqual(status, HTTPStatus.OK)
+        self.assertEqual(response["signature"], self.__expected_signature(100, 300))
+        saved, = claim_signature_repository.return_value.save_signatures.call_args.args[0]
+        self.assertEqual((saved["claimable_amount"], saved["signature"], saved["signer_address"]),
+                         (100, response["signature"], SIGNER_ADDRESS))
+
+    @patch("airdrop.application.services.airdrop_services.logger")
+    def test_claims_not_signed_ahead_are_logged(self, logger, airdrop_repository, window_repository,
+                                                load_airdrop_class, get_private_key, claim_signature_repository):
+        claim_signature_repository.return_value.get_signature.side_effect = ["signed", None, None, "signed"]
+        for _ in range(4):
+            self.__claim(airdrop_repository, window_repository)
+        self.assertEqual(claim_signature_lookups, {"hits": 2, "misses": 2})
+        messages = [call.args[0] for call in logger.info.call_args_list if "not signed ahead" in call.args[0]]
+        self.assertEqual(len(messages), 2)
+        self.assertTrue(messages[-1].endswith("2 of 3 claims missed (66.7%)"))
+
+    @patch("airdrop.application.services.airdrop_services.CLAIM_SIGNATURE_BATCH_SIZE", 2)
+    def test_sign_window_claims(self, airdrop_repository, window_repository, load_airdrop_class,
+                                get_private_key, claim_signature_repository):
+        airdrop_repository.return_value.get_airdrop_details.return_value = self.airdrop
+        repository = claim_signature_repository.return_value
+        repository.delete_unrewarded.return_value = 1
+        repository.get_unsigned_claims.return_value = [(USER_ADDRESS, 100, 300), (USER_ADDRESS, 50, 300),
+                                                       (USER_ADDRESS, 10, 10)]
+        repository.save_signatures.side_effect = len
+
+        result = AirdropServices().sign_window_claims(Mock(id=2, airdrop_id=1))
+
+        self.assertEqual(result, {"airdrop_id": 1, "airdrop_window_id": 2, "signed": 3, "deleted": 1})
+        self.assertEqual(repository.save_signatures.call_count, 2)
+        self.assertEqual(repository.get_unsigned_claims.call_args.args[3], SIGNER_ADDRESS)
+        saved = repository.save_signatures.call_args_list[0].args[0]
+        self.assertEqual({row["signer_address"] for row in saved}, {SIGNER_ADDRESS})
+        self.assertEqual([row["signature"] for row in saved],
+                         [self.__expected_signature(100, 300), self.__expected_signature(50, 300)])
+        get_private_key.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
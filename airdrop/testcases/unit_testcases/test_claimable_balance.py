@@ -0,0 +1,80 @@
+import unittest
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airdrop.infrastructure.models import ClaimHistory, UserRegistration, UserReward
+from airdrop.infrastructure.repositories.claimable_balance import _collect_changes, address_keys, claimable_amount
+from airdrop.infrastructure.repositories.user_claimable_balance_repository import UserClaimableBalanceRepository
+
+
+class ClaimableBalanceTest(TestCase):
+
+    def setUp(self):
+        self.row = {"total_rewards": Decimal(500), "claimed_amount": Decimal(120), "unclaimed_rewards": Decimal(200),
+                    "claim_started_windows": 2, "claim_open": 1}
+
+    def test_claimable_amount_per_airdrop_class(self):
+        self.assertEqual(claimable_amount(self.row, "LoyaltyAirdrop"), 380)
+        self.assertEqual(claimable_amount(self.row, "RejuveAirdrop"), 380)
+        self.assertEqual(claimable_amount(self.row), 200)
+
+    def test_nothing_is_claimable_outside_claim_period(self):
+        self.row["claim_open"] = 0
+        self.assertEqual(claimable_amount(self.row, "LoyaltyAirdrop"), 0)
+        self.assertEqual(claimable_amount(None), 0)
+
+    def test_address_keys(self):
+        keys, params = address_keys([(1, "0x1")], [(7, "0x2")])
+        self.assertEqual(keys, "SELECT :airdrop_id_0 AS airdrop_id, :address_0 AS address UNION "
+                               "SELECT airdrop_id, :window_address_0 AS address FROM airdrop_window "
+                               "WHERE row_id = :window_id_0")
+        self.assertEqual(params, {"airdrop_id_0": 1, "address_0": "0x1", "window_id_0": 7, "window_address_0": "0x2"})
+
+    def test_flushed_claims_registrations_and_rewards_are_collected(self):
+        session = Mock(info={})
+        session.new = [ClaimHistory(airdrop_id=1, address="0x1"), UserReward(airdrop_id=1, address="0x3")]
+        session.dirty = [UserRegistration(airdrop_window_id=7, address="0x2")]
+        session.deleted = []
+        _collect_changes(session, None)
+        self.assertEqual(session.info["claimable_balance_keys"], ({(1, "0x1"), (1, "0x3")}, {(7, "0x2")}))
+
+
+@patch("airdrop.infrastructure.repositories.user_claimable_balance_repository.refresh_claimable_balances")
+class UserClaimableBalanceRepositoryTest(TestCase):
+
+    def setUp(self):
+        self.repository = UserClaimableBalanceRepository()
+        self.repository.session = Mock()
+        self.row = {"total_rewards": Decimal(500), "claimed_amount": Decimal(120), "unclaimed_rewards": Decimal(200),
+                    "claim_started_windows": 2, "current_claim_started_windows": 2, "claim_open": 1,
+                    "has_rewards": 1}
+
+    def __read(self, *rows):
+        self.repository.session.execute.return_value.mappings.return_value.first.side_effect = rows
+
+    def test_missing_row_without_rewards_is_not_inserted(self, refresh_claimable_balances):
+        self.__read({**self.row, "total_rewards": None, "claimed_amount": None, "unclaimed_rewards": None,
+                     "claim_started_windows": None, "has_rewards": 0})
+        self.assertEqual(self.repository.get_claimable_amount(1, "0x1"), 0)
+        refresh_claimable_balances.assert_not_called()
+
+    def test_missing_row_with_rewards_is_computed(self, refresh_claimable_balances):
+        self.__read({**self.row, "total_rewards": None, "claimed_amount": None, "unclaimed_rewards": None,
+                     "claim_started_windows": None}, self.row)
+        self.assertEqual(self.repository.get_claimable_amount(1, "0x1"), 200)
+        refresh_claimable_balances.assert_called_once()
+
+    def test_stale_row_is_refreshed(self, refresh_claimable_balances):
+        self.__read({**self.row, "claim_started_windows": 1}, self.row)
+        self.assertEqual(self.repository.get_claimable_amount(1, "0x1"), 200)
+        refresh_claimable_balances.assert_called_once()
+
+    def test_current_row_is_read(self, refresh_claimable_balances):
+        self.__read(self.row)
+        self.assertEqual(self.repository.get_claimable_amount(1, "0x1", "LoyaltyAirdrop"), 380)
+        refresh_claimable_balances.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
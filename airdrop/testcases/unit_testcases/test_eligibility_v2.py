@@ -0,0 +1,69 @@
+import unittest
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airdrop.application.services.user_registration_services import UserRegistrationServices
+from airdrop.constants import AirdropClaimStatus, UserClaimStatus
+
+ADDRESS = "0x46EF7d49aaA68B29C227442BDbD18356415f8304"
+
+
+@patch("airdrop.application.services.user_registration_services.ClaimHistoryRepository")
+@patch("airdrop.application.services.user_registration_services.CommonLogicService")
+@patch("airdrop.application.services.user_registration_services.AirdropServices")
+@patch("airdrop.application.services.user_registration_services.AirdropWindowRepository")
+@patch("airdrop.application.services.user_registration_services.AirdropRepository")
+class EligibilityV2Test(TestCase):
+
+    def setUp(self):
+        claim_started = datetime.utcnow() - timedelta(days=1)
+        self.windows = [Mock(id=window_id, claim_start_period=claim_started) for window_id in (1, 2, 3)]
+        self.airdrop_object = Mock()
+        self.airdrop_object.to_checksum_address_if_ethereum.return_value = ADDRESS
+        self.airdrop_object.generate_multiple_windows_eligibility_response.return_value = {}
+
+    def __call_eligibility_v2(self, airdrop_repository, window_repository, airdrop_services):
+        airdrop_repository.return_value.fetch_total_rewards_amount.return_value = 100
+        window_repository.return_value.get_airdrop_windows.return_value = self.windows
+        airdrop_services.load_airdrop_class.return_value.return_value = self.airdrop_object
+        return UserRegistrationServices.eligibility_v2({"airdrop_id": 1, "address": ADDRESS})
+
+    def test_windows_are_read_in_one_batch(self, airdrop_repository, window_repository, airdrop_services,
+                                           common_logic_service, claim_history_repository):
+        registration = Mock(receipt_generated="receipt", reject_reason=None, signature_details={},
+                            registered_at=datetime.utcnow())
+        common_logic_service.get_user_registrations_for_windows.return_value = {1: [registration], 2: [registration],
+                                                                                  3: []}
+        claim_history_repository.return_value.get_last_claims_for_windows.return_value = {
+            (1, "token_transfer"): Mock(transaction_status=AirdropClaimStatus.SUCCESS.value),
+            (2, "ada_transfer"): Mock(transaction_status=AirdropClaimStatus.PENDING.value)
+        }
+
+        status, _ = self.__call_eligibility_v2(airdrop_repository, window_repository, airdrop_services)
+
+        self.assertEqual(status, HTTPStatus.OK)
+        common_logic_service.get_user_registrations_for_windows.assert_called_once_with(
+            address=ADDRESS, airdrop_window_ids=[1, 2, 3])
+        claim_history_repository.return_value.get_last_claims_for_windows.assert_called_once()
+        windows_registration_data = self.airdrop_object.generate_multiple_windows_eligibility_response \
+            .call_args.kwargs["windows_registration_data"]
+        self.assertEqual([data.claim_status for data in windows_registration_data],
+                         [UserClaimStatus.RECEIVED, UserClaimStatus.PENDING, UserClaimStatus.NOT_REGISTERED])
+        self.assertEqual(windows_registration_data[0].registration_details.registration_id, "receipt")
+        self.assertIsNone(windows_registration_data[2].registration_details)
+
+    def test_multiple_registrations_of_a_window(self, airdrop_repository, window_repository, airdrop_services,
+                                                common_logic_service, claim_history_repository):
+        common_logic_service.get_user_registrations_for_windows.return_value = {1: [Mock(), Mock()], 2: [], 3: []}
+        claim_history_repository.return_value.get_last_claims_for_windows.return_value = {}
+
+        status, response = self.__call_eligibility_v2(airdrop_repository, window_repository, airdrop_services)
+
+        self.assertEqual(status, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(response, "Something wrong with user registration")
+
+
+if __name__ == '__main__':
+    unittest.main()
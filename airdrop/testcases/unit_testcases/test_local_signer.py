@@ -0,0 +1,36 @@
+import unittest
+from unittest import TestCase
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+from web3 import Web3
+
+from common.signing import get_local_signer
+
+PRIVATE_KEY = "0aecc010b70ec65590fbfcb5c8c2936d994ff713e67268f12ca6499691c5a1e0"
+
+
+class LocalSignerTest(TestCase):
+
+    def setUp(self):
+        self.digests = [Web3.solidity_keccak(["string", "uint256"], ["__airdropclaim", amount])
+                        for amount in (1, 2, 3)]
+
+    def test_signature_matches_sign_message(self):
+        expected = Account.sign_message(encode_defunct(self.digests[0]), private_key=PRIVATE_KEY).signature
+        self.assertEqual(get_local_signer(PRIVATE_KEY).sign_digest(self.digests[0]), expected)
+        self.assertEqual(get_local_signer(PRIVATE_KEY).sign_solidity(["string", "uint256"], ["__airdropclaim", 1]),
+                         expected)
+
+    def test_batch_signing(self):
+        signer = get_local_signer(PRIVATE_KEY)
+        self.assertEqual(signer.sign_digests(self.digests), [signer.sign_digest(digest) for digest in self.digests])
+        self.assertEqual(signer.sign_digests([]), [])
+
+    def test_signer_is_reused_per_key(self):
+        self.assertIs(get_local_signer(PRIVATE_KEY), get_local_signer(PRIVATE_KEY))
+        self.assertEqual(get_local_signer(PRIVATE_KEY).address, Account.from_key(PRIVATE_KEY).address)
+
+
+if __name__ == '__main__':
+    unittest.main()
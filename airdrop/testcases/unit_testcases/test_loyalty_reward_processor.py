@@ -0,0 +1,83 @@
+import random
+import unittest
+from unittest import TestCase
+from unittest.mock import patch
+
+from airdrop.config import TOKEN_SNAPSHOT_DB_CONFIG
+from airdrop.job.reward_processors.loyalty_reward_processor import LoyaltyEligibilityProcessor
+from airdrop.testcases.sqlite_repository import SqliteRepository
+
+TOKEN_SNAPSHOT_TABLES = {
+    "staking_token_snapshots": "staker_address text, balance_in_cogs integer",
+    "token_snapshots_00MINS": "wallet_address text, balance_in_cogs integer, is_contract integer",
+}
+
+
+def load_token_snapshots(repository, schema=None):
+    prefix = f"`{schema}`." if schema else ""
+    generator = random.Random(3)
+    wallets = [(f"0x{index:040x}", generator.randrange(10 ** 8, 10 ** 16), 0) for index in range(400)]
+    # Stakers with and without a wallet, some below the 10 AGIX minimum
+    stakers = [(f"0x{index:040x}", generator.randrange(10 ** 8, 10 ** 16)) for index in range(300, 600)]
+    repository.bulk_insert(f"insert into {prefix}token_snapshots_00MINS (wallet_address, balance_in_cogs, is_contract) "
+                           "values ", "(%s,%s,%s)", wallets)
+    repository.bulk_insert(f"insert into {prefix}staking_token_snapshots (staker_address, balance_in_cogs) values ",
+                           "(%s,%s)", stakers)
+
+
+@patch("airdrop.job.reward_processors.loyalty_reward_processor.Repository")
+class LoyaltyRewardParityTest(TestCase):
+
+    def __rewards(self, repository, cross_schema=False, **options):
+        airdrop_db = SqliteRepository()
+        token_snapshot_db = SqliteRepository(TOKEN_SNAPSHOT_TABLES)
+        if cross_schema:
+            schema = TOKEN_SNAPSHOT_DB_CONFIG["DB_NAME"]
+            airdrop_db.connection.execute(f"attach database ':memory:' as `{schema}`")
+            for table, columns in TOKEN_SNAPSHOT_TABLES.items():
+                airdrop_db.connection.execute(f"create table `{schema}`.{table} ({columns})")
+            load_token_snapshots(airdrop_db, schema)
+        else:
+            load_token_snapshots(token_snapshot_db)
+        repository.side_effect = [airdrop_db, token_snapshot_db]
+        processor = LoyaltyEligibilityProcessor(1, 2, cross_schema=cross_schema, batch_size=64, **options)
+        processor.total_no_of_windows = 3
+        if options.get("server_side"):
+            response = processor._LoyaltyEligibilityProcessor__compute_rewards_server_side()
+        elif options.get("streaming"):
+            response = processor._LoyaltyEligibilityProcessor__stream_rewards()
+        else:
+            response = processor._LoyaltyEligibilityProcessor__compute_rewards()
+        rows = airdrop_db.execute("select address, rewards_awarded from user_rewards where airdrop_window_id = 2 "
+                                  "order by address")
+        return response, {row["address"]: row["rewards_awarded"] for row in rows}, airdrop_db, token_snapshot_db
+
+    def test_server_side_rewards_match_python_rewards(self, repository):
+        response, expected, _, _ = self.__rewards(repository)
+        self.assertEqual(response, f"{len(expected)} users are eligible for claim on airdrop_id=1, window_id=2")
+        self.assertGreater(len(expected), 400)
+        self.assertTrue(all(isinstance(reward, int) and reward > 0 for reward in expected.values()))
+
+        self.assertEqual(self.__rewards(repository, streaming=True)[:2], (response, expected))
+        self.assertEqual(self.__rewards(repository, server_side=True)[:2], (response, expected))
+        self.assertEqual(self.__rewards(repository, server_side=True, cross_schema=True)[:2], (response, expected))
+
+    def test_snapshot_union_is_evaluated_once(self, repository):
+        _, _, airdrop_db, token_snapshot_db = self.__rewards(repository, server_side=True, cross_schema=True)
+        self.assertEqual(sum(statement.count("UNION") for statement in airdrop_db.statements), 1)
+        self.assertEqual(token_snapshot_db.statements, [])
+
+        _, _, airdrop_db, token_snapshot_db = self.__rewards(repository, server_side=True)
+        self.assertEqual(sum(statement.count("UNION") for statement in airdrop_db.statements), 0)
+        self.assertEqual(sum(statement.count("UNION") for statement in token_snapshot_db.statements), 1)
+
+    def test_snapshots_are_staged_unless_cross_schema_is_requested(self, repository):
+        _, _, airdrop_db, token_snapshot_db = self.__rewards(repository, server_side=True)
+
+        self.assertFalse(any(TOKEN_SNAPSHOT_DB_CONFIG["DB_NAME"] in statement for statement in airdrop_db.statements))
+        reads = [statement for statement in token_snapshot_db.statements if not statement.startswith("insert")]
+        self.assertEqual(len(reads), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import unittest
+from datetime import datetime, timedelta
+from http import HTTPStatus
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from web3 import Web3
+
+from airdrop.application.services.airdrop_services import AirdropServices
+from airdrop.constants import MerkleDistributionStatus
+from airdrop.job.merkle_distribution import MerkleDistributionBuilder
+from airdrop.processor.merkle_airdrop import NunetMerkleAirdrop
+from common.merkle import MerkleTree, decode_leaf, encode_leaf, leaf_hash, unpack_proof, verify_proof
+
+USER_ADDRESS = "0x164096A3878DEd9C2A30c85D9c4b713d5305Ab10"
+
+
+def address(index):
+    return f"0x{index + 1:040x}"
+
+
+class MerkleTreeTest(TestCase):
+
+    def test_leaf_is_keccak_of_packed_claim(self):
+        expected = Web3.solidity_keccak(["address", "uint256", "uint256"], [USER_ADDRESS, 10 ** 18, 3])
+        self.assertEqual(leaf_hash(USER_ADDRESS, 10 ** 18, 3), bytes(expected))
+        self.assertEqual(decode_leaf(encode_leaf(USER_ADDRESS, 10 ** 18, 3)), (USER_ADDRESS.lower(), 10 ** 18, 3))
+
+    def test_every_proof_verifies_against_root(self):
+        for leaf_count in (1, 2, 3, 5, 8, 13):
+            tree = MerkleTree()
+            leaves = [leaf_hash(address(index), index + 1, 1) for index in range(leaf_count)]
+            for leaf in leaves:
+                tree.add_leaf(leaf)
+            root = tree.build()
+            for index, leaf in enumerate(leaves):
+                proof = tree.proof(index)
+                self.assertEqual(len(unpack_proof(proof)), len(proof) // 32)
+                self.assertTrue(verify_proof(proof, root, leaf), f"leaf {index} of {leaf_count}")
+            self.assertFalse(verify_proof(tree.proof(0), root, leaf_hash(address(0), 2, 1)))
+
+    def test_tree_without_leaves_is_rejected(self):
+        with self.assertRaises(ValueError):
+            MerkleTree().build()
+
+
+class MerkleDistributionBuilderTest(TestCase):
+
+    def setUp(self):
+        self.airdrop_db = Mock()
+        self.airdrop_db.execute.return_value = [1, {"last_row_id": 7}]
+        self.airdrop_db.stream.return_value = iter(
+            [{"airdrop_window_id": 1, "address": address(index), "rewards_awarded": 100 + index}
+             for index in range(5)] +
+            [{"airdrop_window_id": 1, "address": "addr1qx2kd28nq8ac5prwg32hhvudlwggpgfp8utlyqxu6wqgz62f79qsdmm5d",
+              "rewards_awarded": 100}])
+
+    def test_build_stores_root_and_proofs(self):
+        rows = []
+        self.airdrop_db.bulk_insert.side_effect = lambda insert_clause, row_template, batch: rows.extend(batch)
+        self.airdrop_db.execute.side_effect = [[1, {"last_row_id": 7}], [1, {"last_row_id": 0}], []]
+        result = MerkleDistributionBuilder(self.airdrop_db, 1, buffer_size=2).build()
+
+        self.assertEqual((result["leaf_count"], result["depth"], result["skipped_addresses"]), (5, 3, 1))
+        self.assertEqual(self.airdrop_db.bulk_insert.call_count, 3)
+        self.assertEqual(len(rows), 5)
+        root = bytes.fromhex(result["merkle_root"][2:])
+        for distribution_id, window_id, claim_address, amount, proof in rows:
+            self.assertEqual(distribution_id, 7)
+            self.assertTrue(verify_proof(bytes.fromhex(proof), root, leaf_hash(claim_address, amount, window_id)))
+
+    def test_failed_build_is_discarded(self):
+        self.airdrop_db.bulk_insert.side_effect = Exception("lock wait timeout")
+        with self.assertRaises(Exception):
+            MerkleDistributionBuilder(self.airdrop_db, 1).build()
+        statements = [call.args[0] for call in self.airdrop_db.execute.call_args_list]
+        self.assertTrue(any(statement.startswith("delete from merkle_proof") for statement in statements))
+        self.assertEqual(self.airdrop_db.execute.call_args_list[-1].args[1][0], MerkleDistributionStatus.FAILED.value)
+
+
+@patch("airdrop.application.services.airdrop_services.secret_provider")
+@patch("airdrop.application.services.airdrop_services.MerkleProofRepository")
+@patch("airdrop.application.services.airdrop_services.AirdropServices.load_airdrop_class",
+       return_value=NunetMerkleAirdrop)
+@patch("airdrop.application.services.airdrop_services.AirdropWindowRepository")
+@patch("airdrop.application.services.airdrop_services.AirdropRepository")
+class MerkleClaimTest(TestCase):
+
+    def setUp(self):
+        self.inputs = {"address": USER_ADDRESS, "airdrop_id": "1", "airdrop_window_id": "2"}
+        now = datetime.utcnow()
+        self.window = Mock(id=2, claim_start_period=now - timedelta(days=1), claim_end_period=now + timedelta(days=1))
+
+    def test_claim_serves_proof_without_secrets(self, airdrop_repository, window_repository, load_airdrop_class,
+                                                merkle_proof_repository, secret_provider):
+        airdrop_repository.return_value.get_airdrop_details.return_value = Mock(id=1)
+        window_repository.return_value.get_airdrop_window_by_id.return_value = self.window
+        proof = bytes(range(64))
+        merkle_proof_repository.return_value.get_proof.return_value = Mock(
+            merkle_root="0x" + "ab" * 32, amount=100, proof=proof)
+
+        status, response = AirdropServices().airdrop_window_claim(self.inputs)
+
+        self.assertEqual(status, HTTPStatus.OK)
+        self.assertEqual(response["claimable_amount"], "100")
+        self.assertEqual(response["merkle_proof"], ["0x" + proof[:32].hex(), "0x" + proof[32:].hex()])
+        merkle_proof_repository.return_value.get_proof.assert_called_once_with(1, 2, USER_ADDRESS)
+        secret_provider.get_secret.assert_not_called()
+
+    def test_claim_without_proof_fails(self, airdrop_repository, window_repository, load_airdrop_class,
+                                       merkle_proof_repository, secret_provider):
+        airdrop_repository.return_value.get_airdrop_details.return_value = Mock(id=1)
+        window_repository.return_value.get_airdrop_window_by_id.return_value = self.window
+        merkle_proof_repository.return_value.get_proof.return_value = None
+
+        status, _ = AirdropServices().airdrop_window_claim(self.inputs)
+
+        self.assertEqual(status, HTTPStatus.BAD_REQUEST)
+
+    def test_no_proof_outside_claim_period(self, airdrop_repository, window_repository, load_airdrop_class,
+                                           merkle_proof_repository, secret_provider):
+        airdrop_repository.return_value.get_airdrop_details.return_value = Mock(id=1)
+        self.window.claim_start_period = datetime.utcnow() + timedelta(hours=1)
+        window_repository.return_value.get_airdrop_window_by_id.return_value = self.window
+
+        status, response = AirdropServices().airdrop_window_claim(self.inputs)
+
+        self.assertEqual(status, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(response, "Airdrop window is not open for claims")
+        merkle_proof_repository.return_value.get_proof.assert_not_called()
+
+    def test_no_proof_for_claimed_or_pending_window(self, airdrop_repository, window_repository, load_airdrop_class,
+                                                    merkle_proof_repository, secret_provider):
+        airdrop_repository.return_value.get_airdrop_details.return_value = Mock(id=1)
+        airdrop_repository.return_value.is_claimed_airdrop_window.side_effect = \
+            Exception("Airdrop Already claimed / pending")
+        window_repository.return_value.get_airdrop_window_by_id.return_value = self.window
+
+        status, response = AirdropServices().airdrop_window_claim(self.inputs)
+
+        self.assertEqual(status, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(response, "Airdrop Already claimed / pending")
+        airdrop_repository.return_value.is_claimed_airdrop_window.assert_called_once_with(USER_ADDRESS, 2)
+        merkle_proof_repository.return_value.get_proof.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
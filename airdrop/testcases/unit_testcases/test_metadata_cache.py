@@ -0,0 +1,90 @@
+import unittest
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airdrop.infrastructure.models import AirdropWindow
+from airdrop.infrastructure.repositories.airdrop_repository import AirdropRepository
+from airdrop.infrastructure.repositories.airdrop_window_repository import AirdropWindowRepository
+from airdrop.infrastructure.repositories.metadata_cache import airdrop_metadata_cache
+from common.cache import TTLCache
+
+
+class TTLCacheTest(TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.cache = TTLCache("test", 60, clock=lambda: self.now)
+        self.loader = Mock(return_value="value")
+
+    def test_entries_expire(self):
+        self.assertEqual(self.cache.get("key", self.loader), "value")
+        self.now = 59
+        self.assertEqual(self.cache.get("key", self.loader), "value")
+        self.now = 60
+        self.cache.get("key", self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+        self.assertEqual(self.cache.stats(), {"name": "test", "size": 1, "hits": 1, "misses": 2})
+
+    def test_empty_values_are_not_cached(self):
+        self.loader.return_value = None
+        self.cache.get("key", self.loader)
+        self.cache.get("key", self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+
+    def test_callers_get_copies(self):
+        self.loader.return_value = {"windows": [1, 2]}
+        self.cache.get("key", self.loader)["windows"].append(3)
+        self.cache.get("key", self.loader)["windows"].append(4)
+        self.assertEqual(self.cache.get("key", self.loader), {"windows": [1, 2]})
+
+    @patch("common.cache.logger")
+    def test_stats_are_logged(self, logger):
+        cache = TTLCache("test", 60, clock=lambda: self.now, stats_log_interval=2)
+        for _ in range(4):
+            cache.get("key", self.loader)
+        self.assertEqual([call.args[0] for call in logger.info.call_args_list],
+                         ["Cache test: 1 hits, 1 misses, 1 entries", "Cache test: 3 hits, 1 misses, 1 entries"])
+
+    def test_invalidate(self):
+        self.cache.get("key", self.loader)
+        self.cache.invalidate("key", "unknown")
+        self.cache.get("key", self.loader)
+        self.assertEqual(self.loader.call_count, 2)
+
+
+class MetadataCacheTest(TestCase):
+
+    def setUp(self):
+        airdrop_metadata_cache.clear()
+        self.window = AirdropWindow(id=3, airdrop_id=1, minimum_stake_amount=0)
+        self.session = Mock()
+        self.session.query.return_value.filter.return_value.first.return_value = self.window
+
+    def tearDown(self):
+        airdrop_metadata_cache.clear()
+
+    def test_window_is_read_once(self):
+        repository = AirdropWindowRepository()
+        repository.session = self.session
+        window = repository.get_airdrop_window_by_id(3)
+        self.assertEqual((window.id, window.airdrop_id), (3, 1))
+        self.assertIsNot(window, self.window)
+        # Changes of a caller are not seen by the next one
+        window.minimum_stake_amount = 100
+        self.assertEqual(repository.get_airdrop_window_by_id(3).minimum_stake_amount, 0)
+        self.session.query.assert_called_once()
+        self.session.expunge.assert_not_called()
+
+    def test_minimum_stake_update_invalidates_window(self):
+        window_repository = AirdropWindowRepository()
+        window_repository.session = self.session
+        airdrop_repository = AirdropRepository()
+        airdrop_repository.session = self.session
+        window_repository.get_airdrop_window_by_id(3)
+        airdrop_repository.update_minimum_stake_amount(3, 100)
+        self.assertEqual(window_repository.get_airdrop_window_by_id(3).minimum_stake_amount, 100)
+        self.assertEqual(self.session.query.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
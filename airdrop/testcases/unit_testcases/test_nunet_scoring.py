@@ -0,0 +1,182 @@
+import math
+import random
+import unittest
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import patch
+
+from airdrop.constants import SnapshotStorage
+
+import numpy as np
+
+from airdrop.job.reward_processors.nunet_reward_processor import NunetRewardProcessor, UserRewardObject
+from airdrop.job.reward_processors.nunet_scoring import allocate_rewards, micro_to_decimal, score_holders
+from airdrop.job.snapshot_writer import SnapshotWriter
+from airdrop.testcases.sqlite_repository import SqliteRepository
+
+
+class NunetScoringParity(TestCase):
+
+    def setUp(self):
+        random.seed(42)
+        self.balances = []
+        self.staked = []
+        for _ in range(20000):
+            balance = random.randrange(0, 10 ** random.randint(9, 17))
+            staked = random.randrange(0, 10 ** random.randint(1, 17)) if random.random() < 0.5 else 0
+            if random.random() < 0.1:
+                # Land exactly on the half-way point of the 6th score decimal
+                staked += (25000000 - (5 * balance + staked) % 50000000) % 50000000
+            self.balances.append(balance)
+            self.staked.append(staked)
+
+    def test_scores_match_decimal_results(self):
+        score_micro, log10_micro = score_holders(np.array(self.balances), np.array(self.staked))
+        for index, (balance, staked) in enumerate(zip(self.balances, self.staked)):
+            user = UserRewardObject(f"0x{index}", balance, staked)
+            self.assertEqual(getattr(user, "_score"), micro_to_decimal(score_micro[index]))
+            self.assertEqual(getattr(user, "_log10_score"), micro_to_decimal(log10_micro[index]))
+
+    def test_decimal_balances_are_held_as_ints(self):
+        user = UserRewardObject("0x1", Decimal(self.balances[0]), Decimal(self.staked[0]))
+        self.assertIs(type(getattr(user, "_balance_cogs")), int)
+        self.assertIs(type(getattr(user, "_staked_cogs")), int)
+        self.assertEqual(getattr(user, "_score"), getattr(UserRewardObject("0x1", self.balances[0], self.staked[0]), "_score"))
+
+    def test_rewards_match_decimal_results(self):
+        tokens_to_distribute = Decimal(12500000 * 1000000 - 987654321)
+        users = [UserRewardObject(f"0x{index}", balance, staked)
+                 for index, (balance, staked) in enumerate(zip(self.balances, self.staked))]
+        eligible = np.array([index % 7 != 0 for index in range(len(users))])
+        sum_of_log_values = sum(getattr(user, "_log10_score") for index, user in enumerate(users) if eligible[index])
+
+        _, log10_micro = score_holders(np.array(self.balances), np.array(self.staked))
+        rewards, sum_of_log_micro = allocate_rewards(log10_micro, eligible, tokens_to_distribute)
+
+        self.assertEqual(sum_of_log_values, micro_to_decimal(sum_of_log_micro))
+        for index, user in enumerate(users):
+            if not eligible[index]:
+                self.assertEqual(rewards[index], 0)
+                continue
+            expected = Decimal(math.floor(getattr(user, "_log10_score") / sum_of_log_values * tokens_to_distribute))
+            self.assertEqual(expected, Decimal(int(rewards[index])))
+
+
+@patch("airdrop.job.reward_processors.nunet_reward_processor.UserClaimableBalanceRepository")
+class NunetProcessorParity(TestCase):
+
+    def __process_rewards(self, **options):
+        random.seed(7)
+        airdrop_db = SqliteRepository()
+        for snapshot in ("snapshot-1", "snapshot-2"):
+            airdrop_db.bulk_insert(
+                "insert into user_balance_snapshot (airdrop_window_id, address, balance, staked, total, snapshot_guid) values ",
+                "(%s,%s,%s,%s,%s,%s)",
+                [(1, f"0x{index}", balance, staked, balance + staked, snapshot)
+                 for index, balance, staked in ((index, random.randrange(2 * 10 ** 11, 10 ** 16),
+                                                 random.randrange(0, 10 ** 15)) for index in range(2000))
+                 # Some holders are missing from the last snapshot and are not rewarded
+                 if snapshot == "snapshot-1" or index % 100 != 0])
+        NunetRewardProcessor(airdrop_db, 1, 1, "snapshot-2", **options).process_rewards(False)
+        rewards = airdrop_db.execute("select address, rewards_awarded, score, normalized_score from user_rewards order by address")
+        audit = airdrop_db.execute("select address, balance, staked, score, normalized_score, rewards_awarded, comment "
+                                   "from user_rewards_audit order by address")
+        return [tuple(row.values()) for row in rewards], [tuple(row.values()) for row in audit]
+
+    def test_vectorized_run_writes_decimal_results(self, claimable_balance_repository):
+        rewards, audit = self.__process_rewards()
+
+        self.assertEqual(self.__process_rewards(vectorized_scoring=True), (rewards, audit))
+        self.assertEqual(len(audit), 2000)
+        self.assertTrue(any(row[6] is not None for row in audit))
+        self.assertTrue(any(row[1] > 0 for row in rewards))
+
+
+
+@patch("airdrop.job.reward_processors.nunet_reward_processor.UserClaimableBalanceRepository")
+class NunetIncrementalRewards(TestCase):
+
+    def setUp(self):
+        random.seed(11)
+        self.holders = {f"0x{index}": (random.randrange(2 * 10 ** 11, 10 ** 16), random.randrange(0, 10 ** 15))
+                        for index in range(200)}
+        self.airdrop_db = SqliteRepository()
+        self.snapshots = 0
+
+    def __write_snapshot(self, airdrop_db=None):
+        airdrop_db = airdrop_db or self.airdrop_db
+        guid = f"snapshot-{self.snapshots}"
+        with SnapshotWriter(airdrop_db, guid, [1], storage=SnapshotStorage.SHARED) as writer:
+            for address, (balance, staked) in self.holders.items():
+                writer.add_holder(address, balance, staked, balance + staked)
+        return guid
+
+    def __process(self, guid):
+        # Counts the users that were scored from their balances rather than from the cache
+        with patch("airdrop.job.reward_processors.nunet_reward_processor.UserRewardObject",
+                   wraps=UserRewardObject) as user_reward_object:
+            self.airdrop_db.statements.clear()
+            NunetRewardProcessor(self.airdrop_db, 1, 1, guid, incremental=True, vectorized_scoring=False) \
+                .process_rewards(False)
+        return user_reward_object.call_count
+
+    def __rewards(self, airdrop_db):
+        rows = airdrop_db.execute("select address, rewards_awarded, score, normalized_score from user_rewards "
+                                  "where rewards_awarded > 0 order by address")
+        return [tuple(row.values()) for row in rows]
+
+    def __full_run_rewards(self, snapshots):
+        airdrop_db = SqliteRepository()
+        self.snapshots = 0
+        for _ in range(snapshots):
+            guid = self.__write_snapshot(airdrop_db)
+            self.snapshots += 1
+        NunetRewardProcessor(airdrop_db, 1, 1, guid).process_rewards(False)
+        return self.__rewards(airdrop_db)
+
+    def __audited_users(self):
+        return self.airdrop_db.execute("select sum(row_count) as users from user_rewards_audit_artifact "
+                                       "where run_guid = (select run_guid from user_rewards_audit_artifact "
+                                       "order by row_id desc limit 1)")[0]["users"]
+
+    def __writes(self, table):
+        return [statement for statement in self.airdrop_db.statements if statement.startswith(f"insert into {table} ")]
+
+    def test_incremental_runs_cannot_be_staged(self, claimable_balance_repository):
+        with self.assertRaises(Exception):
+            NunetRewardProcessor(self.airdrop_db, 1, 1, "snapshot-0", incremental=True, staged_publish=True)
+        self.assertEqual(self.airdrop_db.statements, [])
+
+    def test_cache_miss_hit_and_change(self, claimable_balance_repository):
+        guid = self.__write_snapshot()
+        self.snapshots += 1
+        # Cache miss: every holder is scored and cached
+        self.assertEqual(self.__process(guid), len(self.holders))
+        cached = self.airdrop_db.execute("select count(*) as cached from user_reward_score_cache")[0]["cached"]
+        self.assertEqual(cached, len(self.holders))
+        self.assertEqual(self.__audited_users(), len(self.holders))
+
+        # Cache hit: nothing is rescored and no reward changes
+        self.assertEqual(self.__process(guid), 0)
+        self.assertEqual(self.__writes("user_rewards"), [])
+        self.assertEqual(self.__writes("user_reward_score_cache"), [])
+        self.assertEqual(self.__audited_users(), len(self.holders))
+
+        # Change: a lower balance in a new snapshot rescores only that holder
+        balance, staked = self.holders["0x7"]
+        self.holders["0x7"] = (balance // 2, staked)
+        guid = self.__write_snapshot()
+        self.snapshots += 1
+        self.assertEqual(self.__process(guid), 1)
+        # Balances of aggregated windows are the minimum totals
+        cached = self.airdrop_db.execute("select balance from user_reward_score_cache where address = %s", ["0x7"])
+        self.assertEqual(cached[0]["balance"], balance // 2 + staked)
+        self.assertEqual(len(self.__writes("user_balance_snapshot_aggregate")), 1)
+        self.assertFalse(any("sum(occurrences)" in statement for statement in self.airdrop_db.statements))
+        self.assertEqual(self.__audited_users(), len(self.holders))
+
+        self.assertEqual(self.__rewards(self.airdrop_db), self.__full_run_rewards(self.snapshots))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airdrop.job.reward_processors.rejuve_reward_processor import RejuveRewardProcessor
+from airdrop.processor.rejuve_airdrop import RejuveAirdrop
+
+SHELLEY_ADDRESS = "addr1qxzvn6ygdr7ae4he4yq0aj7e6lcs5lj7q4dnjud7r6ysdduye85gs68amnt0n2gqlm9an4l3pfl9up2m89cmu85fq6msg0vk4s"
+
+
+@patch("airdrop.job.reward_processors.rejuve_reward_processor.AirdropServices.load_airdrop_class",
+       return_value=RejuveAirdrop)
+@patch("airdrop.job.reward_processors.rejuve_reward_processor.UserClaimableBalanceRepository")
+@patch("airdrop.job.reward_processors.rejuve_reward_processor.UserRewardRepository")
+@patch("airdrop.job.reward_processors.rejuve_reward_processor.AirdropWindowRepository")
+@patch("airdrop.job.reward_processors.rejuve_reward_processor.AirdropRepository")
+class RejuveRewardProcessorTest(TestCase):
+
+    def __processor(self, airdrop_repository, airdrop_window_repository, user_reward_repository, dry_run):
+        airdrop_repository.return_value.get_airdrop_window_details.return_value = Mock(
+            airdrop_id=1, total_airdrop_tokens=1000)
+        airdrop_window_repository.return_value.get_airdrop_windows.return_value = [Mock(id=2)]
+        rewards = user_reward_repository.return_value
+        rewards.get_ethereum_registrations_balances.return_value = [
+            Mock(address="0x1", balance=Decimal(10 ** 9), staked=Decimal(0))]
+        rewards.get_cardano_registrations.return_value = [
+            Mock(address=SHELLEY_ADDRESS, payment_part=None, staking_part=None)]
+        rewards.get_cardano_registrations_balances.return_value = []
+        rewards.get_window_rewards.return_value = {}
+        return RejuveRewardProcessor(1, 2, "snapshot", dry_run=dry_run)
+
+    def test_dry_run_writes_nothing(self, airdrop_repository, airdrop_window_repository, user_reward_repository,
+                                    claimable_balance_repository, load_airdrop_class):
+        processor = self.__processor(airdrop_repository, airdrop_window_repository, user_reward_repository, True)
+
+        diff = processor.process_user_rewards()
+
+        self.assertEqual(diff["added"], 1)
+        user_reward_repository.return_value.upsert_user_rewards.assert_not_called()
+        claimable_balance_repository.return_value.refresh_window.assert_not_called()
+
+    def test_registration_parts_are_decoded_for_matching_only(self, airdrop_repository, airdrop_window_repository,
+                                                              user_reward_repository, claimable_balance_repository,
+                                                              load_airdrop_class):
+        processor = self.__processor(airdrop_repository, airdrop_window_repository, user_reward_repository, False)
+
+        processor.process_user_rewards()
+
+        byron, shelley = user_reward_repository.return_value.get_cardano_registrations_balances.call_args_list
+        self.assertIsNone(byron.kwargs["registration_parts"])
+        payment_part, staking_part = shelley.kwargs["registration_parts"][SHELLEY_ADDRESS]
+        self.assertTrue(payment_part and staking_part)
+        user_reward_repository.return_value.upsert_user_rewards.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import Mock
+
+import pymysql
+import pymysql.cursors
+
+from airdrop.infrastructure.repositories.user_reward_audit_repository import AUDIT_ARTIFACT_FORMAT, \
+    encode_audit_artifact
+from airdrop.job.repository import Repository
+
+
+class RecordingCursor(pymysql.cursors.Cursor):
+    # Escapes arguments like pymysql and keeps the statements, encoded as they are sent, instead of sending them
+    def execute(self, query, args=None):
+        if args is not None:
+            query = self.mogrify(query, args)
+        self.connection.statements.append(query.encode(self.connection.encoding, "surrogateescape"))
+        if self.connection.fail_on is not None and len(self.connection.statements) == self.connection.fail_on:
+            raise pymysql.err.OperationalError(1205, "Lock wait timeout exceeded")
+        return query.count("),(") + 1
+
+
+def recording_repository(max_allowed_packet=16 * 1024 * 1024, fail_on=None):
+    connection = pymysql.connect(host="localhost", user="airdrop", password="", database="airdrop", charset="utf8mb4",
+                                 cursorclass=RecordingCursor, defer_connect=True)
+    connection.server_status = 0
+    connection.statements = []
+    connection.fail_on = fail_on
+    connection.begin = Mock()
+    connection.commit = Mock()
+    connection.rollback = Mock()
+    repository = Repository.__new__(Repository)
+    repository.connection = connection
+    repository.auto_commit = True
+    repository._max_allowed_packet = max_allowed_packet
+    return repository
+
+
+INSERT_CLAUSE = "insert into user_balance_snapshot (airdrop_window_id, address, balance, payload) values "
+ROW_TEMPLATE = "(%s,%s,%s,%s)"
+SUFFIX = " on duplicate key update balance = values(balance)"
+
+
+def snapshot_rows(count):
+    return [(1, f"0x{index:040x}", 10 ** 18 + index, bytes([index % 256, 0x8b, 0, 0xff])) for index in range(count)]
+
+
+class BulkInsertTest(TestCase):
+
+    def test_statements_are_split_to_fit_max_allowed_packet(self):
+        max_allowed_packet = len(INSERT_CLAUSE) + len(SUFFIX) + 1024 + 500
+        repository = recording_repository(max_allowed_packet=max_allowed_packet)
+
+        inserted = repository.bulk_insert(INSERT_CLAUSE, ROW_TEMPLATE, snapshot_rows(40), SUFFIX)
+
+        statements = repository.connection.statements
+        self.assertEqual(inserted, 40)
+        self.assertGreater(len(statements), 1)
+        for statement in statements:
+            self.assertLessEqual(len(statement), max_allowed_packet - 1024)
+            self.assertTrue(statement.startswith(INSERT_CLAUSE.encode()))
+            self.assertTrue(statement.endswith(SUFFIX.encode()))
+        self.assertEqual(sum(statement.count(b"'0x") for statement in statements), 40)
+
+    def test_row_larger_than_budget_is_sent_alone(self):
+        repository = recording_repository(max_allowed_packet=len(INSERT_CLAUSE) + 1024 + 10)
+
+        self.assertEqual(repository.bulk_insert(INSERT_CLAUSE, ROW_TEMPLATE, snapshot_rows(3)), 3)
+        self.assertEqual(len(repository.connection.statements), 3)
+
+    def test_no_rows_sends_nothing(self):
+        repository = recording_repository()
+
+        self.assertEqual(repository.bulk_insert(INSERT_CLAUSE, ROW_TEMPLATE, []), 0)
+        self.assertEqual(repository.connection.statements, [])
+
+    def test_auto_commit_commits_once_after_all_statements(self):
+        repository = recording_repository(max_allowed_packet=len(INSERT_CLAUSE) + 1024 + 500)
+
+        repository.bulk_insert(INSERT_CLAUSE, ROW_TEMPLATE, snapshot_rows(40))
+
+        repository.connection.commit.assert_called_once()
+        repository.connection.rollback.assert_not_called()
+
+    def test_auto_commit_rolls_back_and_raises_on_failure(self):
+        repository = recording_repository(max_allowed_packet=len(INSERT_CLAUSE) + 1024 + 500, fail_on=2)
+
+        with self.assertRaises(pymysql.err.OperationalError):
+            repository.bulk_insert(INSERT_CLAUSE, ROW_TEMPLATE, snapshot_rows(40))
+
+        repository.connection.rollback.assert_called_once()
+        repository.connection.commit.assert_not_called()
+
+    def test_transaction_is_left_to_the_caller(self):
+        repository = recording_repository()
+        repository.begin_transaction()
+
+        repository.bulk_insert(INSERT_CLAUSE, ROW_TEMPLATE, snapshot_rows(5))
+        repository.connection.commit.assert_not_called()
+
+        repository.connection.fail_on = 2
+        with self.assertRaises(pymysql.err.OperationalError):
+            repository.bulk_insert(INSERT_CLAUSE, ROW_TEMPLATE, snapshot_rows(5))
+        repository.connection.rollback.assert_not_called()
+
+        repository.rollback_transaction()
+        repository.connection.rollback.assert_called_once()
+        self.assertTrue(repository.auto_commit)
+
+
+class StreamTest(TestCase):
+
+    def __repository(self, rows):
+        cursor = Mock(description=[("wallet_address",), ("balance",)])
+        cursor.fetchmany.side_effect = lambda size: [rows.pop(0) for _ in range(min(size, len(rows)))]
+        repository = Repository.__new__(Repository)
+        repository.connection = Mock()
+        repository.connection.cursor.return_value = cursor
+        return repository, cursor
+
+    def test_rows_are_fetched_in_chunks_through_an_unbuffered_cursor(self):
+        repository, cursor = self.__repository([(f"0x{index}", index) for index in range(5)])
+
+        rows = list(repository.stream("select wallet_address, balance from agix_balances", fetch_size=2))
+
+        repository.connection.cursor.assert_called_once_with(pymysql.cursors.SSCursor)
+        self.assertEqual(rows[4], {"wallet_address": "0x4", "balance": 4})
+        self.assertEqual(len(rows), 5)
+        self.assertEqual([call.args[0] for call in cursor.fetchmany.call_args_list], [2, 2, 2, 2])
+        cursor.close.assert_called_once()
+
+    def test_cursor_is_closed_when_reading_stops_early(self):
+        repository, cursor = self.__repository([(f"0x{index}", index) for index in range(5)])
+
+        rows = repository.stream("select wallet_address, balance from agix_balances", fetch_size=2)
+        next(rows)
+        rows.close()
+
+        cursor.close.assert_called_once()
+
+
+class BulkInsertBinaryTest(TestCase):
+
+    def test_gzip_payload_is_inserted(self):
+        repository = recording_repository()
+        rows = [(f"0x{index:040x}", Decimal(2500 + index), Decimal(index), Decimal("0.025123"), Decimal("0.010780"),
+                 Decimal(123456789 + index), None) for index in range(1000)]
+        payload = encode_audit_artifact(rows)
+        self.assertEqual(payload[:2], b"\x1f\x8b")
+
+        inserted = repository.bulk_insert(
+            "insert into user_rewards_audit_artifact (airdrop_id, airdrop_window_id, snapshot_guid, run_guid, part, "
+            "row_count, format, payload, row_created, row_updated) values ",
+            "(%s,%s,%s,%s,%s,%s,%s,%s,current_timestamp,current_timestamp)",
+            [(1, 2, "snapshot", "run", 0, len(rows), AUDIT_ARTIFACT_FORMAT, payload)])
+
+        self.assertEqual(inserted, 1)
+        statement = repository.connection.statements[0]
+        escaped_payload = repository.connection.literal(payload).encode("utf-8", "surrogateescape")
+        self.assertIn(escaped_payload, statement)
+        repository.connection.commit.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
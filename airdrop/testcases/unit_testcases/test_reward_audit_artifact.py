@@ -0,0 +1,28 @@
+import unittest
+from decimal import Decimal
+from unittest import TestCase
+
+from airdrop.infrastructure.repositories.user_reward_audit_repository import decode_audit_artifact, \
+    encode_audit_artifact
+
+
+class RewardAuditArtifactTest(TestCase):
+
+    def test_round_trip_keeps_exact_values(self):
+        rows = [(f"0x{index:040x}", Decimal(2500 + index), Decimal(index), Decimal("0.025123"),
+                 Decimal("0.010780"), Decimal(123456789 + index), None) for index in range(1000)]
+        payload = encode_audit_artifact(rows)
+        decoded = decode_audit_artifact(payload)
+
+        self.assertEqual(len(decoded), len(rows))
+        self.assertEqual(decoded[7], {"address": rows[7][0], "balance": Decimal(2507), "staked": Decimal(7),
+                                      "score": Decimal("0.025123"), "normalized_score": Decimal("0.010780"),
+                                      "rewards_awarded": Decimal(123456796), "comment": None})
+        self.assertLess(len(payload), 40 * len(rows))
+
+    def test_empty_artifact(self):
+        self.assertEqual(decode_audit_artifact(encode_audit_artifact([])), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from unittest import TestCase
+
+from airdrop.testcases.benchmarks.reward_benchmark import compare_with_baseline, scenario_key
+from airdrop.testcases.benchmarks.synthetic_data import generate_holders, generate_snapshot_rows
+
+
+class SyntheticDataTest(TestCase):
+
+    def test_holders_are_reproducible(self):
+        first = generate_holders(200, "mixed", seed=7)
+        second = generate_holders(200, "mixed", seed=7)
+        self.assertEqual([holder.address for holder in first], [holder.address for holder in second])
+        self.assertEqual([holder.balance for holder in first], [holder.balance for holder in second])
+
+    def test_mix_sets_address_eras(self):
+        shelley = generate_holders(50, "shelley")
+        self.assertTrue(all(holder.address.startswith("addr1") and holder.staking_part for holder in shelley))
+        self.assertTrue(all(holder.address.startswith("0x") for holder in generate_holders(50, "ethereum")))
+        self.assertTrue(all(holder.address.startswith("DdzFF") for holder in generate_holders(50, "byron")))
+
+    def test_first_snapshot_has_every_holder(self):
+        holders = generate_holders(500)
+        self.assertEqual(len(generate_snapshot_rows(holders, 0)), 500)
+        self.assertLess(len(generate_snapshot_rows(holders, 1)), 500)
+
+
+class BaselineComparisonTest(TestCase):
+
+    def setUp(self):
+        self.result = {"processor": "nunet", "mix": "ethereum", "holders": 10000, "options": {},
+                       "wall_time": 11.0, "peak_rss": 100, "queries": 40, "error": None}
+        self.key = scenario_key("nunet", "ethereum", 10000, {})
+
+    def test_within_tolerance(self):
+        comparison = compare_with_baseline([self.result], {self.key: {"wall_time": 10.0, "peak_rss": 100, "queries": 40}})
+        self.assertEqual(comparison[self.key]["regressed"], [])
+
+    def test_regressions(self):
+        comparison = compare_with_baseline([self.result], {self.key: {"wall_time": 5.0, "peak_rss": 100, "queries": 39}})
+        self.assertEqual(comparison[self.key]["regressed"], ["wall_time", "queries"])
+
+    def test_scenario_without_baseline(self):
+        comparison = compare_with_baseline([self.result], {})
+        self.assertIsNone(comparison[self.key]["baseline"])
+        self.assertEqual(comparison[self.key]["regressed"], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
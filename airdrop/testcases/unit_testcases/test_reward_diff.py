@@ -0,0 +1,40 @@
+import unittest
+from decimal import Decimal
+from unittest import TestCase
+
+from airdrop.job.reward_diff import diff_rewards
+
+
+class RewardDiffTest(TestCase):
+
+    def setUp(self):
+        self.current = {"0x1": Decimal(100), "0x2": Decimal(200), "0x3": Decimal(300)}
+        self.proposed = {"0x1": Decimal(100), "0x2": Decimal(250), "0x4": Decimal(40)}
+
+    def test_diff_for_window_replacing_run(self):
+        diff = diff_rewards(self.current, self.proposed)
+        self.assertEqual(diff["added"], 1)
+        self.assertEqual(diff["removed"], 1)
+        self.assertEqual(diff["changed"], 1)
+        self.assertEqual(diff["unchanged"], 1)
+        self.assertEqual(diff["total_current"], 600)
+        self.assertEqual(diff["total_proposed"], 390)
+        self.assertEqual(diff["total_delta"], -210)
+        self.assertEqual([mover["address"] for mover in diff["top_movers"]], ["0x3", "0x2", "0x4"])
+
+    def test_diff_for_upserting_run(self):
+        diff = diff_rewards(self.current, self.proposed, replaces_window=False, top_movers=1)
+        self.assertEqual(diff["removed"], 0)
+        self.assertEqual(diff["total_current"], 600)
+        self.assertEqual(diff["total_proposed"], 690)
+        self.assertEqual(diff["top_movers"], [{"address": "0x2", "current": 200, "proposed": 250, "delta": 50}])
+
+    def test_stored_zero_rewards_count_as_no_reward(self):
+        diff = diff_rewards({"0x1": Decimal(0), "0x2": Decimal(200)}, {"0x1": Decimal(50), "0x2": Decimal(0)})
+        self.assertEqual(diff["added"], 1)
+        self.assertEqual(diff["removed"], 1)
+        self.assertEqual(diff["changed"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airdrop.constants import RewardRunStatus
+from airdrop.job.reward_staging import RewardStaging
+from airdrop.testcases.sqlite_repository import SqliteRepository
+
+
+class RewardStagingTest(TestCase):
+
+    def setUp(self):
+        self.airdrop_db = Mock()
+        self.airdrop_db.execute.return_value = [0, {"last_row_id": 0}]
+
+    def test_publish_merges_staged_rows_in_one_transaction(self):
+        staging = RewardStaging(self.airdrop_db, 1, 2, "snapshot", buffer_size=2).open()
+        for index in range(3):
+            staging.add_reward(f"0x{index}", 10 + index, 1, 1)
+        self.assertEqual(self.airdrop_db.bulk_insert.call_count, 1)
+
+        self.airdrop_db.execute.return_value = [{"run_guid": staging.run_guid}]
+        self.assertEqual(staging.publish(), 3)
+        self.assertEqual(self.airdrop_db.bulk_insert.call_count, 2)
+        self.airdrop_db.begin_transaction.assert_called_once()
+        self.airdrop_db.commit_transaction.assert_called_once()
+        self.airdrop_db.rollback_transaction.assert_not_called()
+
+    def test_failed_publish_is_rolled_back(self):
+        staging = RewardStaging(self.airdrop_db, 1, 2).open()
+        self.airdrop_db.execute.side_effect = Exception("lock wait timeout")
+        with self.assertRaises(Exception):
+            staging.publish()
+        self.airdrop_db.rollback_transaction.assert_called_once()
+        self.airdrop_db.commit_transaction.assert_not_called()
+
+    def test_rollback_requires_previous_run(self):
+        self.airdrop_db.execute.return_value = [{"run_guid": "current", "status": RewardRunStatus.PUBLISHED.value}]
+        with self.assertRaises(Exception):
+            RewardStaging.rollback_window(self.airdrop_db, 2)
+        self.airdrop_db.begin_transaction.assert_not_called()
+
+    @patch("airdrop.job.reward_staging.UserClaimableBalanceRepository")
+    def test_rollback_publishes_previous_run(self, mock_claimable_balance_repository):
+        self.airdrop_db.execute.side_effect = [
+            [{"run_guid": "current", "status": RewardRunStatus.PUBLISHED.value},
+             {"run_guid": "previous", "status": RewardRunStatus.SUPERSEDED.value}],
+            [0, {"last_row_id": 0}], [0, {"last_row_id": 0}], [1, {"last_row_id": 0}], [1, {"last_row_id": 0}]
+        ]
+        self.assertEqual(RewardStaging.rollback_window(self.airdrop_db, 2), "previous")
+        self.airdrop_db.commit_transaction.assert_called_once()
+        mock_claimable_balance_repository.return_value.refresh_window.assert_called_once_with(2)
+
+
+class RewardStagingAuditTest(TestCase):
+
+    def setUp(self):
+        self.airdrop_db = SqliteRepository()
+
+    def __stage(self, rewards):
+        staging = RewardStaging(self.airdrop_db, 1, 2, "snapshot", buffer_size=2).open()
+        for address, reward in rewards.items():
+            staging.add_reward(address, reward, 1, 1)
+            staging.add_audit((1, 2, "snapshot", address, 100, 0, 1, 1, reward, None))
+        staging.add_audit_artifact([(1, 2, "snapshot", staging.run_guid, 0, 5, "format", b"payload")])
+        return staging
+
+    def __count(self, table):
+        return self.airdrop_db.execute(f"select count(*) as total from {table}")[0]["total"]
+
+    def test_audit_is_published_with_the_rewards(self):
+        self.__stage({"0x0": 10, "0x1": 11, "0x2": 12}).publish()
+        second = self.__stage({"0x0": 20, "0x3": 23})
+        second.publish()
+
+        rewards = self.airdrop_db.execute("select address, rewards_awarded from user_rewards order by address")
+        self.assertEqual([(row["address"], row["rewards_awarded"]) for row in rewards],
+                         [("0x0", 20), ("0x1", 0), ("0x2", 0), ("0x3", 23)])
+        self.assertEqual(self.__count("user_rewards_audit"), 5)
+        self.assertEqual(self.__count("user_rewards_audit_staging"), 0)
+        artifacts = self.airdrop_db.execute("select run_guid from user_rewards_audit_artifact")
+        self.assertIn(second.run_guid, [row["run_guid"] for row in artifacts])
+
+    def test_failed_publish_writes_no_audit(self):
+        staging = self.__stage({"0x0": 10, "0x1": 11, "0x2": 12})
+        execute = self.airdrop_db.execute
+
+        def fail_on_run_update(query, params=None):
+            if query.startswith("update user_rewards_run set status = %s, rewarded_users"):
+                raise Exception("lock wait timeout")
+            return execute(query, params)
+
+        with patch.object(self.airdrop_db, "execute", side_effect=fail_on_run_update):
+            with self.assertRaises(Exception):
+                staging.publish()
+        self.assertEqual(self.__count("user_rewards"), 0)
+        self.assertEqual(self.__count("user_rewards_audit"), 0)
+        self.assertEqual(self.__count("user_rewards_audit_artifact"), 0)
+
+        staging.discard()
+        self.assertEqual(self.__count("user_rewards_audit_staging"), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airdrop.job.eligibility import EligibilityProcessor
+
+# Calls made on the mocks, in order, to check that nothing is open when workers start
+EVENTS = []
+
+
+class InlineProcess:
+    # Runs the worker in the test process when started; crashing windows exit without a result
+    crashing_windows = set()
+
+    def __init__(self, target, args):
+        self.target = target
+        self.args = args
+        self.exitcode = None
+
+    def start(self):
+        EVENTS.append("start")
+        if self.args[3] in self.crashing_windows:
+            self.exitcode = -9
+            self.args[0].close()
+            return
+        self.target(*self.args)
+        self.exitcode = 0
+
+    def join(self):
+        pass
+
+
+class RewardProcessor:
+    # Snapshot each window was scored against
+    snapshots = {}
+
+    def __init__(self, airdrop_db, airdrop_id, window_id, snapshot_guid, **options):
+        self.window_id = window_id
+        self.snapshots[window_id] = snapshot_guid
+
+    def process_rewards(self, only_registered):
+        if self.window_id == 2:
+            raise ValueError("window 2 has no snapshots")
+        # Dry runs of window 3 return their reward diff
+        if self.window_id == 3:
+            return {"added": 3}
+
+
+@patch("airdrop.job.eligibility.engine")
+@patch("airdrop.job.eligibility.default_session")
+@patch("airdrop.job.eligibility.locate", return_value=RewardProcessor)
+@patch("airdrop.job.eligibility.Process", InlineProcess)
+@patch("airdrop.job.eligibility.Repository")
+class RewardWorkersTest(TestCase):
+
+    def setUp(self):
+        EVENTS.clear()
+        InlineProcess.crashing_windows = set()
+        RewardProcessor.snapshots.clear()
+
+    def __process(self, repository, windows, concurrency=2):
+        repository.side_effect = lambda db: Mock(connection=Mock(close=lambda: EVENTS.append("close")))
+        processor = EligibilityProcessor(reward_concurrency=concurrency)
+        EVENTS.clear()
+        rewards = [("nunet_reward_processor.NunetRewardProcessor", 1, window, "FINAL", True) for window in windows]
+        return processor._EligibilityProcessor__process_rewards(rewards)
+
+    def test_all_windows_are_processed(self, repository, locate, default_session, engine):
+        self.__process(repository, [1, 3, 4])
+
+        self.assertEqual(EVENTS, ["close", "close", "start", "start", "start"])
+        engine.dispose.assert_called_once()
+        default_session.close.assert_called_once()
+        # Every worker opened its own connection, and the parent reopened its two afterwards
+        self.assertEqual(repository.call_count, 2 + 3 + 2)
+
+    def test_failed_and_crashed_windows_are_reported_together(self, repository, locate, default_session, engine):
+        InlineProcess.crashing_windows = {4}
+
+        with self.assertRaises(Exception) as context:
+            self.__process(repository, [1, 2, 3, 4])
+
+        message = str(context.exception)
+        self.assertIn("2: \"ValueError('window 2 has no snapshots')\"", message)
+        self.assertIn("4: 'worker exited without a result'", message)
+        self.assertNotIn("1:", message)
+        self.assertEqual(EVENTS.count("start"), 4)
+        self.assertEqual(repository.call_count, 2 + 3 + 2)
+
+    def test_dry_run_diffs_are_returned(self, repository, locate, default_session, engine):
+        self.assertEqual(self.__process(repository, [1, 3, 4]), {3: {"added": 3}})
+        self.assertEqual(self.__process(repository, [1, 3, 4], concurrency=1), {3: {"added": 3}})
+
+    def test_dry_run_scores_stored_snapshots_without_ingesting(self, repository, locate, default_session, engine):
+        stored = {("balance_snapshot_window", 3): [{"snapshot_guid": "shared-2"}],
+                  ("user_balance_snapshot", 5): [{"snapshot_guid": "per-window-1"}]}
+
+        def execute(query, params=None):
+            if "first_snapshot_at" in query:
+                return [{"airdrop_id": 1, "airdrop_processor": "nunet_reward_processor.NunetRewardProcessor",
+                         "airdrop_window_id": window} for window in (3, 4, 5)]
+            if "registration_end_period" in query:
+                return []
+            return stored.get((query.split()[3], params[0]), [])
+
+        airdrop_db, balances_db = Mock(execute=Mock(side_effect=execute)), Mock()
+        repository.side_effect = [airdrop_db, balances_db]
+        processor = EligibilityProcessor(reward_options={"dry_run": True})
+
+        self.assertEqual(processor.process_eligibility(), {3: {"added": 3}})
+        self.assertEqual(RewardProcessor.snapshots, {3: "shared-2", 5: "per-window-1"})
+        balances_db.execute.assert_not_called()
+        balances_db.stream.assert_not_called()
+        airdrop_db.bulk_query.assert_not_called()
+
+    def test_single_window_is_processed_in_process(self, repository, locate, default_session, engine):
+        self.__process(repository, [1])
+
+        self.assertEqual(EVENTS, [])
+        engine.dispose.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
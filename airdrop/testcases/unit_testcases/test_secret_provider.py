@@ -0,0 +1,53 @@
+import json
+import unittest
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from common import boto_utils
+from common.boto_utils import BotoUtils, LocalSecretProvider, SecretProvider
+
+
+class SecretProviderTest(TestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.provider = LocalSecretProvider({"SIGNER_KEY": "key-1"}, ttl=60, clock=lambda: self.now)
+
+    def test_secret_is_fetched_once_per_ttl(self):
+        self.assertEqual(self.provider.get_secret("SIGNER_KEY", "us-east-1"), "key-1")
+        self.assertEqual(self.provider.get_secret("SIGNER_KEY", "us-east-1"), "key-1")
+        self.assertEqual(self.provider.fetch_count, 1)
+        self.now = 60
+        self.provider.get_secret("SIGNER_KEY", "us-east-1")
+        self.assertEqual(self.provider.fetch_count, 2)
+
+    def test_refresh_after_rotation(self):
+        rotated = Mock()
+        self.provider.on_rotation(rotated)
+        self.provider.get_secret("SIGNER_KEY", "us-east-1")
+        self.provider.secrets["SIGNER_KEY"] = "key-2"
+        self.assertEqual(self.provider.get_secret("SIGNER_KEY", "us-east-1"), "key-1")
+        self.assertEqual(self.provider.refresh("SIGNER_KEY", "us-east-1"), "key-2")
+        rotated.assert_called_once_with("SIGNER_KEY", "us-east-1", "key-2")
+        self.assertEqual(self.provider.get_secret("SIGNER_KEY", "us-east-1"), "key-2")
+
+    def test_unknown_secret(self):
+        with self.assertRaises(KeyError):
+            self.provider.get_secret("RECEIPT_KEY", "us-east-1")
+
+    @patch("common.boto_utils.boto3.client")
+    def test_client_is_reused_per_region(self, mock_client):
+        mock_client.return_value.get_secret_value.return_value = {"SecretString": json.dumps({"SIGNER_KEY": "key"})}
+        boto_utils._clients.clear()
+        provider = SecretProvider()
+        provider.get_secret("SIGNER_KEY", "us-east-1")
+        provider.refresh("SIGNER_KEY", "us-east-1")
+        BotoUtils("us-east-1").get_parameter_value_from_secrets_manager("SIGNER_KEY")
+        BotoUtils("eu-west-1").get_parameter_value_from_secrets_manager("SIGNER_KEY")
+        self.assertEqual(mock_client.call_count, 2)
+        self.assertEqual(mock_client.return_value.get_secret_value.call_count, 4)
+        boto_utils._clients.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import sqlite3
+import unittest
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airdrop.job.eligibility import EligibilityProcessor
+
+
+class SqliteBalances:
+    # agix_balances of the balances database in SQLite, read through the Repository interface
+    def __init__(self, rows):
+        self._connection = sqlite3.connect(":memory:")
+        self._connection.execute("create table agix_balances (wallet_address text, balance_type text, amount integer)")
+        self._connection.executemany("insert into agix_balances values (?, ?, ?)", rows)
+        self.executed = []
+
+    def __rows(self, query, params=None):
+        cursor = self._connection.execute(query, params or [])
+        field_name = [field[0] for field in cursor.description]
+        for values in cursor:
+            yield dict(zip(field_name, values))
+
+    def execute(self, query, params=None):
+        self.executed.append(query)
+        return list(self.__rows(query, params))
+
+    def stream(self, query, params=None, fetch_size=1000):
+        return self.__rows(query, params)
+
+
+@patch("airdrop.job.eligibility.Repository")
+class SnapshotIngestionTest(TestCase):
+
+    def __ingest(self, rows, streaming):
+        processor = EligibilityProcessor(streaming_snapshot=streaming)
+        processor._balances_db = SqliteBalances(rows)
+        processor._snapshot_writer = Mock()
+        if streaming:
+            processor._EligibilityProcessor__stream_snapshot()
+        else:
+            processor._EligibilityProcessor__populate_snapshot()
+        holders = {call.args[0]: call.args[1:] for call in processor._snapshot_writer.add_holder.call_args_list}
+        return holders, processor._balances_db
+
+    def test_streaming_matches_buffered_ingestion(self, repository):
+        rows = [("0xa", "LIQUID", 500), ("0xa", "CONTRACT", 250), ("0xa", "STAKED", 300),
+                ("0xb", "STAKED", 200),
+                ("0xc", "LIQUID", 0),
+                ("0xd", "LIQUID", -100), ("0xd", "STAKED", 50),
+                ("0xe", "LIQUID", 70)]
+
+        streamed, balances_db = self.__ingest(rows, streaming=True)
+        buffered, _ = self.__ingest(rows, streaming=False)
+
+        self.assertEqual(balances_db.executed, [])
+        self.assertEqual(streamed, {address: tuple(Decimal(value) for value in values)
+                                    for address, values in buffered.items()})
+        self.assertEqual(streamed["0xa"], (750, 300, Decimal(1050)))
+        self.assertEqual(streamed["0xd"], (0, 50, Decimal(50)))
+        self.assertNotIn("0xc", streamed)
+
+    def test_largest_of_several_stakes_is_kept(self, repository):
+        # The buffered ingestion kept whichever STAKED row came last, streaming keeps the largest
+        streamed, _ = self.__ingest([("0xa", "LIQUID", 500), ("0xa", "STAKED", 900), ("0xa", "STAKED", 300)],
+                                    streaming=True)
+
+        self.assertEqual(streamed["0xa"], (500, 900, Decimal(1400)))
+
+
+if __name__ == '__main__':
+    unittest.main()
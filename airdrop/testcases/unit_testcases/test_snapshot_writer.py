@@ -0,0 +1,245 @@
+import unittest
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from airdrop.constants import SnapshotStorage
+from airdrop.infrastructure.models import UserBalanceHistory, UserBalanceSnapshotDelta
+from airdrop.job.rejuve_processes import snapshot_cardano_addresses
+from airdrop.job.reward_processors.nunet_reward_processor import NunetRewardProcessor
+from airdrop.job.snapshot_storage import delta_snapshot_at, window_snapshot_rows
+from airdrop.job.snapshot_writer import DeltaSnapshotWriter, HistorySnapshotWriter, SnapshotWriter
+from airdrop.testcases.sqlite_repository import SqliteRepository
+
+WINDOWS = [1, 2]
+
+# Balances of the holders in each snapshot: address -> (balance, staked)
+SNAPSHOTS = [
+    {"0xa": (100, 0), "0xb": (200, 50), "0xc": (300, 0)},
+    {"0xa": (100, 0), "0xb": (250, 50), "0xd": (40, 0)},
+    {"0xa": (100, 0), "0xb": (250, 50), "0xc": (300, 0), "0xd": (40, 10)},
+]
+
+
+def write_snapshots(airdrop_db, writer_class, snapshots=SNAPSHOTS, **options):
+    for index, holders in enumerate(snapshots):
+        with writer_class(airdrop_db, f"snapshot-{index}", WINDOWS, buffer_size=2, **options) as writer:
+            for address, (balance, staked) in holders.items():
+                writer.add_holder(address, balance, staked, balance + staked)
+
+
+def logical_snapshot(airdrop_db, window_id, seq):
+    rows = airdrop_db.execute(f"select address, balance, staked, total from {delta_snapshot_at(window_id, seq)}")
+    return {row["address"]: (row["balance"], row["staked"]) for row in rows}
+
+
+def snapshot_occurrences(airdrop_db, window_id):
+    rows = airdrop_db.execute(f"select address, sum(occurrences) as occurrences, min(total) as min_total "
+                              f"from {window_snapshot_rows(window_id)} group by address")
+    return {row["address"]: (row["occurrences"], row["min_total"]) for row in rows}
+
+
+def expected_occurrences(snapshots=SNAPSHOTS):
+    expected = {}
+    for holders in snapshots:
+        for address, (balance, staked) in holders.items():
+            occurrences, min_total = expected.get(address, (0, None))
+            total = balance + staked
+            expected[address] = (occurrences + 1, total if min_total is None else min(min_total, total))
+    return expected
+
+
+class DeltaSnapshotWriterTest(TestCase):
+
+    def setUp(self):
+        self.airdrop_db = SqliteRepository()
+
+    def test_only_changed_addresses_are_written(self):
+        write_snapshots(self.airdrop_db, DeltaSnapshotWriter)
+
+        rows = self.airdrop_db.execute(
+            "select snapshot_seq, address, balance, staked, is_removed from user_balance_snapshot_delta "
+            "where airdrop_window_id = 1 order by snapshot_seq, address")
+        self.assertEqual([(row["snapshot_seq"], row["address"], row["balance"], row["staked"], row["is_removed"])
+                          for row in rows],
+                         [(1, "0xa", 100, 0, 0), (1, "0xb", 200, 50, 0), (1, "0xc", 300, 0, 0),
+                          (2, "0xb", 250, 50, 0), (2, "0xc", 0, 0, 1), (2, "0xd", 40, 0, 0),
+                          (3, "0xc", 300, 0, 0), (3, "0xd", 40, 10, 0)])
+        links = self.airdrop_db.execute("select airdrop_window_id, snapshot_guid, snapshot_seq "
+                                        "from balance_snapshot_window order by airdrop_window_id, snapshot_seq")
+        self.assertEqual([(row["airdrop_window_id"], row["snapshot_seq"]) for row in links],
+                         [(1, 1), (1, 2), (1, 3), (2, 1), (2, 2), (2, 3)])
+
+    def test_every_snapshot_is_reconstructed(self):
+        write_snapshots(self.airdrop_db, DeltaSnapshotWriter)
+
+        for window_id in WINDOWS:
+            for seq, holders in enumerate(SNAPSHOTS, start=1):
+                self.assertEqual(logical_snapshot(self.airdrop_db, window_id, seq), holders)
+            self.assertEqual(snapshot_occurrences(self.airdrop_db, window_id), expected_occurrences())
+
+    def test_failed_snapshot_is_rolled_back(self):
+        write_snapshots(self.airdrop_db, DeltaSnapshotWriter, SNAPSHOTS[:1])
+
+        with self.assertRaises(ValueError):
+            with DeltaSnapshotWriter(self.airdrop_db, "snapshot-1", WINDOWS) as writer:
+                writer.add_holder("0xa", 1, 0, 1)
+                raise ValueError("balances unavailable")
+
+        self.assertEqual(self.airdrop_db.execute("select count(*) as links from balance_snapshot_window")[0]["links"],
+                         len(WINDOWS))
+        self.assertEqual(logical_snapshot(self.airdrop_db, 1, 2), SNAPSHOTS[0])
+
+    def test_window_with_other_storage_is_rejected(self):
+        write_snapshots(self.airdrop_db, SnapshotWriter, SNAPSHOTS[:1])
+
+        with self.assertRaisesRegex(Exception, "already has per_window snapshots"):
+            write_snapshots(self.airdrop_db, DeltaSnapshotWriter, SNAPSHOTS[1:])
+
+        self.assertEqual(self.airdrop_db.execute("select count(*) as rows from user_balance_snapshot_delta")[0]["rows"], 0)
+        self.assertFalse(self.airdrop_db.connection.in_transaction)
+
+    def test_storage_of_other_windows_is_ignored(self):
+        with SnapshotWriter(self.airdrop_db, "shared-snapshot", [3], storage=SnapshotStorage.SHARED) as writer:
+            writer.add_holder("0xa", 100, 0, 100)
+
+        write_snapshots(self.airdrop_db, DeltaSnapshotWriter)
+
+        self.assertEqual(logical_snapshot(self.airdrop_db, 1, 3), SNAPSHOTS[2])
+
+
+class HistorySnapshotWriterTest(TestCase):
+
+    def setUp(self):
+        self.airdrop_db = SqliteRepository()
+
+    def test_intervals_follow_balance_changes(self):
+        write_snapshots(self.airdrop_db, HistorySnapshotWriter)
+
+        rows = self.airdrop_db.execute(
+            "select address, balance, staked, valid_from_snapshot, valid_to_snapshot from user_balance_history "
+            "where airdrop_window_id = 2 order by address, valid_from_snapshot")
+        self.assertEqual([(row["address"], row["balance"], row["staked"], row["valid_from_snapshot"],
+                           row["valid_to_snapshot"]) for row in rows],
+                         [("0xa", 100, 0, 1, None),
+                          ("0xb", 200, 50, 1, 1), ("0xb", 250, 50, 2, None),
+                          ("0xc", 300, 0, 1, 1), ("0xc", 300, 0, 3, None),
+                          ("0xd", 40, 0, 2, 2), ("0xd", 40, 10, 3, None)])
+
+    def test_aggregates_match_delta_storage(self):
+        delta_db = SqliteRepository()
+        write_snapshots(delta_db, DeltaSnapshotWriter)
+        write_snapshots(self.airdrop_db, HistorySnapshotWriter)
+
+        for window_id in WINDOWS:
+            self.assertEqual(snapshot_occurrences(self.airdrop_db, window_id), expected_occurrences())
+            self.assertEqual(snapshot_occurrences(self.airdrop_db, window_id), snapshot_occurrences(delta_db, window_id))
+
+    def test_window_with_delta_storage_is_rejected(self):
+        write_snapshots(self.airdrop_db, DeltaSnapshotWriter, SNAPSHOTS[:1])
+
+        with self.assertRaisesRegex(Exception, "already has delta snapshots"):
+            write_snapshots(self.airdrop_db, HistorySnapshotWriter, SNAPSHOTS[1:])
+
+        self.assertEqual(self.airdrop_db.execute("select count(*) as rows from user_balance_history")[0]["rows"], 0)
+
+
+COGS = 10 ** 8
+
+# Holders around the 2500 AGIX threshold: 0xc falls below it once, 0xd misses a snapshot
+REWARD_SNAPSHOTS = [
+    {"0xa": (3000 * COGS, 0), "0xb": (4000 * COGS, 1000 * COGS), "0xc": (2600 * COGS, 0), "0xd": (9000 * COGS, 0)},
+    {"0xa": (3000 * COGS, 0), "0xb": (4500 * COGS, 500 * COGS), "0xc": (2000 * COGS, 0)},
+    {"0xa": (3500 * COGS, 0), "0xb": (4500 * COGS, 500 * COGS), "0xc": (2600 * COGS, 0), "0xd": (9000 * COGS, 0),
+     "0xe": (100000 * COGS, 0)},
+]
+
+
+@patch("airdrop.job.reward_processors.nunet_reward_processor.UserClaimableBalanceRepository")
+class SnapshotAggregateRewardTest(TestCase):
+
+    def __rewards(self, writer_class, **options):
+        airdrop_db = SqliteRepository()
+        write_snapshots(airdrop_db, writer_class, REWARD_SNAPSHOTS, **options)
+        NunetRewardProcessor(airdrop_db, 1, 1, "snapshot-2").process_rewards(False)
+        aggregated = any("from user_balance_snapshot_aggregate" in statement for statement in airdrop_db.statements)
+        self.assertEqual(aggregated, options.get("maintain_aggregates", False))
+        rows = airdrop_db.execute("select address, rewards_awarded, score, normalized_score from user_rewards "
+                                  "where airdrop_window_id = 1 and rewards_awarded > 0 order by address")
+        return [tuple(row.values()) for row in rows]
+
+    def test_aggregated_rewards_match_full_snapshots(self, claimable_balance_repository):
+        expected = self.__rewards(SnapshotWriter)
+        self.assertEqual([row[0] for row in expected], ["0xa", "0xb"])
+        # Rewards are floored, so at most a cog per holder is left out
+        self.assertAlmostEqual(sum(row[1] for row in expected), 12500000 * 10 ** 6, delta=len(expected))
+
+        self.assertEqual(self.__rewards(SnapshotWriter, maintain_aggregates=True), expected)
+        self.assertEqual(self.__rewards(SnapshotWriter, storage=SnapshotStorage.SHARED), expected)
+        self.assertEqual(self.__rewards(SnapshotWriter, storage=SnapshotStorage.SHARED, maintain_aggregates=True),
+                         expected)
+        self.assertEqual(self.__rewards(DeltaSnapshotWriter), expected)
+        self.assertEqual(self.__rewards(DeltaSnapshotWriter, maintain_aggregates=True), expected)
+        self.assertEqual(self.__rewards(HistorySnapshotWriter), expected)
+        self.assertEqual(self.__rewards(HistorySnapshotWriter, maintain_aggregates=True), expected)
+
+    def test_incremental_runs_fold_snapshots_into_aggregates(self, claimable_balance_repository):
+        expected = self.__rewards(SnapshotWriter)
+        for writer_class, options in ((SnapshotWriter, {"storage": SnapshotStorage.SHARED}),
+                                      (DeltaSnapshotWriter, {}), (HistorySnapshotWriter, {})):
+            airdrop_db = SqliteRepository()
+            write_snapshots(airdrop_db, writer_class, REWARD_SNAPSHOTS, **options)
+            NunetRewardProcessor(airdrop_db, 1, 1, "snapshot-2", incremental=True).process_rewards(False)
+
+            rows = airdrop_db.execute("select address, rewards_awarded, score, normalized_score from user_rewards "
+                                      "where airdrop_window_id = 1 and rewards_awarded > 0 order by address")
+            self.assertEqual([tuple(row.values()) for row in rows], expected)
+            self.assertFalse(any("sum(occurrences)" in statement for statement in airdrop_db.statements))
+            links = airdrop_db.execute("select aggregated from balance_snapshot_window where airdrop_window_id = 1")
+            self.assertEqual([link["aggregated"] for link in links], [1, 1, 1])
+
+        # Legacy per-window snapshots are not linked, so they are still scanned
+        airdrop_db = SqliteRepository()
+        write_snapshots(airdrop_db, SnapshotWriter, REWARD_SNAPSHOTS)
+        NunetRewardProcessor(airdrop_db, 1, 1, "snapshot-2", incremental=True).process_rewards(False)
+        self.assertTrue(any("sum(occurrences)" in statement for statement in airdrop_db.statements))
+
+    def test_aggregated_snapshots_are_numbered(self, claimable_balance_repository):
+        airdrop_db = SqliteRepository()
+        write_snapshots(airdrop_db, SnapshotWriter, REWARD_SNAPSHOTS, maintain_aggregates=True)
+
+        links = airdrop_db.execute("select airdrop_window_id, snapshot_guid, snapshot_seq, aggregated "
+                                   "from balance_snapshot_window order by airdrop_window_id, snapshot_seq")
+        self.assertEqual([tuple(link.values()) for link in links],
+                         [(window_id, f"snapshot-{seq - 1}", seq, 1) for window_id in WINDOWS for seq in (1, 2, 3)])
+
+
+@patch("airdrop.job.rejuve_processes.AirdropRepository")
+class SnapshotCardanoAddressesTest(TestCase):
+    ADDRESS = "addr1qyqqzqsrqszsvpcgpy9qkrqdpc83qygjzv2p29shrqv35xcur50p7gppyg3jgffxyu5zj23t9skjutesxyerxdp4xcmskm46z7"
+
+    def test_delta_rows_are_backfilled(self, airdrop_repository):
+        delta_row = UserBalanceSnapshotDelta(airdrop_window_id=1, address=self.ADDRESS, snapshot_seq=1)
+        session = airdrop_repository.return_value.session
+        session.execute.side_effect = lambda query: Mock(all=Mock(return_value=(
+            [(delta_row,)] if query.column_descriptions[0]["entity"] is UserBalanceSnapshotDelta else [])))
+
+        self.assertEqual(snapshot_cardano_addresses({"window_id": 1, "snapshot_guid": "snapshot-1"}), "success")
+
+        self.assertEqual(delta_row.payment_part, "000102030405060708090a0b0c0d0e0f101112131415161718191a1b")
+        self.assertEqual(delta_row.staking_part, "1c1d1e1f202122232425262728292a2b2c2d2e2f3031323334353637")
+        session.commit.assert_called_once()
+
+    def test_history_rows_are_backfilled(self, airdrop_repository):
+        history_row = UserBalanceHistory(airdrop_window_id=1, address=self.ADDRESS, payment_part="", valid_from_snapshot=1)
+        session = airdrop_repository.return_value.session
+        session.execute.side_effect = lambda query: Mock(all=Mock(return_value=(
+            [(history_row,)] if query.column_descriptions[0]["entity"] is UserBalanceHistory else [])))
+
+        self.assertEqual(snapshot_cardano_addresses({"window_id": 1, "snapshot_guid": "snapshot-1"}), "success")
+
+        self.assertEqual(history_row.payment_part, "000102030405060708090a0b0c0d0e0f101112131415161718191a1b")
+        self.assertEqual(history_row.staking_part, "1c1d1e1f202122232425262728292a2b2c2d2e2f3031323334353637")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+from unittest import TestCase
+from unittest.mock import Mock
+
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql
+from sqlalchemy.exc import OperationalError
+
+from airdrop.constants import CardanoEra
+from airdrop.infrastructure.repositories.user_reward_repository import UserRewardRepository
+from airdrop.testcases.sqlite_repository import SqliteRepository, sqlite_session
+
+SHELLEY = "addr1q9shelley"
+SHELLEY_WITHOUT_PARTS = "addr1q9noparts"
+BYRON = "Ae2tdPwUPEZbyron"
+BYRON_WITHOUT_PARTS = "DdzFFzCqrhtbyron"
+
+
+class CardanoRegistrationsBalancesTest(TestCase):
+
+    def setUp(self):
+        self.airdrop_db = SqliteRepository()
+        self.airdrop_db.bulk_insert(
+            "insert into user_registrations (airdrop_window_id, address, payment_part, staking_part) values ",
+            "(%s,%s,%s,%s)",
+            [(1, SHELLEY, "payment-1", "staking-1"), (1, SHELLEY_WITHOUT_PARTS, "", ""),
+             (1, BYRON, None, None), (1, BYRON_WITHOUT_PARTS, "", ""),
+             (2, "addr1q9otherwindow", "payment-1", "staking-1")])
+        self.airdrop_db.bulk_insert(
+            "insert into user_balance_snapshot (airdrop_window_id, address, payment_part, staking_part, balance, staked, "
+            "total, snapshot_guid) values ",
+            "(%s,%s,%s,%s,%s,%s,%s,%s)",
+            [(1, SHELLEY, "payment-1", "staking-1", 100, 0, 100, "snapshot-1"),
+             # Same stake key, and same payment and stake key: each row counts once
+             (1, "addr1q9samestake", "payment-9", "staking-1", 50, 5, 55, "snapshot-1"),
+             (1, "addr1q9samekeys", "payment-1", "staking-1", 30, 0, 30, "snapshot-1"),
+             (1, SHELLEY_WITHOUT_PARTS, "", "", 10, 0, 10, "snapshot-1"),
+             (1, BYRON, None, None, 70, 0, 70, "snapshot-1"),
+             (1, BYRON_WITHOUT_PARTS, "", "", 20, 0, 20, "snapshot-1"),
+             (1, "addr1q9unrelated", "", "", 1000, 0, 1000, "snapshot-1"),
+             (1, SHELLEY, "payment-1", "staking-1", 400, 0, 400, "snapshot-0")])
+        self.repository = UserRewardRepository()
+        self.repository.session = sqlite_session(self.airdrop_db)
+
+    def __balances(self, address_era=CardanoEra.ANY, registration_parts=None):
+        rows = self.repository.get_cardano_registrations_balances(1, address_era=address_era, snapshot_window_id=1,
+                                                                  snapshot_guid="snapshot-1",
+                                                                  registration_parts=registration_parts)
+        return {row.address: (row.balance, row.staked, row.related_addresses) for row in rows}
+
+    def test_mixed_registrations_are_matched_by_address_and_parts(self):
+        self.assertEqual(self.__balances(), {SHELLEY: (180, 5, 3),
+                                             SHELLEY_WITHOUT_PARTS: (10, 0, 1),
+                                             BYRON: (70, 0, 1),
+                                             BYRON_WITHOUT_PARTS: (20, 0, 1)})
+
+    def test_registrations_of_one_era(self):
+        self.assertEqual(self.__balances(CardanoEra.BYRON), {BYRON: (70, 0, 1), BYRON_WITHOUT_PARTS: (20, 0, 1)})
+        self.assertEqual(self.__balances(CardanoEra.SHELLEY), {SHELLEY: (180, 5, 3), SHELLEY_WITHOUT_PARTS: (10, 0, 1)})
+
+    def test_decoded_parts_are_matched_without_storing_them(self):
+        balances = self.__balances(CardanoEra.SHELLEY, {SHELLEY_WITHOUT_PARTS: ("payment-9", None)})
+
+        self.assertEqual(balances[SHELLEY_WITHOUT_PARTS], (60, 5, 2))
+        self.assertEqual(balances[SHELLEY], (180, 5, 3))
+        stored = self.airdrop_db.execute("select payment_part, staking_part from user_registrations where address = %s",
+                                         [SHELLEY_WITHOUT_PARTS])
+        self.assertEqual(stored, [{"payment_part": "", "staking_part": ""}])
+
+    def test_snapshot_union_is_built_once(self):
+        statements = []
+        event.listen(self.repository.session.bind, "before_cursor_execute",
+                     lambda connection, cursor, statement, *args: statements.append(statement))
+
+        self.__balances()
+
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(statements[0].count("FROM user_balance_snapshot "), 1)
+        self.assertEqual(statements[0].count("FROM user_registrations "), 1)
+
+class UpsertUserRewardsTest(TestCase):
+
+    def setUp(self):
+        self.repository = UserRewardRepository()
+        self.repository.session = Mock()
+        self.rewards = [{"airdrop_id": 1, "airdrop_window_id": 2, "address": f"0x{index}", "condition": None,
+                         "rewards_awarded": 100 + index, "score": 1, "normalized_score": 1} for index in range(12)]
+
+    def test_rewards_are_written_in_chunks_in_one_transaction(self):
+        self.assertEqual(self.repository.upsert_user_rewards(self.rewards, batch_size=5), 12)
+
+        chunks = [call.args[1] for call in self.repository.session.execute.call_args_list]
+        self.assertEqual([len(chunk) for chunk in chunks], [5, 5, 2])
+        self.assertEqual([reward for chunk in chunks for reward in chunk], self.rewards)
+        self.repository.session.commit.assert_called_once()
+
+    def test_duplicates_update_reward_columns(self):
+        self.repository.upsert_user_rewards(self.rewards[:1])
+
+        statement = str(self.repository.session.execute.call_args.args[0].compile(dialect=mysql.dialect()))
+        insert, _, update = statement.partition(" ON DUPLICATE KEY UPDATE ")
+        self.assertTrue(insert.startswith("INSERT INTO user_rewards "))
+        self.assertEqual(sorted(assignment.split(" = ")[0] for assignment in update.split(", ")),
+                         ["`condition`", "airdrop_id", "normalized_score", "rewards_awarded", "row_updated", "score"])
+        self.assertIn("rewards_awarded = VALUES(rewards_awarded)", update)
+
+    def test_failed_chunk_rolls_back_the_window(self):
+        self.repository.session.execute.side_effect = [None, OperationalError("insert", {}, Exception("deadlock"))]
+
+        with self.assertRaises(OperationalError):
+            self.repository.upsert_user_rewards(self.rewards, batch_size=5)
+
+        self.repository.session.rollback.assert_called_once()
+        self.repository.session.commit.assert_not_called()
+
+    def test_no_rewards_writes_nothing(self):
+        self.assertEqual(self.repository.upsert_user_rewards([]), 0)
+        self.repository.session.execute.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,34 @@
 import boto3
 import json
+import time
+from threading import Lock
 
 from botocore.config import Config
 from botocore.exceptions import ClientError
 
 
+from common.cache import TTLCache
 from common.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Seconds a secret value is reused before it is fetched again
+SECRET_CACHE_TTL = 300
+
+_clients = {}
+_clients_lock = Lock()
+
+
+def get_secrets_manager_client(region_name):
+    # One client per region for the life of the container, boto3 clients are thread safe
+    with _clients_lock:
+        client = _clients.get(region_name)
+        if client is None:
+            config = Config(retries=dict(max_attempts=2))
+            client = boto3.client(service_name='secretsmanager', region_name=region_name, config=config)
+            _clients[region_name] = client
+    return client
+
 
 class BotoUtils:
     def __init__(self, region_name):
@@ -16,9 +36,7 @@ class BotoUtils:
 
     def get_parameter_value_from_secrets_manager(self, secret_name):
         try:
-            config = Config(retries=dict(max_attempts=2))
-            client = boto3.client(
-                service_name='secretsmanager', region_name=self.region_name, config=config)
+            client = get_secrets_manager_client(self.region_name)
             parameter_value = client.get_secret_value(
                 SecretId=secret_name)['SecretString']
         except ClientError as e:
@@ -27,3 +45,64 @@ class BotoUtils:
 
         response = json.loads(parameter_value)
         return response[secret_name]
+
+
+class SecretProvider:
+    """
+    Secrets Manager values cached in memory for ttl seconds, shared by the warm
+    invocations of a container. After a rotation the cached value can be dropped
+    with refresh, and the callbacks registered with on_rotation receive the new value.
+    """
+
+    def __init__(self, ttl=SECRET_CACHE_TTL, clock=time.monotonic):
+        self._cache = TTLCache("secrets", ttl, clock=clock)
+        self._rotation_callbacks = []
+
+    def _fetch(self, secret_name, region_name):
+        return BotoUtils(region_name=region_name).get_parameter_value_from_secrets_manager(secret_name=secret_name)
+
+    def get_secret(self, secret_name, region_name):
+        return self._cache.get((region_name, secret_name), lambda: self._fetch(secret_name, region_name))
+
+    def on_rotation(self, callback):
+        # callback(secret_name, region_name, value) is called when refresh finds a new value
+        self._rotation_callbacks.append(callback)
+
+    def refresh(self, secret_name, region_name):
+        """
+        Fetches the secret again, e.g. after a signature made with the cached value was
+        rejected or when a rotation event is received.
+        """
+        key = (region_name, secret_name)
+        previous = self._cache.get(key, lambda: None)
+        self._cache.invalidate(key)
+        value = self.get_secret(secret_name, region_name)
+        if previous is not None and value != previous:
+            logger.info(f"Secret {secret_name} in {region_name} was rotated")
+            for callback in self._rotation_callbacks:
+                callback(secret_name, region_name, value)
+        return value
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class LocalSecretProvider(SecretProvider):
+    """
+    Stand-in for tests and local runs, serves the values of a dict of
+    {secret_name: value} instead of calling Secrets Manager.
+    """
+
+    def __init__(self, secrets=None, ttl=SECRET_CACHE_TTL, clock=time.monotonic):
+        super().__init__(ttl=ttl, clock=clock)
+        self.secrets = dict(secrets or {})
+        self.fetch_count = 0
+
+    def _fetch(self, secret_name, region_name):
+        self.fetch_count += 1
+        if secret_name not in self.secrets:
+            raise KeyError(f"Secret {secret_name} is not defined")
+        return self.secrets[secret_name]
+
+
+secret_provider = SecretProvider()
@@ -0,0 +1,67 @@
+import copy
+import time
+from threading import Lock
+
+from common.logger import get_logger
+
+logger = get_logger(__name__)
+
+# The hit and miss counters of a cache are logged every this many lookups
+STATS_LOG_INTERVAL = 100
+
+
+class TTLCache:
+    """
+    Process level cache whose entries expire after ttl seconds. An instance created at
+    module level lives as long as the Lambda container, so entries are shared by the
+    warm invocations of a function. Callers get copies of the cached values, so they
+    can't change the entries other invocations read.
+    """
+
+    def __init__(self, name, ttl, clock=time.monotonic, stats_log_interval=STATS_LOG_INTERVAL):
+        self.name = name
+        self.ttl = ttl
+        self.__clock = clock
+        self.__entries = {}
+        self.__lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.__stats_log_interval = stats_log_interval
+
+    def get(self, key, loader):
+        """
+        Returns the cached value of key, calls loader on a miss. Empty values such as None
+        or [] are not cached, so rows created after a miss are found by the next call.
+        """
+        now = self.__clock()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            hit = entry is not None and entry[0] > now
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if (self.hits + self.misses) % self.__stats_log_interval == 0:
+                logger.info(f"Cache {self.name}: {self.hits} hits, {self.misses} misses, {len(self.__entries)} entries")
+        if hit:
+            return copy.deepcopy(entry[1])
+        value = loader()
+        if value:
+            with self.__lock:
+                self.__entries[key] = (now + self.ttl, value)
+            return copy.deepcopy(value)
+        return value
+
+    def invalidate(self, *keys):
+        with self.__lock:
+            for key in keys:
+                self.__entries.pop(key, None)
+        logger.info(f"Invalidated {self.name} cache keys {keys}")
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self):
+        with self.__lock:
+            return {"name": self.name, "size": len(self.__entries), "hits": self.hits, "misses": self.misses}
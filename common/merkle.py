@@ -0,0 +1,96 @@
+"""
+Merkle trees of claims, verifiable with OpenZeppelin's MerkleProof: pairs are hashed in
+sorted order, so a proof is only the list of sibling hashes. A leaf is
+keccak256(abi.encodePacked(address, uint256 amount, uint256 window_id)); its 84 bytes
+can't be taken for the 64 bytes of a pair, so leaves are hashed once.
+"""
+from eth_hash.auto import keccak
+
+HASH_SIZE = 32
+LEAF_SIZE = 84
+
+
+def encode_leaf(address: str, amount: int, window_id: int) -> bytes:
+    return bytes.fromhex(address[2:]) + int(amount).to_bytes(32, "big") + int(window_id).to_bytes(32, "big")
+
+
+def decode_leaf(leaf_data: bytes) -> tuple[str, int, int]:
+    # Address in lower case, whatever its case when the leaf was encoded
+    return "0x" + leaf_data[:20].hex(), int.from_bytes(leaf_data[20:52], "big"), int.from_bytes(leaf_data[52:], "big")
+
+
+def hash_leaf_data(leaf_data: bytes) -> bytes:
+    return keccak(leaf_data)
+
+
+def leaf_hash(address: str, amount: int, window_id: int) -> bytes:
+    return hash_leaf_data(encode_leaf(address, amount, window_id))
+
+
+def hash_pair(first: bytes, second: bytes) -> bytes:
+    return keccak(first + second) if first <= second else keccak(second + first)
+
+
+class MerkleTree:
+    """
+    Levels are kept as bytearrays of concatenated hashes, about 64 bytes per leaf for the
+    whole tree, instead of a bytes object per node. The last node of a level with an odd
+    number of nodes is carried up unchanged.
+    """
+
+    def __init__(self):
+        self._leaves = bytearray()
+        self._levels = None
+
+    def __len__(self):
+        return len(self._leaves) // HASH_SIZE
+
+    def add_leaf(self, leaf: bytes) -> int:
+        self._leaves += leaf
+        self._levels = None
+        return len(self) - 1
+
+    def build(self) -> bytes:
+        if not self._leaves:
+            raise ValueError("Merkle tree without leaves")
+        levels = [self._leaves]
+        while len(levels[-1]) > HASH_SIZE:
+            nodes = levels[-1]
+            parents = bytearray()
+            for offset in range(0, len(nodes) - HASH_SIZE, 2 * HASH_SIZE):
+                parents += hash_pair(bytes(nodes[offset:offset + HASH_SIZE]),
+                                     bytes(nodes[offset + HASH_SIZE:offset + 2 * HASH_SIZE]))
+            if (len(nodes) // HASH_SIZE) % 2:
+                parents += nodes[-HASH_SIZE:]
+            levels.append(parents)
+        self._levels = levels
+        return self.root
+
+    @property
+    def root(self) -> bytes:
+        return bytes(self._levels[-1])
+
+    @property
+    def depth(self) -> int:
+        return len(self._levels) - 1
+
+    def proof(self, index: int) -> bytes:
+        # Sibling hashes from the leaf up, packed; carried nodes have no sibling
+        proof = bytearray()
+        for nodes in self._levels[:-1]:
+            sibling = index ^ 1
+            if sibling * HASH_SIZE < len(nodes):
+                proof += nodes[sibling * HASH_SIZE:(sibling + 1) * HASH_SIZE]
+            index //= 2
+        return bytes(proof)
+
+
+def unpack_proof(proof: bytes) -> list[str]:
+    return ["0x" + proof[offset:offset + HASH_SIZE].hex() for offset in range(0, len(proof), HASH_SIZE)]
+
+
+def verify_proof(proof: bytes, root: bytes, leaf: bytes) -> bool:
+    computed = leaf
+    for offset in range(0, len(proof), HASH_SIZE):
+        computed = hash_pair(computed, proof[offset:offset + HASH_SIZE])
+    return computed == root
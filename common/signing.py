@@ -0,0 +1,39 @@
+from functools import lru_cache
+
+from eth_account import Account
+from eth_account.messages import defunct_hash_message
+from web3 import Web3
+
+# Distinct private keys whose parsed accounts are kept, the signer, Nunet signer and receipt keys
+SIGNER_CACHE_SIZE = 16
+
+
+class LocalSigner:
+    """
+    Signs keccak digests as Ethereum signed messages with a private key held in memory.
+    Signing needs no node, unlike Web3(HTTPProvider(...)).eth.account.sign_message,
+    which produces the same signatures.
+    """
+
+    def __init__(self, private_key):
+        self._account = Account.from_key(private_key)
+
+    @property
+    def address(self):
+        return self._account.address
+
+    def sign_digest(self, digest):
+        # Same signature as sign_message(encode_defunct(digest))
+        return self._account.unsafe_sign_hash(defunct_hash_message(digest)).signature
+
+    def sign_solidity(self, data_types: list, values: list):
+        return self.sign_digest(Web3.solidity_keccak(data_types, values))
+
+    def sign_digests(self, digests) -> list:
+        sign_hash = self._account.unsafe_sign_hash
+        return [sign_hash(defunct_hash_message(digest)).signature for digest in digests]
+
+
+@lru_cache(maxsize=SIGNER_CACHE_SIZE)
+def get_local_signer(private_key) -> LocalSigner:
+    return LocalSigner(private_key)
@@ -4,11 +4,12 @@ from base64 import b64encode
 import requests
 import web3
 from enum import Enum
-from eth_account.messages import defunct_hash_message, encode_defunct
+from eth_account.messages import defunct_hash_message
 from http import HTTPStatus
 from web3 import Web3
 from airdrop.config import NETWORK, SLACK_HOOK
 from common.logger import get_logger
+from common.signing import get_local_signer
 
 logger = get_logger(__name__)
 
@@ -104,14 +105,7 @@ def generate_claim_signature(amount, airdrop_id, airdrop_window_id, user_address
              int(airdrop_window_id), contract_address, token_address],
         )
 
-        message_hash = encode_defunct(message)
-
-        web3_object = Web3(web3.providers.HTTPProvider(
-            NETWORK['http_provider']))
-        signed_message = web3_object.eth.account.sign_message(
-            message_hash, private_key=private_key)
-
-        return signed_message.signature.hex()
+        return get_local_signer(private_key).sign_digest(message).hex()
     except BaseException as e:
         raise e(f"Error while generating claim signature. Error: {e}")
 
@@ -134,14 +128,7 @@ def generate_claim_signature_with_total_eligibile_amount(totalEligibleAmount,air
              int(airdrop_window_id), contract_address, token_address],
         )
 
-        message_hash = encode_defunct(message)
-
-        web3_object = Web3(web3.providers.HTTPProvider(
-            NETWORK['http_provider']))
-        signed_message = web3_object.eth.account.sign_message(
-            message_hash, private_key=private_key)
-
-        return signed_message.signature.hex()
+        return get_local_signer(private_key).sign_digest(message).hex()
     except BaseException as e:
         raise e(f"Error while generating claim signature. Error: {e}")
 
@@ -226,13 +213,7 @@ def get_registration_receipt_ethereum(airdrop_id, airdrop_window_id, user_addres
             ["__receipt_ack_message", user_address, int(airdrop_id), int(airdrop_window_id)],
         )
 
-        message_hash = encode_defunct(message)
-
-        web3_object = Web3(web3.providers.HTTPProvider(
-            NETWORK['http_provider']))
-        signed_message = web3_object.eth.account.sign_message(
-            message_hash, private_key=private_key)
-        return b64encode(signed_message.signature).decode()
+        return b64encode(get_local_signer(private_key).sign_digest(message)).decode()
 
     except BaseException as e:
         raise e
@@ -245,13 +226,7 @@ def get_registration_receipt_cardano(airdrop_id, airdrop_window_id, user_address
             ["__receipt_ack_message", user_address, int(airdrop_id), int(airdrop_window_id)],
         )
 
-        message_hash = encode_defunct(message)
-
-        web3_object = Web3(web3.providers.HTTPProvider(
-            NETWORK['http_provider']))
-        signed_message = web3_object.eth.account.sign_message(
-            message_hash, private_key=private_key)
-        return b64encode(signed_message.signature).decode()
+        return b64encode(get_local_signer(private_key).sign_digest(message)).decode()
 
     except BaseException as e:
         raise e